@@ -1,66 +1,107 @@
+import asyncio
 import json
 from typing import Any, Dict
 
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
+from django.db import transaction
 
 from apps.agent.agents.base_agent import BaseAgent
-from apps.agent.models import Tag, TagCondition, DocumentChunk
+from apps.agent.models import Tag, TagCondition
 from apps.agent.llms.openai_llm import OpenAiLlm
 from apps.agent.llms.llama_llm import LlamaLlm
 from apps.agent.utils import clean_json_output
-from apps.protocols.chunking import split_into_chunks
+from apps.protocols.document_chunks import get_document_chunks
 from apps.protocols.models import KnowledgeDocument
 
 
 class TagGenerationAgent(BaseAgent):
-    def __init__(self):
+    def __init__(self, concurrency: int = None):
         super().__init__()
         self.llm = OpenAiLlm()  # Default to OpenAI LLM for now
+        self.concurrency = concurrency or settings.TAG_EXTRACTION_CONCURRENCY
 
     def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        document_text = input_data["document_text"]
         filename = input_data["filename"]
         version = input_data.get("version", "v1")
 
-        chunks = split_into_chunks(document_text, size=500, overlap=50)
-        document = KnowledgeDocument.objects.filter(minio_path=filename).first()
-        all_tags = []
-
-        self.log_event("Starting tag extraction", {"chunks": len(chunks)})
+        # Same chunk rows the vector index is built from
+        document = KnowledgeDocument.objects.get(minio_path=filename)
+        chunks = [chunk for chunk in get_document_chunks(document) if not chunk.processed]
 
-        for i, chunk_text in enumerate(chunks):
-            chunk_obj, _ = DocumentChunk.objects.get_or_create(
-                document=document,
-                chunk_index=i,
-                defaults={"text": chunk_text}
-            )
+        self.log_event("Starting tag extraction", {"chunks": len(chunks), "concurrency": self.concurrency})
 
-            if chunk_obj.processed:
-                continue
+        prompts = [self._build_prompt(chunk_obj.text, chunk_number=chunk_obj.chunk_index + 1) for chunk_obj in chunks]
 
-            prompt = self._build_prompt(chunk_text, chunk_number=i + 1)
-            self.log_event("Sending prompt to LLM", {"chunk": i + 1})
-            response = self.llm.generate_from_prompt(prompt)
+        # All LLM calls share one event loop, at most `concurrency` in flight; failed answers are
+        # recorded on this thread as soon as they arrive.
+        all_tags = async_to_sync(self._extract_tags)(chunks, prompts)
 
-            self.log_event("Received LLM response", {"chunk": i + 1, "preview": response[:200]})
+        # Merged in document order, as if the chunks had been processed one by one. A chunk is only
+        # marked processed together with its tags, so an interrupted run resumes where it stopped.
+        stored = sum(
+            self._store_chunk_tags(tags, document, chunk)
+            for tags, chunk in sorted(all_tags, key=lambda item: item[1].chunk_index)
+        )
 
-            try:
-                tags = clean_json_output(response)
-                assert isinstance(tags, list)
-                all_tags.append((tags, chunk_obj))
-                chunk_obj.processed = True
-                chunk_obj.last_error = None
-            except Exception as e:
-                self.log_event("Failed to parse chunk", {"chunk": i + 1, "error": str(e)})
-                chunk_obj.last_error = str(e)
+        return {"num_chunks_processed": stored, "num_chunks_failed": len(chunks) - stored}
 
-            chunk_obj.processing_attempts += 1
-            chunk_obj.save()
+    async def _extract_tags(self, chunks: list, prompts: list[str]) -> list[tuple]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        record = sync_to_async(self._record_response)
+        log_event = sync_to_async(self.log_event)
 
-        for tags, chunk in all_tags:
-            self._store_tags_in_db(tags, document, chunk)
+        async def ask(client, chunk_obj, prompt):
+            async with semaphore:
+                # Logged when the request actually goes out, not when it is queued behind the limit.
+                await log_event("Sending prompt to LLM", {"chunk": chunk_obj.chunk_index + 1})
+                try:
+                    return chunk_obj, await self.llm.agenerate_from_prompt(prompt, client=client), None
+                except Exception as e:
+                    return chunk_obj, None, e
 
-        return {"num_chunks_processed": len(all_tags)}
+        # One client for the whole run: its pooled connections are reused by every call and closed at the end.
+        all_tags = []
+        async with self.llm.async_client() as client:
+            asks = [ask(client, chunk_obj, prompt) for chunk_obj, prompt in zip(chunks, prompts)]
+            for answer in asyncio.as_completed(asks):
+                chunk_obj, response, error = await answer
+                tags = await record(chunk_obj, response, error)
+                if tags is not None:
+                    all_tags.append((tags, chunk_obj))
+        return all_tags
+
+    def _record_response(self, chunk_obj, response: str, error: Exception):
+        i = chunk_obj.chunk_index
+        try:
+            if error is not None:
+                raise error
+            self.log_event("Received LLM response", {"chunk": i + 1, "preview": response[:200]})
+            tags = clean_json_output(response)
+            assert isinstance(tags, list)
+            return tags
+        except Exception as e:
+            self.log_event("Failed to parse chunk", {"chunk": i + 1, "error": str(e)})
+            chunk_obj.last_error = str(e)
+            chunk_obj.processing_attempts += 1
+            chunk_obj.save(update_fields=["last_error", "processing_attempts", "updated_at"])
+            return None
+
+    def _store_chunk_tags(self, tags: list[dict], document, chunk_obj) -> bool:
+        chunk_obj.processing_attempts += 1
+        try:
+            with transaction.atomic():
+                self._store_tags_in_db(tags, document, chunk_obj)
+                chunk_obj.processed = True
+                chunk_obj.last_error = None
+                chunk_obj.save(update_fields=["processed", "last_error", "processing_attempts", "updated_at"])
+            return True
+        except Exception as e:
+            self.log_event("Failed to store chunk tags", {"chunk": chunk_obj.chunk_index + 1, "error": str(e)})
+            chunk_obj.processed = False
+            chunk_obj.last_error = str(e)
+            chunk_obj.save(update_fields=["processed", "last_error", "processing_attempts", "updated_at"])
+            return False
 
     def _build_prompt(self, chunk: str, chunk_number: int = None) -> str:
         chunk_info = f"(Parte {chunk_number})" if chunk_number else ""
@@ -1,46 +1,67 @@
-import httpx
 from typing import List
-from .llm import BaseLlm
+from .llm import BaseLlm, get_http_client, new_async_http_client
+
+RESPONSE_TIMEOUT = 240
+PROMPT_TIMEOUT = 480
 
 
 class LlamaLlm(BaseLlm):
     def __init__(self, model: str = "llama3", base_url: str = "http://ollama:11434"):
         self.model = model
         self.base_url = base_url
+        self.client = get_http_client(base_url)
 
     def generate_response(self, query: str, chunks: List[str], context: dict) -> str:
+        return self._generate(self._build_response_prompt(query, chunks), timeout=RESPONSE_TIMEOUT)
+
+    def generate_from_prompt(self, prompt: str) -> str:
+        return self._generate(prompt, timeout=PROMPT_TIMEOUT)
+
+    def async_client(self):
+        return new_async_http_client(self.base_url)
+
+    async def agenerate_response(self, query: str, chunks: List[str], context: dict, client=None) -> str:
+        return await self._agenerate(self._build_response_prompt(query, chunks), RESPONSE_TIMEOUT, client)
+
+    async def agenerate_from_prompt(self, prompt: str, client=None) -> str:
+        return await self._agenerate(prompt, PROMPT_TIMEOUT, client)
+
+    def _build_response_prompt(self, query: str, chunks: List[str]) -> str:
         context_snippets = "\n\n".join(chunks)
 
-        prompt = (
+        return (
             "Você é um assistente clínico especializado em sepse, treinado com base no protocolo institucional. "
             "Sempre responda em português, com base apenas nas informações fornecidas.\n\n"
             f"🧠 Pergunta:\n{query}\n\n"
             f"📚 Trechos relevantes do protocolo:\n{context_snippets}\n\n"
         )
 
-        response = httpx.post(
-            f"{self.base_url}/api/generate",
-            json={
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=240
+    def _payload(self, prompt: str) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False
+        }
+
+    def _generate(self, prompt: str, timeout: int) -> str:
+        response = self.client.post(
+            "/api/generate",
+            json=self._payload(prompt),
+            timeout=timeout
         )
 
         response.raise_for_status()
         return response.json()["response"]
 
-    def generate_from_prompt(self, prompt: str) -> str:
+    async def _agenerate(self, prompt: str, timeout: int, client=None) -> str:
+        if client is None:
+            async with self.async_client() as client:
+                return await self._agenerate(prompt, timeout, client)
 
-        response = httpx.post(
-            f"{self.base_url}/api/generate",
-            json={
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=480
+        response = await client.post(
+            "/api/generate",
+            json=self._payload(prompt),
+            timeout=timeout
         )
 
         response.raise_for_status()
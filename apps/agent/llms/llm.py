@@ -1,9 +1,55 @@
+import asyncio
+import contextlib
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import List
 
+import httpx
+from django.conf import settings
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+    )
+
+
+@lru_cache
+def get_http_client(base_url: str) -> httpx.Client:
+    # Shared by every LLM instance of the process: requests reuse keep-alive connections.
+    return httpx.Client(base_url=base_url, limits=http_limits())
+
+
+def new_async_http_client(base_url: str) -> httpx.AsyncClient:
+    # Async clients are bound to the event loop that opens their connections: open one
+    # per run with `async with` and pass it to every call of that run (BaseLlm.async_client).
+    return httpx.AsyncClient(base_url=base_url, limits=http_limits())
+
 
 class BaseLlm(ABC):
     @abstractmethod
     def generate_response(self, query: str, chunks: List[str], context: dict) -> str:
         """Gera uma resposta da LLM com base na consulta e nos trechos de contexto."""
         pass
+
+    @abstractmethod
+    def generate_from_prompt(self, prompt: str) -> str:
+        """Gera uma resposta da LLM para um prompt já montado."""
+        pass
+
+    def async_client(self):
+        """
+        Cliente assíncrono para usar com `async with` e repassar às chamadas agenerate_*:
+        as conexões são reutilizadas entre as chamadas e fechadas ao sair do bloco.
+        """
+        return contextlib.nullcontext()
+
+    async def agenerate_response(self, query: str, chunks: List[str], context: dict, client=None) -> str:
+        """Versão assíncrona de generate_response; por padrão roda a versão síncrona em uma thread."""
+        return await asyncio.to_thread(self.generate_response, query, chunks, context)
+
+    async def agenerate_from_prompt(self, prompt: str, client=None) -> str:
+        """Versão assíncrona de generate_from_prompt; por padrão roda a versão síncrona em uma thread."""
+        return await asyncio.to_thread(self.generate_from_prompt, prompt)
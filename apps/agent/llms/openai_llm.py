@@ -1,18 +1,69 @@
-from openai import OpenAI
+from functools import lru_cache
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 from typing import List
-from .llm import BaseLlm
+from .llm import BaseLlm, http_limits
+
+API_KEY = "your-api-key-here"  # Replace with your actual OpenAI API key
+
+
+@lru_cache
+def get_client() -> OpenAI:
+    # Shared by every OpenAiLlm of the process: requests reuse keep-alive connections.
+    return OpenAI(api_key=API_KEY, http_client=DefaultHttpxClient(limits=http_limits()))
+
+
+def new_async_client() -> AsyncOpenAI:
+    # Bound to the event loop that opens its connections: see llm.new_async_http_client.
+    return AsyncOpenAI(api_key=API_KEY, http_client=DefaultAsyncHttpxClient(limits=http_limits()))
 
 
 class OpenAiLlm(BaseLlm):
     def __init__(self, model: str = "gpt-4o"):
-        self.client = OpenAI(
-            api_key="your-api-key-here")  # Replace with your actual OpenAI API key
+        self.client = get_client()
         self.model = model
 
     def generate_response(self, query: str, chunks: List[str], context: dict) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_response_messages(query, chunks)
+        )
+
+        return response.choices[0].message.content
+
+    def generate_from_prompt(self, prompt: str, text: str = None) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_prompt_messages(prompt)
+        )
+
+        return response.choices[0].message.content
+
+    def async_client(self):
+        return new_async_client()
+
+    async def agenerate_response(self, query: str, chunks: List[str], context: dict, client=None) -> str:
+        return await self._acreate(self._build_response_messages(query, chunks), client)
+
+    async def agenerate_from_prompt(self, prompt: str, client=None) -> str:
+        return await self._acreate(self._build_prompt_messages(prompt), client)
+
+    async def _acreate(self, messages: list[dict], client=None) -> str:
+        if client is None:
+            async with self.async_client() as client:
+                return await self._acreate(messages, client)
+
+        response = await client.chat.completions.create(
+            model=self.model,
+            messages=messages
+        )
+
+        return response.choices[0].message.content
+
+    def _build_response_messages(self, query: str, chunks: List[str]) -> list[dict]:
         context_snippets = "\n\n".join(chunks)
 
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": (
@@ -30,15 +81,8 @@ class OpenAiLlm(BaseLlm):
             }
         ]
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages
-        )
-
-        return response.choices[0].message.content
-
-    def generate_from_prompt(self, prompt: str, text: str = None) -> str:
-        messages = [
+    def _build_prompt_messages(self, prompt: str) -> list[dict]:
+        return [
             {
                 "role": "system",
                 "content": (
@@ -51,10 +95,3 @@ class OpenAiLlm(BaseLlm):
                 "content": prompt
             }
         ]
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages
-        )
-
-        return response.choices[0].message.content
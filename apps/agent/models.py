@@ -11,6 +11,19 @@ class DocumentChunk(models.Model):
     document = models.ForeignKey(KnowledgeDocument, on_delete=models.CASCADE, related_name="chunks")
     chunk_index = models.PositiveIntegerField()
     text = models.TextField()
+    content_hash = models.CharField(max_length=64, null=True, blank=True)  # sha256 of the normalized text
+
+    # Position in document.extracted_text (character offsets, 1-based pages)
+    start = models.PositiveIntegerField(null=True, blank=True)
+    end = models.PositiveIntegerField(null=True, blank=True)
+    page = models.PositiveIntegerField(null=True, blank=True)
+    page_end = models.PositiveIntegerField(null=True, blank=True)
+    tokens = models.PositiveIntegerField(null=True, blank=True)
+
+    # Embedding status: the vector index point this chunk is stored as, if any
+    point_id = models.UUIDField(null=True, blank=True, unique=True)
+    embedding_model_version = models.CharField(max_length=255, blank=True)
+    embedded_at = models.DateTimeField(null=True, blank=True)
 
     processed = models.BooleanField(default=False)
     processing_attempts = models.PositiveIntegerField(default=0)
@@ -20,7 +33,9 @@ class DocumentChunk(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ("document", "chunk_index")
+        constraints = [
+            models.UniqueConstraint(fields=["document", "content_hash"], name="unique_chunk_content_per_document"),
+        ]
         ordering = ["document", "chunk_index"]
 
     def __str__(self):
@@ -59,6 +59,15 @@ class DocumentChunkSerializer(serializers.ModelSerializer):
             "document",
             "chunk_index",
             "text",
+            "content_hash",
+            "start",
+            "end",
+            "page",
+            "page_end",
+            "tokens",
+            "point_id",
+            "embedding_model_version",
+            "embedded_at",
             "processed",
             "processing_attempts",
             "last_error",
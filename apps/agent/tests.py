@@ -1,3 +1,164 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import json
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from openai import AsyncOpenAI
+
+from apps.agent.agents.tag_generator import TagGenerationAgent
+from apps.agent.llms.llama_llm import LlamaLlm
+from apps.agent.llms.llm import get_http_client, http_limits
+from apps.agent.llms.openai_llm import OpenAiLlm
+from apps.agent.models import DocumentChunk, Tag
+from apps.protocols.models import KnowledgeDocument
+
+
+class _SlowLlm:
+    """Answers after a delay and records how many calls were in flight at once."""
+
+    def __init__(self):
+        self.in_flight = self.peak = self.answered = 0
+        self.clients_open = 0
+
+    @contextlib.asynccontextmanager
+    async def async_client(self):
+        self.clients_open += 1
+        yield "client"
+        self.clients_open -= 1
+
+    async def agenerate_from_prompt(self, prompt: str, client=None) -> str:
+        assert client == "client" and self.clients_open == 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        self.answered += 1
+        if "trecho 3" in prompt:
+            return "não é JSON"
+        number = prompt.rsplit("trecho ", 1)[1].split()[0]
+        return f'[{{"name": "tag_{number}", "category": "sepse", "conditions": []}}]'
+
+
+class TagGenerationAgentTests(TestCase):
+    def setUp(self):
+        self.document = KnowledgeDocument.objects.create(
+            name="sepse.pdf", category="infection_protocol", version="v1",
+            minio_path="infection_protocol__v1__sepse.pdf",
+        )
+        for i in range(8):
+            DocumentChunk.objects.create(document=self.document, chunk_index=i, text=f"trecho {i}",
+                                         content_hash=f"{i:064x}", processed=i == 0)
+        self.llm = _SlowLlm()
+        patch = mock.patch("apps.agent.agents.tag_generator.OpenAiLlm", return_value=self.llm)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_chunks_are_sent_concurrently_within_the_limit_and_resumable(self):
+        result = TagGenerationAgent(concurrency=3).run({"filename": self.document.minio_path})
+
+        self.assertEqual(result, {"num_chunks_processed": 6, "num_chunks_failed": 1})
+        self.assertEqual(self.llm.peak, 3)
+        self.assertEqual(set(Tag.objects.values_list("name", flat=True)), {f"tag_{i}" for i in (1, 2, 4, 5, 6, 7)})
+        failed = DocumentChunk.objects.get(chunk_index=3)
+        self.assertEqual((failed.processed, failed.processing_attempts), (False, 1))
+        self.assertEqual(DocumentChunk.objects.get(chunk_index=0).processing_attempts, 0)  # already done
+
+        result = TagGenerationAgent(concurrency=3).run({"filename": self.document.minio_path})
+        self.assertEqual(result, {"num_chunks_processed": 0, "num_chunks_failed": 1})  # only the failed one again
+        self.assertEqual(DocumentChunk.objects.get(chunk_index=3).processing_attempts, 2)
+        self.assertEqual(self.llm.clients_open, 0)
+
+    def test_chunk_stays_unprocessed_when_its_tags_cannot_be_stored(self):
+        store = TagGenerationAgent._store_tags_in_db
+
+        def failing_on_chunk_2(agent, tags, document, chunk):
+            store(agent, tags, document, chunk)  # written, then rolled back with the flag
+            if chunk.chunk_index == 2:
+                raise DatabaseError("connection lost")
+
+        with mock.patch.object(TagGenerationAgent, "_store_tags_in_db", autospec=True, side_effect=failing_on_chunk_2):
+            result = TagGenerationAgent(concurrency=3).run({"filename": self.document.minio_path})
+
+        self.assertEqual(result, {"num_chunks_processed": 5, "num_chunks_failed": 2})
+        chunk = DocumentChunk.objects.get(chunk_index=2)
+        self.assertEqual((chunk.processed, chunk.last_error), (False, "connection lost"))
+        self.assertFalse(Tag.objects.filter(name="tag_2").exists())
+        self.assertTrue(DocumentChunk.objects.get(chunk_index=4).processed)
+
+        result = TagGenerationAgent(concurrency=3).run({"filename": self.document.minio_path})
+        self.assertEqual(result, {"num_chunks_processed": 1, "num_chunks_failed": 1})  # retried and stored
+        self.assertTrue(Tag.objects.filter(name="tag_2").exists())
+
+    def test_prompts_are_logged_when_sent_not_when_queued(self):
+        answered_at_send = []
+
+        def log_event(agent, message, metadata=None):
+            if message == "Sending prompt to LLM":
+                answered_at_send.append(self.llm.answered)
+
+        with mock.patch.object(TagGenerationAgent, "log_event", autospec=True, side_effect=log_event):
+            TagGenerationAgent(concurrency=3).run({"filename": self.document.minio_path})
+
+        # The 4th prompt waits for a free slot, so it is logged after an answer came in.
+        self.assertEqual(len(answered_at_send), 7)
+        self.assertEqual(answered_at_send[:3], [0, 0, 0])
+        self.assertGreaterEqual(answered_at_send[3], 1)
+
+
+class LlmClientTests(SimpleTestCase):
+    def _transport(self, answer: dict):
+        self.requests = []
+
+        def handle(request):
+            self.requests.append(json.loads(request.content))
+            return httpx.Response(200, json=answer)
+
+        return httpx.MockTransport(handle)
+
+    def test_sync_clients_are_shared_per_process(self):
+        self.assertIs(LlamaLlm().client, LlamaLlm(model="llama3.1").client)
+        self.assertIsNot(LlamaLlm().client, LlamaLlm(base_url="http://other:11434").client)
+        self.assertIs(OpenAiLlm().client, OpenAiLlm(model="gpt-4o-mini").client)
+
+    @override_settings(LLM_HTTP_MAX_CONNECTIONS=7, LLM_HTTP_KEEPALIVE_SECONDS=5)
+    def test_pool_limits_come_from_settings(self):
+        limits = http_limits()
+        self.assertEqual((limits.max_connections, limits.max_keepalive_connections, limits.keepalive_expiry), (7, 7, 5))
+
+        get_http_client.cache_clear()
+        self.addCleanup(get_http_client.cache_clear)
+        pool = get_http_client("http://ollama:11434")._transport._pool
+        self.assertEqual((pool._max_connections, pool._keepalive_expiry), (7, 5))
+
+    def test_llama_async_calls_share_one_client_closed_at_the_end(self):
+        llm = LlamaLlm()
+        client = httpx.AsyncClient(base_url=llm.base_url, transport=self._transport({"response": "ok"}))
+
+        async def run():
+            with mock.patch("apps.agent.llms.llama_llm.new_async_http_client", return_value=client):
+                async with llm.async_client() as session:
+                    return await asyncio.gather(
+                        llm.agenerate_from_prompt("a", client=session),
+                        llm.agenerate_response("b", ["trecho"], {}, client=session),
+                    )
+
+        self.assertEqual(async_to_sync(run)(), ["ok", "ok"])
+        self.assertEqual([request["prompt"][:1] for request in self.requests], ["a", "V"])
+        self.assertTrue(client.is_closed)
+
+    def test_openai_async_call_without_a_client_closes_its_own(self):
+        answer = {
+            "id": "1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+        }
+        client = AsyncOpenAI(api_key="test", http_client=httpx.AsyncClient(transport=self._transport(answer)))
+
+        with mock.patch("apps.agent.llms.openai_llm.new_async_client", return_value=client):
+            self.assertEqual(async_to_sync(OpenAiLlm().agenerate_from_prompt)("prompt"), "ok")
+
+        self.assertEqual(self.requests[0]["messages"][-1], {"role": "user", "content": "prompt"})
+        self.assertTrue(client.is_closed())
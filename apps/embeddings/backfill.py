@@ -0,0 +1,96 @@
+import time
+from collections import deque
+from itertools import islice
+
+from apps.embeddings.encoder_pool import EncoderPool
+from apps.embeddings.models import EmbeddingBackfillCheckpoint
+from apps.embeddings.payloads import ENTITIES, entity_queryset
+from apps.embeddings.vector_pipeline import upsert_embeddings
+
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _batched(rows, size: int):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class EmbeddingBackfill:
+    """
+    Re-embeds every row of the given entity types. Rows are streamed in primary
+    key order with their related objects prefetched, encoded in batches across an
+    encoder process pool and upserted in order, so the per-type checkpoint always
+    marks a prefix of the table that is fully embedded.
+    """
+
+    def __init__(self, entity_types: list[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1, restart: bool = False, log=print):
+        self.entity_types = entity_types
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.restart = restart
+        self.log = log
+
+    def run(self) -> list[EmbeddingBackfillCheckpoint]:
+        with EncoderPool(self.workers) as pool:
+            return [self._backfill(entity_type, pool) for entity_type in self.entity_types]
+
+    def _backfill(self, entity_type: str, pool: EncoderPool) -> EmbeddingBackfillCheckpoint:
+        checkpoint = self._checkpoint(entity_type)
+        if checkpoint.completed:
+            self.log(f"✔️ {entity_type}: already backfilled ({checkpoint.embedded} rows), skipping")
+            return checkpoint
+        if checkpoint.last_pk:
+            self.log(f"⏩ Resuming {entity_type} after pk {checkpoint.last_pk}")
+
+        rows = (
+            entity_queryset(entity_type)
+            .filter(pk__gt=checkpoint.last_pk)
+            .order_by("pk")
+            .iterator(chunk_size=self.chunk_size)
+        )
+        generate = ENTITIES[entity_type][2]
+        started = time.monotonic()
+        done = 0
+
+        # Keep every worker busy while results are stored strictly in submission order.
+        in_flight = deque()
+        for batch in _batched(rows, self.batch_size):
+            payloads = [generate(obj) for obj in batch]
+            in_flight.append((batch[-1].pk, payloads, pool.submit([payload["text"] for payload in payloads])))
+
+            if len(in_flight) >= self.workers * 2:
+                done += self._store(checkpoint, *in_flight.popleft())
+                self._log_progress(entity_type, done, started)
+
+        while in_flight:
+            done += self._store(checkpoint, *in_flight.popleft())
+            self._log_progress(entity_type, done, started)
+
+        checkpoint.completed = True
+        checkpoint.save()
+        self.log(f"✅ {entity_type}: {checkpoint.embedded} rows embedded")
+        return checkpoint
+
+    def _store(self, checkpoint: EmbeddingBackfillCheckpoint, last_pk: int, payloads: list[dict], future) -> int:
+        upsert_embeddings(payloads, future.result())
+        checkpoint.last_pk = last_pk
+        checkpoint.embedded += len(payloads)
+        checkpoint.save()
+        return len(payloads)
+
+    def _log_progress(self, entity_type: str, done: int, started: float):
+        elapsed = time.monotonic() - started
+        self.log(f"📦 {entity_type}: {done} rows in {elapsed:.1f}s → {done / elapsed:.0f} rows/s")
+
+    def _checkpoint(self, entity_type: str) -> EmbeddingBackfillCheckpoint:
+        checkpoint, _ = EmbeddingBackfillCheckpoint.objects.get_or_create(entity_type=entity_type)
+        if self.restart:
+            checkpoint.last_pk = 0
+            checkpoint.embedded = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        return checkpoint
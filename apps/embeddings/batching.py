@@ -0,0 +1,199 @@
+import json
+import os
+import socket
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.embeddings.models import EmbeddingOutbox
+from apps.embeddings.payloads import build_payloads
+from apps.embeddings.vector_pipeline import process_embeddings
+
+QUEUE_KEY = "embeddings:pending"
+PROCESSING_PREFIX = "embeddings:processing:"  # + worker id: the window that worker is embedding
+HEARTBEAT_PREFIX = "embeddings:batcher:"  # + worker id: present while that worker is alive
+HEARTBEAT_TTL = 30  # seconds; longer than any window takes to embed
+STALE_CHECK_INTERVAL = 30  # seconds between looks for windows left by dead batchers
+MAX_ATTEMPTS = 3
+FAILED_KEY = "embeddings:failed"  # jobs that failed MAX_ATTEMPTS times on their own
+
+
+@lru_cache()
+def get_queue():
+    return redis.Redis.from_url(settings.EMBEDDING_QUEUE_REDIS_URL)
+
+
+def enqueue_embeddings(entity_type: str, ids: list, attempts: int = 0, outbox_ids: list = None):
+    """
+    Push embedding jobs to the pending queue drained by the batching worker.
+    `outbox_ids[i]`, when given, is the EmbeddingOutbox row to delete once
+    `ids[i]` is embedded.
+    """
+    outbox_ids = outbox_ids or [None] * len(ids)
+    if ids:
+        get_queue().rpush(QUEUE_KEY, *[
+            json.dumps({"type": entity_type, "id": object_id, "attempts": attempts, "outbox_id": outbox_id})
+            for object_id, outbox_id in zip(ids, outbox_ids)
+        ])
+
+
+def processing_key(worker_id: str) -> str:
+    return f"{PROCESSING_PREFIX}{worker_id}"
+
+
+def drain_window(max_items: int, window_ms: int, worker_id: str, idle_timeout: float = 1.0) -> list[dict]:
+    """
+    Block until a job arrives, then keep collecting until `max_items` jobs are
+    gathered or `window_ms` milliseconds have passed since the first one.
+
+    Jobs are moved, not popped, into this worker's processing list, where they
+    stay until the window is embedded (or handed back) by finish_window, so a
+    worker that dies mid-batch loses nothing: requeue_stale_windows returns
+    its window to the pending queue.
+    """
+    queue = get_queue()
+    processing = processing_key(worker_id)
+    first = queue.blmove(QUEUE_KEY, processing, idle_timeout, "LEFT", "RIGHT")
+    if not first:
+        return []
+
+    jobs = [json.loads(first)]
+    deadline = time.monotonic() + window_ms / 1000
+
+    while len(jobs) < max_items:
+        ready = queue.lmove(QUEUE_KEY, processing, "LEFT", "RIGHT")
+        if ready:
+            jobs.append(json.loads(ready))
+            continue
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        item = queue.blmove(QUEUE_KEY, processing, remaining, "LEFT", "RIGHT")
+        if not item:
+            break
+        jobs.append(json.loads(item))
+
+    return jobs
+
+
+def finish_window(worker_id: str):
+    """
+    Drop the window from the processing list once it is embedded, or once its
+    failed jobs have been put back in the pending queue.
+    """
+    get_queue().delete(processing_key(worker_id))
+
+
+def heartbeat(worker_id: str):
+    get_queue().set(f"{HEARTBEAT_PREFIX}{worker_id}", 1, ex=HEARTBEAT_TTL)
+
+
+def requeue_stale_windows(log=print) -> int:
+    """
+    Move the windows of workers that stopped sending heartbeats (killed or
+    OOM-killed mid-batch) back to the pending queue: a heartbeat key expires
+    HEARTBEAT_TTL seconds after its worker's last beat. Returns the number of jobs requeued.
+    """
+    queue = get_queue()
+    requeued = 0
+    for key in queue.scan_iter(match=f"{PROCESSING_PREFIX}*"):
+        worker_id = key.decode()[len(PROCESSING_PREFIX):]
+        if queue.exists(f"{HEARTBEAT_PREFIX}{worker_id}"):
+            continue
+        while queue.lmove(key, QUEUE_KEY, "RIGHT", "LEFT"):
+            requeued += 1
+    if requeued:
+        log(f"♻️ Requeued {requeued} embedding jobs left by stopped batchers")
+    return requeued
+
+
+def process_batch(jobs: list[dict], worker_id: str = None) -> int:
+    """
+    Build every payload in the window, then encode and upsert them with one model
+    call and one Qdrant request. Duplicate jobs in a window are coalesced.
+    The outbox rows of the window are deleted once it is upserted.
+
+    If the window fails, its jobs are retried one by one so a single bad job
+    (a row that cannot be built or encoded) does not take its neighbours down:
+    only the jobs that fail again are charged an attempt.
+    Returns the number of embedded points.
+    """
+    by_key = {}
+    for job in jobs:
+        by_key.setdefault((job["type"], job["id"]), []).append(job)
+
+    try:
+        return _embed(by_key)
+    except Exception as e:
+        print(f"❌ Embedding batch of {len(jobs)} jobs failed, retrying them one by one: {e}")
+
+    embedded = 0
+    for key, duplicates in by_key.items():
+        if worker_id:
+            heartbeat(worker_id)
+        try:
+            embedded += _embed({key: duplicates})
+        except Exception as e:
+            _retry_or_give_up(duplicates, e)
+    return embedded
+
+
+def _embed(by_key: dict) -> int:
+    ids_by_type = {}
+    for entity_type, object_id in by_key:
+        ids_by_type.setdefault(entity_type, []).append(object_id)
+
+    payloads = []
+    for entity_type, ids in ids_by_type.items():
+        payloads.extend(build_payloads(entity_type, ids))
+
+    process_embeddings(payloads)
+    outbox_ids = [job["outbox_id"] for duplicates in by_key.values() for job in duplicates if job.get("outbox_id")]
+    if outbox_ids:
+        EmbeddingOutbox.objects.filter(id__in=outbox_ids).delete()
+    return len(payloads)
+
+
+def _retry_or_give_up(duplicates: list[dict], error: Exception):
+    job = duplicates[0]
+    attempts = max(duplicate.get("attempts", 0) for duplicate in duplicates) + 1
+
+    if attempts < MAX_ATTEMPTS:
+        enqueue_embeddings(job["type"], [job["id"]] * len(duplicates), attempts=attempts,
+                           outbox_ids=[duplicate.get("outbox_id") for duplicate in duplicates])
+        return
+
+    # Kept for inspection; its outbox rows, if any, are published again by the dispatcher later on.
+    print(f"❌ Giving up on {job['type']} {job['id']} after {MAX_ATTEMPTS} attempts: {error}")
+    get_queue().rpush(FAILED_KEY, json.dumps({**job, "attempts": attempts, "error": str(error)}))
+
+
+def run_batcher(max_items: int = None, window_ms: int = None, log=print):
+    max_items = max_items or settings.EMBEDDING_BATCH_SIZE
+    window_ms = window_ms or settings.EMBEDDING_BATCH_WINDOW_MS
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    log(f"🚀 Embedding batcher {worker_id} started (≤{max_items} items / {window_ms} ms per window)")
+    next_recovery = 0.0
+    while True:
+        heartbeat(worker_id)
+        # Every batcher keeps looking for windows left by dead peers, not only at startup.
+        if time.monotonic() >= next_recovery:
+            requeue_stale_windows(log)
+            next_recovery = time.monotonic() + STALE_CHECK_INTERVAL
+
+        jobs = drain_window(max_items, window_ms, worker_id)
+        if not jobs:
+            continue
+
+        close_old_connections()
+        started = time.monotonic()
+        embedded = process_batch(jobs, worker_id)
+        finish_window(worker_id)
+        elapsed = time.monotonic() - started
+        log(f"📦 {len(jobs)} jobs → {embedded} points in {elapsed * 1000:.0f} ms "
+            f"({embedded / elapsed if elapsed else 0:.0f} points/s)")
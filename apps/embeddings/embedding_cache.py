@@ -0,0 +1,203 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import redis
+from django.conf import settings
+
+from apps.embeddings.embedding_client import current_backend, encode_with_backend
+from apps.embeddings.model_registry import BIOBERT_MODEL
+
+# Seconds between printed Redis warnings; failures in between are counted and
+# reported with the next one, so an outage does not print once per lookup.
+WARN_INTERVAL = 60
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (model name, encode variant, hash of the normalized text).
+
+    Two tiers: a bounded in-process LRU and an optional Redis tier shared by every
+    worker. Redis entries use a sliding TTL, so texts that keep coming back stay
+    cached and one-off texts expire. With `local_ttl`, in-process entries also
+    expire that many seconds after they were stored.
+    """
+
+    def __init__(self, max_size: int = 10000, redis_url: str = None, ttl: int = 30 * 24 * 3600,
+                 local_ttl: float = None, namespace: str = "emb"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.namespace = namespace
+        self._local = OrderedDict()   # key → (vector, expires_at or None)
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._warned_at = None
+        self._suppressed_warnings = 0
+
+    def key(self, model_name: str, text: str, variant: str = "") -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{model_name}:{variant}:{digest}"
+
+    def get_many(self, keys: list[str]) -> list:
+        vectors = [None] * len(keys)
+        remote = []
+        now = time.monotonic()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._local.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    self._local.move_to_end(key)
+                    self.memory_hits += 1
+                    vectors[i] = entry[0]
+                else:
+                    if entry is not None:
+                        del self._local[key]
+                    remote.append(i)
+
+        if remote and self._redis:
+            try:
+                pipe = self._redis.pipeline()
+                for i in remote:
+                    pipe.getex(keys[i], ex=self.ttl)
+                raw_values = pipe.execute()
+            except redis.RedisError as e:
+                self._warn(f"Redis unavailable: {e}")
+                raw_values = [None] * len(remote)
+
+            found = {}
+            for i, raw in zip(remote, raw_values):
+                if raw:
+                    vectors[i] = np.frombuffer(raw, dtype=np.float32)
+                    found[keys[i]] = vectors[i]
+            with self._lock:
+                self.redis_hits += len(found)
+            self._set_local(found)
+
+        with self._lock:
+            self.misses += sum(1 for vector in vectors if vector is None)
+        return vectors
+
+    def set_many(self, entries: dict):
+        entries = {key: np.asarray(vector, dtype=np.float32) for key, vector in entries.items()}
+        self._set_local(entries)
+
+        if entries and self._redis:
+            try:
+                pipe = self._redis.pipeline()
+                for key, vector in entries.items():
+                    pipe.set(key, vector.tobytes(), ex=self.ttl)
+                pipe.execute()
+            except redis.RedisError as e:
+                self._warn(f"failed to persist {len(entries)} vectors: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.redis_hits + self.misses
+            return {
+                "size": len(self._local),
+                "max_size": self.max_size,
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+                "redis_enabled": self._redis is not None,
+            }
+
+    def _warn(self, message: str):
+        with self._lock:
+            now = time.monotonic()
+            if self._warned_at is not None and now - self._warned_at < WARN_INTERVAL:
+                self._suppressed_warnings += 1
+                return
+            suppressed, self._suppressed_warnings, self._warned_at = self._suppressed_warnings, 0, now
+
+        more = f" ({suppressed} similar warnings in the last {WARN_INTERVAL}s)" if suppressed else ""
+        print(f"⚠️ Embedding cache: {message}{more}")
+
+    def _set_local(self, entries: dict):
+        expires_at = time.monotonic() + self.local_ttl if self.local_ttl else None
+        with self._lock:
+            for key, vector in entries.items():
+                self._local[key] = (vector, expires_at)
+                self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache(
+        max_size=settings.EMBEDDING_CACHE_SIZE,
+        redis_url=settings.EMBEDDING_CACHE_REDIS_URL,
+        ttl=settings.EMBEDDING_CACHE_TTL,
+    )
+
+
+@lru_cache()
+def get_query_cache() -> EmbeddingCache:
+    """
+    Cache of search query vectors: smaller and shorter-lived than the event
+    cache, in its own Redis namespace so query TTLs never shorten event entries.
+    """
+    return EmbeddingCache(
+        max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+        redis_url=settings.EMBEDDING_CACHE_REDIS_URL,
+        ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+        local_ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+        namespace="qemb",
+    )
+
+
+def encode_cached(model_name: str, texts: list[str], normalize_embeddings: bool = False,
+                  batch_size: int = 32, cache: EmbeddingCache = None) -> np.ndarray:
+    """
+    Drop-in for `encode(texts)` that only encodes texts missing from the
+    cache (the event embedding cache unless one is given). Identical texts
+    within the call are encoded once.
+    """
+    cache = cache or get_embedding_cache()
+    # Backends drift slightly from each other, so their vectors are cached separately,
+    # keyed on the backend that encodes them (the embedding server's, when it is used).
+    mode = 'norm' if normalize_embeddings else 'raw'
+    keys = [cache.key(model_name, text, f"{current_backend()}:{mode}") for text in texts]
+    vectors = cache.get_many(keys)
+
+    pending = {}
+    for key, text, vector in zip(keys, texts, vectors):
+        if vector is None:
+            pending.setdefault(key, text)
+
+    if pending:
+        encoded, backend = encode_with_backend(
+            list(pending.values()),
+            model_name=model_name,
+            batch_size=batch_size,
+            normalize_embeddings=normalize_embeddings,
+        )
+        fresh = dict(zip(pending.keys(), encoded))
+        # Stored under the backend that actually encoded them (it changes if the server just went down).
+        cache.set_many({cache.key(model_name, text, f"{backend}:{mode}"): fresh[key] for key, text in pending.items()})
+        vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+    return np.vstack(vectors).astype(np.float32)
+
+
+def encode_queries(texts: list[str], normalize_embeddings: bool = False) -> np.ndarray:
+    """
+    Encode search queries through the query cache. Every semantic search entry
+    point goes through here, so a repeated prompt or query skips the encode.
+    """
+    return encode_cached(BIOBERT_MODEL, texts, normalize_embeddings=normalize_embeddings, cache=get_query_cache())
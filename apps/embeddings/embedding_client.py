@@ -0,0 +1,97 @@
+import os
+import time
+from functools import lru_cache
+
+import httpx
+import numpy as np
+from django.conf import settings
+
+from apps.embeddings.model_registry import BIOBERT_MODEL, get_model
+
+# After the embedding server fails, encode in-process for this long before trying it again.
+SERVER_RETRY_AFTER = 30
+
+_server_down_until = 0.0
+_server_backend = None  # EMBEDDING_BACKEND of the embedding server, as it reports it
+
+
+@lru_cache()
+def _server_client(pid: int) -> httpx.Client:
+    # Keyed by pid so forked workers never share the parent's pooled connections.
+    url = settings.EMBEDDING_SERVER_URL
+    if url.startswith("unix://"):
+        return httpx.Client(
+            transport=httpx.HTTPTransport(uds=url[len("unix://"):]),
+            base_url="http://embedding-server",
+            timeout=settings.EMBEDDING_SERVER_TIMEOUT,
+        )
+    return httpx.Client(base_url=url, timeout=settings.EMBEDDING_SERVER_TIMEOUT)
+
+
+def current_backend() -> str:
+    """
+    Backend the next encode() runs on: the server's while the embedding server
+    is in use, EMBEDDING_BACKEND otherwise. Caches key their vectors on it.
+    """
+    global _server_backend
+
+    if _server_in_use() and _server_backend is None:
+        try:
+            response = _server_client(os.getpid()).get("/health")
+            response.raise_for_status()
+            _server_backend = response.json()["backend"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            _server_failed(e)
+
+    return _server_backend if _server_in_use() else settings.EMBEDDING_BACKEND
+
+
+def encode(texts: list[str], model_name: str = BIOBERT_MODEL, normalize_embeddings: bool = False,
+           batch_size: int = 32) -> np.ndarray:
+    """
+    Encode `texts` through the embedding server when EMBEDDING_SERVER_URL is set,
+    falling back to the in-process model if it is not configured or unreachable.
+    """
+    return encode_with_backend(texts, model_name, normalize_embeddings, batch_size)[0]
+
+
+def encode_with_backend(texts: list[str], model_name: str = BIOBERT_MODEL, normalize_embeddings: bool = False,
+                        batch_size: int = 32) -> tuple[np.ndarray, str]:
+    """Like encode(), also returning the backend that produced the vectors."""
+    if _server_in_use() and texts:
+        try:
+            return _encode_remote(texts, model_name, normalize_embeddings)
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            _server_failed(e)
+
+    vectors = np.asarray(
+        get_model(model_name).encode(texts, batch_size=batch_size, normalize_embeddings=normalize_embeddings),
+        dtype=np.float32,
+    )
+    return vectors, settings.EMBEDDING_BACKEND
+
+
+def _server_in_use() -> bool:
+    return bool(settings.EMBEDDING_SERVER_URL) and time.monotonic() >= _server_down_until
+
+
+def _server_failed(error: Exception):
+    global _server_down_until, _server_backend
+
+    print(f"⚠️ Embedding server unavailable, encoding in-process for {SERVER_RETRY_AFTER}s: {error}")
+    _server_down_until = time.monotonic() + SERVER_RETRY_AFTER
+    _server_backend = None  # asked again when the server is back, in case it restarted on another backend
+
+
+def _encode_remote(texts: list[str], model_name: str, normalize_embeddings: bool) -> tuple[np.ndarray, str]:
+    global _server_backend
+
+    response = _server_client(os.getpid()).post("/encode", json={
+        "model": model_name,
+        "texts": texts,
+        "normalize": normalize_embeddings,
+    })
+    response.raise_for_status()
+    rows, dim = (int(n) for n in response.headers["X-Embedding-Shape"].split(","))
+    _server_backend = response.headers["X-Embedding-Backend"]
+    return np.frombuffer(response.content, dtype="<f4").reshape(rows, dim), _server_backend
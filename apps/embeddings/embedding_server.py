@@ -0,0 +1,205 @@
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from django.conf import settings
+
+from apps.embeddings.model_registry import BIOBERT_MODEL, get_model, registry_stats
+
+
+def served_models() -> set[str]:
+    """Models clients may ask for: BioBERT and EMBEDDING_WARM_MODELS."""
+    return {BIOBERT_MODEL, *settings.EMBEDDING_WARM_MODELS}
+
+
+class _PendingEncode:
+    def __init__(self, model_name: str, texts: list[str], normalize: bool):
+        self.model_name = model_name
+        self.texts = texts
+        self.normalize = normalize
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+
+class CoalescingEncoder:
+    """
+    Funnels encode requests from many connections through one model thread.
+
+    The first waiting request opens a window of `window_ms`; everything that
+    arrives before it closes (up to `max_batch` texts) is encoded in a single
+    model call per (model, normalize) pair and split back per request.
+    Every model runs on `backend` (EMBEDDING_BACKEND by default).
+    """
+
+    def __init__(self, max_batch: int = 128, window_ms: int = 10, backend: str = None):
+        self.max_batch = max_batch
+        self.window_ms = window_ms
+        self.backend = backend or settings.EMBEDDING_BACKEND
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._loop, name="embedding-encoder", daemon=True).start()
+
+    def encode(self, model_name: str, texts: list[str], normalize: bool = False) -> np.ndarray:
+        pending = _PendingEncode(model_name, texts, normalize)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error:
+            raise pending.error
+        return pending.vectors
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_texts_per_batch": self.texts / self.batches if self.batches else 0.0,
+                "backend": self.backend,
+                "queued": self._queue.qsize(),
+                **registry_stats(),
+            }
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.window_ms / 1000
+
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                size += len(pending.texts)
+
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: list[_PendingEncode]):
+        groups = {}
+        for pending in batch:
+            groups.setdefault((pending.model_name, pending.normalize), []).append(pending)
+
+        for (model_name, normalize), requests in groups.items():
+            texts = [text for pending in requests for text in pending.texts]
+            try:
+                vectors = np.asarray(
+                    get_model(model_name, self.backend).encode(
+                        texts, batch_size=self.max_batch, normalize_embeddings=normalize),
+                    dtype=np.float32,
+                )
+                offset = 0
+                for pending in requests:
+                    pending.vectors = vectors[offset:offset + len(pending.texts)]
+                    offset += len(pending.texts)
+            except Exception as e:
+                for pending in requests:
+                    pending.error = e
+
+            with self._stats_lock:
+                self.requests += len(requests)
+                self.batches += 1
+                self.texts += len(texts)
+
+        for pending in batch:
+            pending.done.set()
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /encode  {"model": ..., "texts": [...], "normalize": bool}
+        → little-endian float32 matrix, shape in the `X-Embedding-Shape` header and
+          the backend that encoded it in `X-Embedding-Backend`. `model` must be
+          one of served_models().
+    GET /health   → status and backend.
+    GET /stats    → batching counters and model memory footprint.
+    """
+
+    encoder: CoalescingEncoder = None
+
+    def do_POST(self):
+        if self.path != "/encode":
+            return self._send_json({"error": f"Unknown path {self.path}"}, status=404)
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texts = body["texts"]
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise ValueError("'texts' must be a list of strings.")
+            model_name = body.get("model", BIOBERT_MODEL)
+            if model_name not in served_models():
+                raise ValueError(f"Model '{model_name}' is not served here.")
+            normalize = bool(body.get("normalize", False))
+        except (ValueError, KeyError) as e:
+            return self._send_json({"error": str(e)}, status=400)
+
+        try:
+            vectors = self.encoder.encode(model_name, texts, normalize) if texts else np.zeros((0, 0), np.float32)
+        except Exception as e:
+            return self._send_json({"error": str(e)}, status=500)
+
+        payload = vectors.astype("<f4").tobytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-Embedding-Shape", f"{vectors.shape[0]},{vectors.shape[1]}")
+        self.send_header("X-Embedding-Backend", self.encoder.backend)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send_json(self.encoder.stats())
+        if self.path == "/health":
+            return self._send_json({"status": "ok", "backend": self.encoder.backend})
+        return self._send_json({"error": f"Unknown path {self.path}"}, status=404)
+
+    def _send_json(self, data: dict, status: int = 200):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Every web and Celery worker connects at once under load; the default backlog of 5
+    # makes Unix socket connects fail with EAGAIN.
+    request_queue_size = 128
+
+
+class TCPHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(encoder: CoalescingEncoder, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None):
+    handler = type("BoundEmbeddingRequestHandler", (EmbeddingRequestHandler,), {"encoder": encoder})
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return UnixHTTPServer(socket_path, handler)
+
+    return TCPHTTPServer((host, port), handler)
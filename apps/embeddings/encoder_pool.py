@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+
+from apps.embeddings.embedding_cache import encode_cached
+from apps.embeddings.model_registry import BIOBERT_MODEL
+
+# Kept free of model imports: spawned workers import this module before Django's
+# app registry exists, and encoding only needs settings.
+
+
+def _init_worker(torch_threads: int):
+    import torch
+
+    # Split the cores between workers instead of every worker using all of them.
+    torch.set_num_threads(torch_threads)
+
+
+def _encode(texts: list[str]):
+    return encode_cached(BIOBERT_MODEL, texts, batch_size=settings.EMBEDDING_BATCH_SIZE)
+
+
+class EncoderPool:
+    """
+    Encodes text batches across `workers` processes, each holding its own model
+    (or calling the embedding server when EMBEDDING_SERVER_URL is set).
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(max(1, (os.cpu_count() or 1) // workers),),
+        )
+
+    def submit(self, texts: list[str]) -> Future:
+        return self._executor.submit(_encode, texts)
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
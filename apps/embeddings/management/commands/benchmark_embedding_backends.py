@@ -0,0 +1,61 @@
+import glob
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.embeddings.model_registry import BACKENDS, BIOBERT_MODEL, get_model, registry_stats
+from apps.protocols.chunking import split_into_chunks
+from apps.protocols.pdf_extraction import extract_text_from_pdf
+
+
+class Command(BaseCommand):
+    help = 'Compare embedding backends on the sample protocol chunks: sentences/sec and cosine drift vs fp32 torch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdfs', nargs='*', help='Protocol PDFs (default: sample_protocols/*.pdf)')
+        parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+        parser.add_argument('--model', default=BIOBERT_MODEL)
+        parser.add_argument('--limit', type=int, default=256, help='Max chunks to encode')
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--runs', type=int, default=3, help='Timed passes per backend (best one is reported)')
+
+    def handle(self, *args, **options):
+        pdfs = options['pdfs'] or sorted(glob.glob(os.path.join(settings.BASE_DIR, 'sample_protocols', '*.pdf')))
+        if not pdfs:
+            raise CommandError("No protocol PDFs found.")
+
+        chunks = []
+        for pdf in pdfs:
+            chunks.extend(split_into_chunks(extract_text_from_pdf(pdf)))
+        chunks = chunks[:options['limit']]
+        self.stdout.write(f"📄 {len(chunks)} chunks from {len(pdfs)} PDF(s)")
+
+        reference = None
+        for backend in ['torch'] + [b for b in options['backends'] if b != 'torch']:
+            model = get_model(options['model'], backend)
+            model.encode(chunks[:options['batch_size']], batch_size=options['batch_size'])  # warm-up
+
+            best = None
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                vectors = model.encode(chunks, batch_size=options['batch_size'], normalize_embeddings=True)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            line = f"⚡ {backend:<10} {len(chunks) / best:8.1f} sentences/s"
+            if reference is None:
+                reference = vectors
+                line += "  (fp32 reference)"
+            else:
+                cosine = np.sum(reference * vectors, axis=1)
+                line += (f"  cosine vs fp32: mean {cosine.mean():.4f}, min {cosine.min():.4f}, "
+                         f"p99 drift {np.percentile(1 - cosine, 99):.4f}")
+            self.stdout.write(line)
+
+        for name, stats in registry_stats()['models'].items():
+            self.stdout.write(
+                f"📦 {name}: {stats['weight_bytes'] / 1024 ** 2:.0f} MB, loaded in {stats['load_seconds']}s"
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.embeddings.outbox import run_dispatcher, dispatch_outbox, DEFAULT_CLAIM_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Publish pending embedding triggers from the outbox table as batched embedding jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--claim-size', type=int, default=DEFAULT_CLAIM_SIZE,
+                            help='Max outbox rows claimed (and published as one job) per round')
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the outbox once and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = 0
+            while dispatched := dispatch_outbox(options['claim_size']):
+                total += dispatched
+            self.stdout.write(self.style.SUCCESS(f'✅ Published {total} embedding triggers.'))
+            return
+
+        run_dispatcher(
+            claim_size=options['claim_size'],
+            poll_interval=options['poll_interval'],
+            log=self.stdout.write,
+        )
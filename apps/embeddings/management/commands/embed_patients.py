@@ -1,15 +1,11 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from apps.patients.models import Patient
-from apps.embeddings.vector_pipeline import embed_and_store_patient
 
 
 class Command(BaseCommand):
-    help = 'Embed all patients into the vector DB'
+    help = 'Embed all patients into the vector DB (shortcut for `reembed patient`)'
 
     def handle(self, *args, **kwargs):
-        patients = Patient.objects.all()
-
-        for patient in patients:
-            embed_and_store_patient(patient)
+        call_command('reembed', 'patient', stdout=self.stdout)
 
         self.stdout.write(self.style.SUCCESS('✅ All patients embedded successfully.'))
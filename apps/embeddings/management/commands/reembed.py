@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.embeddings.backfill import EmbeddingBackfill, DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE
+from apps.embeddings.payloads import ENTITIES
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the clinical-data collection for every entity type (or the given ones). "
+        "Progress is checkpointed per type, so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity_types', nargs='*',
+                            help=f"Entity types to backfill (default: all of {', '.join(ENTITIES)})")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows per encode batch / checkpoint')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched per database round trip')
+        parser.add_argument('--workers', type=int, default=1, help='Encoder processes')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore previous checkpoints and re-embed everything')
+
+    def handle(self, *args, **options):
+        unknown = set(options['entity_types']) - set(ENTITIES)
+        if unknown:
+            raise CommandError(f"Unknown entity types: {', '.join(sorted(unknown))}")
+
+        EmbeddingBackfill(
+            options['entity_types'] or list(ENTITIES),
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            restart=options['restart'],
+            log=self.stdout.write,
+        ).run()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.embeddings.batching import run_batcher
+
+
+class Command(BaseCommand):
+    help = 'Drain pending embedding jobs in size/time-bounded windows and embed each window with one model call'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Max jobs per window (default: EMBEDDING_BATCH_SIZE)')
+        parser.add_argument('--window-ms', type=int, help='Max window duration (default: EMBEDDING_BATCH_WINDOW_MS)')
+
+    def handle(self, *args, **options):
+        run_batcher(
+            max_items=options['batch_size'],
+            window_ms=options['window_ms'],
+            log=self.stdout.write,
+        )
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.embeddings.embedding_server import CoalescingEncoder, make_server
+from apps.embeddings.model_registry import BIOBERT_MODEL, registry_stats, warm_models
+
+
+class Command(BaseCommand):
+    help = 'Serve encode requests from every worker with one shared model, coalescing them into dynamic batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--socket', help='Listen on this Unix socket path instead of TCP')
+        parser.add_argument('--max-batch', type=int, help='Max texts per model call')
+        parser.add_argument('--window-ms', type=int, help='Coalescing window in ms')
+
+    def handle(self, *args, **options):
+        warm_models(settings.EMBEDDING_WARM_MODELS or [BIOBERT_MODEL])
+        self.stdout.write(f"🧠 Models ready: {registry_stats()}")
+
+        encoder = CoalescingEncoder(
+            max_batch=options['max_batch'] or settings.EMBEDDING_SERVER_MAX_BATCH,
+            window_ms=options['window_ms'] or settings.EMBEDDING_SERVER_WINDOW_MS,
+        )
+        server = make_server(encoder, host=options['host'], port=options['port'], socket_path=options['socket'])
+
+        where = options['socket'] or f"{options['host']}:{options['port']}"
+        self.stdout.write(f"🚀 Embedding server listening on {where}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
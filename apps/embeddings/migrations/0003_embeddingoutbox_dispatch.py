@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('embeddings', '0002_embeddingbackfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingoutbox',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='embeddingoutbox',
+            name='dispatched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
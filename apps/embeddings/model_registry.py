@@ -0,0 +1,128 @@
+import gc
+import os
+import resource
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from sentence_transformers import SentenceTransformer
+
+BIOBERT_MODEL = "pritamdeka/BioBERT-mnli-snli-scinli-scitail-mednli-stsb"
+
+# "torch" is the fp32 PyTorch model; "onnx" runs the exported ONNX graph and
+# "onnx-int8" its dynamically int8-quantized export (needs optimum[onnxruntime]).
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_models = {}
+_load_stats = {}
+_lock = threading.Lock()
+
+
+def get_model(name: str = BIOBERT_MODEL, backend: str = None) -> SentenceTransformer:
+    """
+    Return the process-wide instance of `name` for `backend` (EMBEDDING_BACKEND by
+    default), loading it on first use. Every app shares this instance instead of
+    keeping its own copy.
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    key = (name, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            print(f"📦 Loading embedding model {name} ({backend})...")
+            started = time.monotonic()
+            _models[key] = _load(name, backend)
+            _load_stats[f"{name} ({backend})"] = stats = {
+                "load_seconds": round(time.monotonic() - started, 2),
+                "weight_bytes": _weight_bytes(_models[key]),
+            }
+            print(f"✅ Loaded {name} ({backend}) in {stats['load_seconds']}s "
+                  f"({stats['weight_bytes'] / 1024 ** 2:.0f} MB of weights)")
+        return _models[key]
+
+
+def warm_models(names: list[str] = None, freeze: bool = False) -> int:
+    """
+    Load the configured models up front and return how many were loaded.
+
+    Pass `freeze=True` only in the parent process of a prefork server, right
+    before it forks (Celery `worker_init`; with gunicorn, `preload_app = True`
+    and an `on_starting` hook): prefork children then share the weights
+    copy-on-write instead of each loading their own copy.
+    """
+    names = names if names is not None else settings.EMBEDDING_WARM_MODELS
+    for name in names:
+        get_model(name)
+
+    if freeze and names:
+        # Move everything allocated so far out of the GC's reach: collections in the
+        # children would otherwise touch these objects and un-share their pages.
+        gc.freeze()
+    return len(names)
+
+
+@lru_cache()
+def get_tokenizer(name: str = BIOBERT_MODEL):
+    """
+    The (fast) tokenizer of `name`, without loading the model weights: chunkers
+    measure text in model tokens even where encoding happens on the embedding server.
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(name)
+
+
+def registry_stats() -> dict:
+    return {
+        "models": {name: dict(stats) for name, stats in _load_stats.items()},
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def _load(name: str, backend: str) -> SentenceTransformer:
+    if backend == "torch":
+        return SentenceTransformer(name)
+    if backend in ("onnx", "onnx-int8"):
+        return _load_onnx(name, quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {', '.join(BACKENDS)}.")
+
+
+def _load_onnx(name: str, quantized: bool) -> SentenceTransformer:
+    """
+    Load the ONNX export of `name` (dynamically int8-quantized if `quantized`),
+    exporting it into EMBEDDING_ONNX_DIR the first time so later processes
+    start from the saved graph.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    export_dir = os.path.join(settings.EMBEDDING_ONNX_DIR, name.replace("/", "__"))
+    suffix = f"qint8_{settings.EMBEDDING_ONNX_QUANTIZATION}"
+    file_name = f"onnx/model_{suffix}.onnx" if quantized else "onnx/model.onnx"
+
+    if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+        print(f"🛠️ Exporting {name} to ONNX...")
+        SentenceTransformer(name, backend="onnx").save_pretrained(export_dir)
+
+    if quantized and not os.path.exists(os.path.join(export_dir, file_name)):
+        print(f"🛠️ Quantizing {name} to int8 ({settings.EMBEDDING_ONNX_QUANTIZATION})...")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(export_dir, backend="onnx"),
+            settings.EMBEDDING_ONNX_QUANTIZATION,
+            export_dir,
+            file_suffix=suffix,
+        )
+
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def _weight_bytes(model) -> int:
+    # ONNX-backed models keep their weights inside the runtime session, so report the graph size on disk.
+    session = getattr(model.transformers_model, "session", None)
+    onnx_path = getattr(session, "_model_path", None)
+    if onnx_path and os.path.exists(onnx_path):
+        return os.path.getsize(onnx_path)
+    return sum(p.numel() * p.element_size() for p in model.parameters())
@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class EmbeddingOutbox(models.Model):
+    """
+    Pending embedding trigger, written in the same transaction as the clinical row
+    and published in batches by the outbox dispatcher. The row is deleted by the
+    worker once the embedding is upserted; until then it can be published again.
+    """
+    entity_type = models.CharField(max_length=30)   # key of apps.embeddings.payloads.ENTITIES
+    object_id = models.CharField(max_length=100)    # pk, or FHIR patient_id for patients
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)  # last time it was published
+    attempts = models.PositiveIntegerField(default=0)  # times it was published
+
+    def __str__(self):
+        return f"{self.entity_type} {self.object_id}"
+
+
+class EmbeddingBackfillCheckpoint(models.Model):
+    """
+    Progress of the `reembed` backfill for one entity type: every row up to
+    `last_pk` has been embedded, so an interrupted run resumes after it.
+    """
+    entity_type = models.CharField(max_length=30, unique=True)  # key of apps.embeddings.payloads.ENTITIES
+    last_pk = models.BigIntegerField(default=0)
+    embedded = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.entity_type} backfill at pk {self.last_pk}"
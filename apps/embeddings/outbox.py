@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.embeddings.models import EmbeddingOutbox
+from apps.embeddings.tasks import embed_batch_task
+
+DEFAULT_CLAIM_SIZE = 500
+
+
+def add_to_outbox(entity_type: str, ids: list):
+    """
+    Record embedding triggers. Call it inside the transaction that writes the rows
+    so the trigger commits (or rolls back) together with them.
+    """
+    EmbeddingOutbox.objects.bulk_create([
+        EmbeddingOutbox(entity_type=entity_type, object_id=str(object_id))
+        for object_id in ids
+    ])
+
+
+def dispatch_outbox(claim_size: int = DEFAULT_CLAIM_SIZE) -> int:
+    """
+    Claim up to `claim_size` outbox rows with SELECT ... FOR UPDATE SKIP LOCKED,
+    publish them as one batched embedding job and mark them dispatched.
+
+    Rows are deleted by the worker only after their embedding is upserted. A row
+    that is still here EMBEDDING_OUTBOX_REDISPATCH_AFTER seconds after being
+    published (lost message, failed upsert, dead worker) is claimed again, up to
+    EMBEDDING_OUTBOX_MAX_ATTEMPTS times; after that it is left for inspection.
+    Delivery is at-least-once; several dispatchers can run side by side without
+    claiming the same rows.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EMBEDDING_OUTBOX_REDISPATCH_AFTER)
+
+    with transaction.atomic():
+        rows = list(
+            EmbeddingOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(dispatched_at__isnull=True) | Q(dispatched_at__lt=stale))
+            .filter(attempts__lt=settings.EMBEDDING_OUTBOX_MAX_ATTEMPTS)
+            .order_by("id")[:claim_size]
+        )
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        EmbeddingOutbox.objects.filter(id__in=ids).update(dispatched_at=now, attempts=F("attempts") + 1)
+        embed_batch_task.delay([[row.entity_type, row.object_id] for row in rows], ids)
+
+    return len(rows)
+
+
+def run_dispatcher(claim_size: int = DEFAULT_CLAIM_SIZE, poll_interval: float = 0.5, log=print):
+    log(f"🚀 Embedding outbox dispatcher started (claims of ≤{claim_size} rows)")
+    while True:
+        close_old_connections()
+        try:
+            dispatched = dispatch_outbox(claim_size)
+        except Exception as e:
+            log(f"❌ Outbox dispatch failed, retrying: {e}")
+            dispatched = 0
+
+        if dispatched:
+            log(f"📤 Published {dispatched} embedding triggers in one job")
+        else:
+            time.sleep(poll_interval)
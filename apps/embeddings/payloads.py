@@ -0,0 +1,85 @@
+from apps.patients.models import Patient
+from apps.sepsis.models import (
+    SepsisEpisode,
+    CultureResult,
+    Organism,
+    VitalsObservation,
+    LabResult,
+    Antibiogram,
+    AntibioticAdministration,
+    ClinicalNote
+)
+from apps.embeddings.vector_pipeline import (
+    generate_patient_payload,
+    generate_episode_payload,
+    generate_culture_payload,
+    generate_organism_payload,
+    generate_antibiogram_payload,
+    generate_antibiotic_payload,
+    generate_vitals_payload,
+    generate_lab_payload,
+    generate_clinical_note_payload
+)
+
+
+# entity type → (model, lookup field used by the embed_* tasks, payload builder, label)
+ENTITIES = {
+    "patient": (Patient, "patient_id", generate_patient_payload, "Patient"),
+    "episode": (SepsisEpisode, "id", generate_episode_payload, "Episode"),
+    "culture": (CultureResult, "id", generate_culture_payload, "Culture"),
+    "organism": (Organism, "id", generate_organism_payload, "Organism"),
+    "antibiogram": (Antibiogram, "id", generate_antibiogram_payload, "Antibiogram"),
+    "antibiotic": (AntibioticAdministration, "id", generate_antibiotic_payload, "Antibiotic"),
+    "vitals": (VitalsObservation, "id", generate_vitals_payload, "Vitals"),
+    "lab": (LabResult, "id", generate_lab_payload, "Lab"),
+    "clinical_note": (ClinicalNote, "id", generate_clinical_note_payload, "Clinical Note"),
+}
+
+# Ids per IN (...) query; keeps large batches under the database's bind parameter limits.
+LOAD_CHUNK_SIZE = 1000
+
+# entity type → (select_related, prefetch_related) covering every relation its payload builder walks
+RELATED = {
+    "patient": ((), ()),
+    "episode": (("patient",), ()),
+    "culture": (("sample__episode__patient",), ()),
+    "organism": (("culture_result__sample__episode__patient",), ()),
+    "antibiogram": (("organism__culture_result__sample__episode__patient",), ("susceptibilities",)),
+    "antibiotic": (("episode__patient",), ()),
+    "vitals": (("episode__patient",), ()),
+    "lab": (("episode__patient",), ()),
+    "clinical_note": (("episode__patient",), ()),
+}
+
+
+def entity_queryset(entity_type: str):
+    """
+    Queryset of `entity_type` rows with everything its payload builder needs
+    loaded up front, so building payloads issues no per-row queries.
+    """
+    model = ENTITIES[entity_type][0]
+    select, prefetch = RELATED[entity_type]
+    return model.objects.select_related(*select).prefetch_related(*prefetch)
+
+
+def load_entities(entity_type: str, ids: list) -> list:
+    """
+    Load every `entity_type` row in `ids` with its related objects: one query per
+    LOAD_CHUNK_SIZE ids, plus one per prefetched relation. Ids that no longer
+    exist are skipped.
+    """
+    lookup = ENTITIES[entity_type][1]
+    ids = list(dict.fromkeys(ids))
+    rows = []
+    for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+        rows.extend(entity_queryset(entity_type).filter(**{f"{lookup}__in": ids[start:start + LOAD_CHUNK_SIZE]}))
+    return rows
+
+
+def build_payloads(entity_type: str, ids: list) -> list[dict]:
+    """
+    Build the embedding payload of every `entity_type` row in `ids` without
+    any per-row queries.
+    """
+    generate = ENTITIES[entity_type][2]
+    return [generate(obj) for obj in load_entities(entity_type, ids)]
@@ -1,115 +1,97 @@
 from celery import shared_task
-from apps.embeddings.vector_pipeline import (
-    process_embedding,
-    generate_patient_payload,
-    generate_episode_payload,
-    generate_culture_payload,
-    generate_organism_payload,
-    generate_antibiogram_payload,
-    generate_antibiotic_payload,
-    generate_vitals_payload,
-    generate_lab_payload,
-    generate_clinical_note_payload
-)
-
-from apps.patients.models import Patient
-from apps.sepsis.models import (
-    SepsisEpisode,
-    CultureResult,
-    Organism,
-    VitalsObservation,
-    LabResult,
-    Antibiogram,
-    AntibioticAdministration,
-    ClinicalNote
-)
+from django.conf import settings
+
+from apps.embeddings.vector_pipeline import process_embeddings
+from apps.embeddings.payloads import ENTITIES, build_payloads
+from apps.embeddings.batching import enqueue_embeddings
+from apps.embeddings.models import EmbeddingOutbox
+
+
+def _embed(entity_type: str, object_id):
+    label = ENTITIES[entity_type][3]
+
+    # With micro-batching on, the batching worker does the encoding for a whole window.
+    if settings.EMBEDDING_BATCHING:
+        enqueue_embeddings(entity_type, [object_id])
+        return
+
+    payloads = build_payloads(entity_type, [object_id])
+    if not payloads:
+        print(f"❌ {label} {object_id} not found.")
+        return
+
+    print(f"🚀 Embedding {label} {object_id}")
+    process_embeddings(payloads)
+
+
+@shared_task(acks_late=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def embed_batch_task(jobs, outbox_ids=()):
+    """
+    Embed a batch of `[entity_type, object_id]` jobs published by the outbox dispatcher.
+    `outbox_ids[i]` is the outbox row of `jobs[i]`; rows are deleted once their
+    embedding is upserted (here, or by the batching worker), so a failed batch
+    stays in the outbox and is published again.
+    """
+    ids_by_type = {}
+    outbox_by_type = {}
+    for i, (entity_type, object_id) in enumerate(jobs):
+        ids_by_type.setdefault(entity_type, []).append(object_id)
+        outbox_by_type.setdefault(entity_type, []).append(outbox_ids[i] if outbox_ids else None)
+
+    if settings.EMBEDDING_BATCHING:
+        for entity_type, ids in ids_by_type.items():
+            enqueue_embeddings(entity_type, ids, outbox_ids=outbox_by_type[entity_type])
+        return
+
+    payloads = []
+    for entity_type, ids in ids_by_type.items():
+        payloads.extend(build_payloads(entity_type, ids))
+
+    print(f"🚀 Embedding batch of {len(payloads)} events")
+    process_embeddings(payloads)
+    EmbeddingOutbox.objects.filter(id__in=outbox_ids).delete()
 
 
 @shared_task
 def embed_patient_task(patient_id):
-    try:
-        patient = Patient.objects.get(patient_id=patient_id)
-        print(f"🚀 Embedding Patient {patient_id}")
-        process_embedding(generate_patient_payload(patient))
-    except Patient.DoesNotExist:
-        print(f"❌ Patient {patient_id} not found.")
+    _embed("patient", patient_id)
 
 
 @shared_task
 def embed_episode_task(episode_id):
-    try:
-        episode = SepsisEpisode.objects.get(id=episode_id)
-        print(f"🚀 Embedding Episode {episode_id}")
-        process_embedding(generate_episode_payload(episode))
-    except SepsisEpisode.DoesNotExist:
-        print(f"❌ Episode {episode_id} not found.")
+    _embed("episode", episode_id)
 
 
 @shared_task
 def embed_culture_task(culture_id):
-    try:
-        culture = CultureResult.objects.get(id=culture_id)
-        print(f"🚀 Embedding Culture {culture_id}")
-        process_embedding(generate_culture_payload(culture))
-    except CultureResult.DoesNotExist:
-        print(f"❌ Culture {culture_id} not found.")
+    _embed("culture", culture_id)
 
 
 @shared_task
 def embed_organism_task(organism_id):
-    try:
-        organism = Organism.objects.get(id=organism_id)
-        print(f"🚀 Embedding Organism {organism_id}")
-        process_embedding(generate_organism_payload(organism))
-    except Organism.DoesNotExist:
-        print(f"❌ Organism {organism_id} not found.")
+    _embed("organism", organism_id)
 
 
 @shared_task
 def embed_antibiogram_task(antibiogram_id):
-    try:
-        antibiogram = Antibiogram.objects.get(id=antibiogram_id)
-        print(f"🚀 Embedding Antibiogram {antibiogram_id}")
-        process_embedding(generate_antibiogram_payload(antibiogram))
-    except Antibiogram.DoesNotExist:
-        print(f"❌ Antibiogram {antibiogram_id} not found.")
+    _embed("antibiogram", antibiogram_id)
 
 
 @shared_task
 def embed_antibiotic_task(administration_id):
-    try:
-        administration = AntibioticAdministration.objects.get(id=administration_id)
-        print(f"🚀 Embedding Antibiotic {administration_id}")
-        process_embedding(generate_antibiotic_payload(administration))
-    except AntibioticAdministration.DoesNotExist:
-        print(f"❌ Antibiotic {administration_id} not found.")
+    _embed("antibiotic", administration_id)
 
 
 @shared_task
 def embed_vitals_task(vitals_id):
-    try:
-        vitals = VitalsObservation.objects.get(id=vitals_id)
-        print(f"🚀 Embedding Vitals {vitals_id}")
-        process_embedding(generate_vitals_payload(vitals))
-    except VitalsObservation.DoesNotExist:
-        print(f"❌ Vitals {vitals_id} not found.")
+    _embed("vitals", vitals_id)
 
 
 @shared_task
 def embed_lab_task(lab_id):
-    try:
-        lab = LabResult.objects.get(id=lab_id)
-        print(f"🚀 Embedding Lab {lab_id}")
-        process_embedding(generate_lab_payload(lab))
-    except LabResult.DoesNotExist:
-        print(f"❌ Lab {lab_id} not found.")
+    _embed("lab", lab_id)
 
 
 @shared_task
 def embed_clinical_note_task(note_id):
-    try:
-        note = ClinicalNote.objects.get(id=note_id)
-        print(f"🚀 Embedding Clinical Note {note_id}")
-        process_embedding(generate_clinical_note_payload(note))
-    except ClinicalNote.DoesNotExist:
-        print(f"❌ Clinical Note {note_id} not found.")
+    _embed("clinical_note", note_id)
@@ -1,3 +1,529 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import httpx
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.embeddings import batching, embedding_client, model_registry, vector_pipeline
+from apps.embeddings.backfill import EmbeddingBackfill
+from apps.embeddings.embedding_cache import EmbeddingCache, encode_cached
+from apps.embeddings.embedding_server import CoalescingEncoder, make_server
+from apps.embeddings.model_registry import BIOBERT_MODEL
+from apps.embeddings.models import EmbeddingBackfillCheckpoint, EmbeddingOutbox
+from apps.embeddings.outbox import add_to_outbox, dispatch_outbox
+from apps.embeddings.tasks import embed_batch_task
+from apps.qdrant.vector_store import NumpyStore
+
+from apps.embeddings.payloads import ENTITIES, build_payloads
+from apps.patients.models import Patient
+from apps.sepsis.models import (
+    SepsisEpisode,
+    Sample,
+    CultureResult,
+    Organism,
+    Antibiogram,
+    AntibioticSusceptibility,
+    AntibioticAdministration,
+    VitalsObservation,
+    LabResult,
+    ClinicalNote
+)
+
+
+class BuildPayloadsQueryCountTests(TestCase):
+    """
+    Building payloads for a batch must not walk FK chains lazily: the query count
+    is fixed per entity type, whatever the batch size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.ids = {entity_type: [] for entity_type in ENTITIES}
+
+        for i in range(3):
+            patient = Patient.objects.create(patient_id=f"patient-{i}", name=f"Patient {i}")
+            episode = SepsisEpisode.objects.create(patient=patient, started_at=now)
+            sample = Sample.objects.create(episode=episode, material="Blood", collected_at=now)
+            culture = CultureResult.objects.create(sample=sample, result="positive", reported_at=now)
+            organism = Organism.objects.create(culture_result=culture, name="Escherichia coli")
+            antibiogram = Antibiogram.objects.create(organism=organism, created_at=now)
+            for antibiotic, result in (("Ceftriaxone", "R"), ("Meropenem", "S")):
+                AntibioticSusceptibility.objects.create(antibiogram=antibiogram, antibiotic=antibiotic, result=result)
+
+            cls.ids["patient"].append(patient.patient_id)
+            cls.ids["episode"].append(episode.id)
+            cls.ids["culture"].append(culture.id)
+            cls.ids["organism"].append(organism.id)
+            cls.ids["antibiogram"].append(antibiogram.id)
+            cls.ids["antibiotic"].append(AntibioticAdministration.objects.create(
+                episode=episode, name="Meropenem", started_at=now).id)
+            cls.ids["vitals"].append(VitalsObservation.objects.create(
+                episode=episode, observed_at=now, heart_rate=112, temperature=38.4).id)
+            cls.ids["lab"].append(LabResult.objects.create(
+                episode=episode, exam_code="2524-7", exam_name="Lactate", value=4.1, observed_at=now).id)
+            cls.ids["clinical_note"].append(ClinicalNote.objects.create(
+                episode=episode, content="Hypotensive, starting fluids.", created_at=now).id)
+
+    def test_one_query_per_entity_type(self):
+        for entity_type, ids in self.ids.items():
+            if entity_type == "antibiogram":
+                continue
+            with self.subTest(entity_type=entity_type), self.assertNumQueries(1):
+                payloads = build_payloads(entity_type, ids)
+            self.assertEqual(len(payloads), len(ids))
+
+    def test_antibiogram_prefetches_susceptibilities(self):
+        with self.assertNumQueries(2):
+            payloads = build_payloads("antibiogram", self.ids["antibiogram"])
+
+        self.assertEqual(len(payloads), 3)
+        self.assertIn("Ceftriaxone é r", payloads[0]["text"])
+
+    def test_missing_and_duplicate_ids(self):
+        ids = [str(self.ids["vitals"][0]), str(self.ids["vitals"][0]), "999999"]
+        with self.assertNumQueries(1):
+            payloads = build_payloads("vitals", ids)
+
+        self.assertEqual([payload["vitals_id"] for payload in payloads], [self.ids["vitals"][0]])
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+    def _encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32), "torch"
+
+    def test_repeated_queries_skip_the_encode_until_they_expire(self):
+        cache = EmbeddingCache(max_size=8, local_ttl=60, namespace="qemb")
+        with mock.patch("apps.embeddings.embedding_cache.encode_with_backend", side_effect=self._encode) as encode, \
+                mock.patch("apps.embeddings.embedding_cache.time.monotonic", return_value=1000.0) as clock:
+            encode_cached("model", ["sepsis bundle", "sepsis  bundle"], cache=cache)
+            encode_cached("model", ["sepsis bundle"], cache=cache)
+            self.assertEqual(encode.call_count, 1)
+
+            clock.return_value = 1061.0
+            encode_cached("model", ["sepsis bundle"], cache=cache)
+            self.assertEqual(encode.call_count, 2)
+
+        stats = cache.stats()
+        self.assertEqual((stats["memory_hits"], stats["misses"]), (1, 3))
+
+
+class EmbeddingCacheRedisTierTests(SimpleTestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server)
+        patcher = mock.patch("apps.embeddings.embedding_cache.redis.Redis.from_url",
+                             side_effect=lambda url: fakeredis.FakeRedis(server=self.server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _cache(self, **kwargs):
+        return EmbeddingCache(max_size=8, redis_url="redis://cache", ttl=3600, **kwargs)
+
+    def _encode(self, texts, **kwargs):
+        return np.full((len(texts), 4), 2.0 if kwargs.get("normalize_embeddings") else 1.0, dtype=np.float32), "torch"
+
+    def test_vectors_stored_by_one_worker_are_served_to_another(self):
+        key = self._cache().key("model", "febre")
+        self._cache().set_many({key: np.arange(4)})
+
+        other = self._cache()
+        [vector] = other.get_many([key])
+        other.get_many([key])
+
+        np.testing.assert_array_equal(vector, np.arange(4, dtype=np.float32))
+        stats = other.stats()
+        self.assertEqual((stats["redis_hits"], stats["memory_hits"], stats["misses"]), (1, 1, 0))
+
+    def test_writes_go_through_with_a_sliding_ttl(self):
+        cache = self._cache()
+        key = cache.key("model", "febre")
+        cache.set_many({key: np.ones(4)})
+        self.assertAlmostEqual(self.redis.ttl(key), 3600, delta=1)
+
+        self.redis.expire(key, 10)
+        self._cache().get_many([key])  # a hit in another worker renews the entry
+        self.assertAlmostEqual(self.redis.ttl(key), 3600, delta=1)
+
+    def test_unreachable_redis_falls_back_to_encoding_and_warns_once(self):
+        cache = self._cache()
+        self.server.connected = False
+        with mock.patch("apps.embeddings.embedding_cache.encode_with_backend", side_effect=self._encode) as encode, \
+                mock.patch("builtins.print") as printed:
+            for text in ("febre", "taquicardia", "hipotensão"):
+                vectors = encode_cached("model", [text], cache=cache)
+                np.testing.assert_array_equal(vectors, np.ones((1, 4), dtype=np.float32))
+
+        self.assertEqual(encode.call_count, 3)
+        self.assertEqual(cache.stats()["misses"], 3)
+        self.assertEqual(printed.call_count, 1)  # the other five failures are only counted
+
+    def test_event_keys_differ_per_backend_and_normalize_mode(self):
+        cache = self._cache()
+        backend = None
+        with mock.patch("apps.embeddings.embedding_cache.encode_with_backend",
+                        side_effect=lambda texts, **kwargs: (self._encode(texts, **kwargs)[0], backend)) as encode:
+            for backend in ("torch", "onnx-int8"):
+                with mock.patch("apps.embeddings.embedding_cache.current_backend", return_value=backend):
+                    raw = encode_cached("model", ["febre"], cache=cache)
+                    normalized = encode_cached("model", ["febre"], normalize_embeddings=True, cache=cache)
+                    encode_cached("model", ["febre"], normalize_embeddings=True, cache=cache)
+
+        self.assertEqual(encode.call_count, 4)
+        self.assertFalse(np.array_equal(raw, normalized))
+        self.assertEqual(sorted(key.decode().split(":")[2] for key in self.redis.keys("emb:*")),
+                         ["onnx-int8", "onnx-int8", "torch", "torch"])
+        self.assertEqual(len(self.redis.keys("emb:model:torch:norm:*")), 1)
+
+
+class EmbeddingBatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.queue = fakeredis.FakeRedis()
+        patcher = mock.patch("apps.embeddings.batching.get_queue", return_value=self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _pending(self) -> list[dict]:
+        return [json.loads(item) for item in self.queue.lrange(batching.QUEUE_KEY, 0, -1)]
+
+    def test_window_stops_at_batch_size(self):
+        batching.enqueue_embeddings("vitals", list(range(5)))
+
+        jobs = batching.drain_window(max_items=3, window_ms=1000, worker_id="w1")
+
+        self.assertEqual([job["id"] for job in jobs], [0, 1, 2])
+        self.assertEqual([job["id"] for job in self._pending()], [3, 4])
+        self.assertEqual(self.queue.llen(batching.processing_key("w1")), 3)
+
+    def test_window_closes_after_window_ms(self):
+        batching.enqueue_embeddings("vitals", [1])
+        with mock.patch.object(self.queue, "blmove", wraps=self.queue.blmove) as blmove:
+            jobs = batching.drain_window(max_items=10, window_ms=50, worker_id="w1")
+
+        self.assertEqual(len(jobs), 1)
+        # After the first job, the worker only waits for what is left of the window.
+        wait = blmove.call_args_list[1].args[2]
+        self.assertTrue(0 < wait <= 0.05)
+
+    def test_empty_queue_returns_no_window(self):
+        self.assertEqual(batching.drain_window(max_items=10, window_ms=50, worker_id="w1", idle_timeout=0.01), [])
+
+    def test_failed_batch_is_requeued_with_one_more_attempt(self):
+        batching.enqueue_embeddings("vitals", [1, 2])
+        batching.enqueue_embeddings("vitals", [3], attempts=batching.MAX_ATTEMPTS - 1)
+        jobs = batching.drain_window(max_items=10, window_ms=50, worker_id="w1")
+
+        with mock.patch("apps.embeddings.batching.build_payloads", return_value=[{}]), \
+                mock.patch("apps.embeddings.batching.process_embeddings", side_effect=RuntimeError("qdrant down")):
+            self.assertEqual(batching.process_batch(jobs), 0)
+        batching.finish_window("w1")
+
+        self.assertEqual(self._pending(), [{"type": "vitals", "id": 1, "attempts": 1, "outbox_id": None},
+                                           {"type": "vitals", "id": 2, "attempts": 1, "outbox_id": None}])
+        self.assertFalse(self.queue.exists(batching.processing_key("w1")))
+        failed = json.loads(self.queue.lindex(batching.FAILED_KEY, 0))
+        self.assertEqual((failed["id"], failed["attempts"], failed["error"]), (3, batching.MAX_ATTEMPTS, "qdrant down"))
+
+    def test_one_bad_job_does_not_fail_its_neighbours(self):
+        batching.enqueue_embeddings("vitals", [1, 2, 3])
+        jobs = batching.drain_window(max_items=10, window_ms=50, worker_id="w1")
+        upserted = []
+
+        def process_embeddings(payloads):
+            if any(payload["id"] == 2 for payload in payloads):
+                raise ValueError("cannot encode")
+            upserted.extend(payload["id"] for payload in payloads)
+
+        with mock.patch("apps.embeddings.batching.build_payloads",
+                        side_effect=lambda entity_type, ids: [{"id": object_id} for object_id in ids]), \
+                mock.patch("apps.embeddings.batching.process_embeddings", side_effect=process_embeddings):
+            self.assertEqual(batching.process_batch(jobs, worker_id="w1"), 2)
+
+        self.assertEqual(upserted, [1, 3])
+        self.assertEqual(self._pending(), [{"type": "vitals", "id": 2, "attempts": 1, "outbox_id": None}])
+
+    def test_running_batchers_keep_recovering_stale_windows(self):
+        windows = [[], [], KeyboardInterrupt()]
+        with mock.patch("apps.embeddings.batching.drain_window", side_effect=windows), \
+                mock.patch("apps.embeddings.batching.requeue_stale_windows") as requeue, \
+                mock.patch("apps.embeddings.batching.STALE_CHECK_INTERVAL", 0), \
+                self.assertRaises(KeyboardInterrupt):
+            batching.run_batcher(log=lambda message: None)
+
+        self.assertEqual(requeue.call_count, 3)
+
+    def test_window_of_a_stopped_worker_is_requeued(self):
+        batching.enqueue_embeddings("vitals", [1, 2, 3])
+        batching.drain_window(max_items=2, window_ms=50, worker_id="dead")
+        batching.heartbeat("alive")
+        batching.drain_window(max_items=1, window_ms=50, worker_id="alive")
+
+        self.assertEqual(batching.requeue_stale_windows(log=lambda message: None), 2)
+
+        self.assertEqual([job["id"] for job in self._pending()], [1, 2])
+        self.assertFalse(self.queue.exists(batching.processing_key("dead")))
+        self.assertEqual(self.queue.llen(batching.processing_key("alive")), 1)
+
+
+@override_settings(EMBEDDING_BATCHING=False, EMBEDDING_OUTBOX_REDISPATCH_AFTER=600)
+class EmbeddingOutboxTests(TestCase):
+    def _dispatch(self, now=None):
+        with mock.patch("apps.embeddings.outbox.embed_batch_task.delay") as delay, \
+                mock.patch("apps.embeddings.outbox.timezone.now", return_value=now or timezone.now()):
+            dispatched = dispatch_outbox()
+        return dispatched, (delay.call_args.args if delay.called else None)
+
+    def _run(self, message, upsert_error=None):
+        with mock.patch("apps.embeddings.tasks.build_payloads", return_value=[{}]), \
+                mock.patch("apps.embeddings.tasks.process_embeddings", side_effect=upsert_error):
+            embed_batch_task(*message)
+
+    def test_failed_upsert_leaves_the_work_in_the_outbox(self):
+        add_to_outbox("vitals", [1, 2])
+        dispatched, message = self._dispatch()
+        self.assertEqual(dispatched, 2)
+        self.assertEqual(message[0], [["vitals", "1"], ["vitals", "2"]])
+
+        with self.assertRaises(RuntimeError):
+            self._run(message, upsert_error=RuntimeError("qdrant down"))
+        self.assertEqual(EmbeddingOutbox.objects.filter(attempts=1, dispatched_at__isnull=False).count(), 2)
+
+        # Not published twice while the first message may still be in flight...
+        self.assertEqual(self._dispatch()[0], 0)
+
+        # ...but published again once it is stale, and deleted when the upsert succeeds.
+        dispatched, message = self._dispatch(now=timezone.now() + timedelta(seconds=601))
+        self.assertEqual(dispatched, 2)
+        self.assertEqual(set(EmbeddingOutbox.objects.values_list("attempts", flat=True)), {2})
+
+        self._run(message)
+        self.assertFalse(EmbeddingOutbox.objects.exists())
+
+    @override_settings(EMBEDDING_BATCHING=True)
+    def test_batching_worker_deletes_rows_after_the_upsert(self):
+        queue = fakeredis.FakeRedis()
+        add_to_outbox("vitals", [1])
+        _, message = self._dispatch()
+
+        with mock.patch("apps.embeddings.batching.get_queue", return_value=queue):
+            self._run(message)
+            self.assertTrue(EmbeddingOutbox.objects.exists())
+
+            jobs = batching.drain_window(max_items=10, window_ms=50, worker_id="w1")
+            with mock.patch("apps.embeddings.batching.build_payloads", return_value=[{}]), \
+                    mock.patch("apps.embeddings.batching.process_embeddings"):
+                batching.process_batch(jobs)
+
+        self.assertFalse(EmbeddingOutbox.objects.exists())
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        for registry in (model_registry._models, model_registry._load_stats):
+            patcher = mock.patch.dict(registry, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.loads = []
+
+        def slow_load(name, backend):
+            self.loads.append((name, backend, threading.get_ident()))
+            time.sleep(0.05)
+            return object()
+
+        for target, value in (("_load", slow_load), ("_weight_bytes", lambda model: 0)):
+            patcher = mock.patch(f"apps.embeddings.model_registry.{target}", side_effect=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_concurrent_first_use_loads_once(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            models = list(pool.map(lambda _: model_registry.get_model("m", backend="torch"), range(8)))
+
+        self.assertEqual(len(self.loads), 1)
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_instances_are_reused_per_name_and_backend(self):
+        first = model_registry.get_model("m", backend="torch")
+
+        self.assertIs(model_registry.get_model("m", backend="torch"), first)
+        self.assertIsNot(model_registry.get_model("m", backend="onnx"), first)
+        self.assertEqual(len(self.loads), 2)
+        self.assertEqual(set(model_registry.registry_stats()["models"]), {"m (torch)", "m (onnx)"})
+
+    def test_gc_is_frozen_only_when_asked_and_something_was_loaded(self):
+        with mock.patch("apps.embeddings.model_registry.gc.freeze") as freeze:
+            self.assertEqual(model_registry.warm_models([], freeze=True), 0)
+            model_registry.warm_models(["m"])
+            freeze.assert_not_called()
+
+            self.assertEqual(model_registry.warm_models(["m"], freeze=True), 1)
+            freeze.assert_called_once()
+
+
+class EmbeddingServerTests(SimpleTestCase):
+    def setUp(self):
+        model = mock.Mock()
+        model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 4), dtype=np.float32)
+        self.get_model = self._patch("apps.embeddings.embedding_server.get_model", return_value=model)
+
+        server = make_server(CoalescingEncoder(backend="onnx-int8"), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        self._patch("apps.embeddings.embedding_client._server_backend", None)
+        self._patch("apps.embeddings.embedding_client._server_down_until", 0.0)
+        embedding_client._server_client.cache_clear()
+        self.addCleanup(embedding_client._server_client.cache_clear)
+        settings = override_settings(EMBEDDING_SERVER_URL=self.url, EMBEDDING_BACKEND="torch", EMBEDDING_WARM_MODELS=[])
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _patch(self, target, *args, **kwargs):
+        patcher = mock.patch(target, *args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_only_served_models_are_loaded(self):
+        response = httpx.post(f"{self.url}/encode", json={"model": "../../etc/passwd", "texts": ["febre"]})
+
+        self.assertEqual(response.status_code, 400)
+        self.get_model.assert_not_called()
+
+    def test_client_reports_and_caches_on_the_server_backend(self):
+        self.assertEqual(embedding_client.current_backend(), "onnx-int8")
+
+        vectors, backend = embedding_client.encode_with_backend(["febre", "lactato"])
+        self.assertEqual((vectors.shape, backend), ((2, 4), "onnx-int8"))
+        self.get_model.assert_called_once_with(BIOBERT_MODEL, "onnx-int8")
+
+        cache = EmbeddingCache(max_size=8, namespace="test")
+        encode_cached(BIOBERT_MODEL, ["febre"], cache=cache)
+        self.assertIsNotNone(cache.get_many([cache.key(BIOBERT_MODEL, "febre", "onnx-int8:raw")])[0])
+        self.assertIsNone(cache.get_many([cache.key(BIOBERT_MODEL, "febre", "torch:raw")])[0])
+
+
+class _InlineEncoderPool:
+    """Encodes on the calling thread; stands in for the process pool."""
+
+    def __init__(self, workers):
+        pass
+
+    def submit(self, texts):
+        future = Future()
+        future.set_result(np.ones((len(texts), 4), dtype=np.float32))
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class EmbeddingBackfillTests(TestCase):
+    def setUp(self):
+        episode = SepsisEpisode.objects.create(
+            patient=Patient.objects.create(patient_id="p1", name="Ana"), started_at=timezone.now())
+        self.vitals = [
+            VitalsObservation.objects.create(episode=episode, observed_at=timezone.now(), heart_rate=90 + i).pk
+            for i in range(5)
+        ]
+        self.upserted = []
+        self.fail_on_call = None
+        for target, value in (("EncoderPool", mock.Mock(side_effect=_InlineEncoderPool)),
+                              ("upsert_embeddings", mock.Mock(side_effect=self._upsert))):
+            patcher = mock.patch(f"apps.embeddings.backfill.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _upsert(self, payloads, embeddings):
+        if len(self.upserted) == self.fail_on_call:
+            raise RuntimeError("qdrant down")
+        self.upserted.append([payload["vitals_id"] for payload in payloads])
+
+    def _backfill(self, **options):
+        return EmbeddingBackfill(["vitals"], batch_size=2, log=lambda message: None, **options).run()[0]
+
+    def test_checkpoint_records_every_embedded_row(self):
+        checkpoint = self._backfill()
+
+        self.assertEqual(self.upserted, [self.vitals[0:2], self.vitals[2:4], self.vitals[4:]])
+        stored = EmbeddingBackfillCheckpoint.objects.get(entity_type="vitals")
+        self.assertEqual((stored.last_pk, stored.embedded, stored.completed), (self.vitals[-1], 5, True))
+        self.assertEqual(checkpoint.pk, stored.pk)
+
+    def test_interrupted_backfill_resumes_after_the_last_stored_batch(self):
+        self.fail_on_call = 1
+        with self.assertRaises(RuntimeError):
+            self._backfill()
+        stored = EmbeddingBackfillCheckpoint.objects.get(entity_type="vitals")
+        self.assertEqual((stored.last_pk, stored.embedded, stored.completed), (self.vitals[1], 2, False))
+
+        self.fail_on_call = None
+        self.upserted.clear()
+        checkpoint = self._backfill()
+
+        self.assertEqual(self.upserted, [self.vitals[2:4], self.vitals[4:]])  # nothing embedded twice
+        self.assertEqual((checkpoint.embedded, checkpoint.completed), (5, True))
+
+    def test_completed_backfill_is_skipped_unless_restarted(self):
+        self._backfill()
+        self.upserted.clear()
+
+        self._backfill()
+        self.assertEqual(self.upserted, [])
+
+        checkpoint = self._backfill(restart=True)
+        self.assertEqual(sum(self.upserted, []), self.vitals)
+        self.assertEqual(checkpoint.embedded, 5)
+
+
+class UpsertEmbeddingsTests(SimpleTestCase):
+    def setUp(self):
+        self.store = NumpyStore()
+        for patcher in (mock.patch("apps.embeddings.vector_pipeline.get_vector_store", return_value=self.store),
+                        mock.patch("apps.embeddings.vector_pipeline._ready_collections", set())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _upsert(self, payloads, seed):
+        vectors = np.random.default_rng(seed).normal(size=(len(payloads), 768)).astype(np.float32)
+        vector_pipeline.upsert_embeddings(payloads, vectors)
+
+    def test_reupserting_an_entity_replaces_its_point_per_model_version(self):
+        payloads = [{"type": "vitals", "vitals_id": 7, "text": "FC 120"},
+                    {"type": "lab_result", "lab_id": 7, "text": "Lactato 4"}]
+        with override_settings(EMBEDDING_MODEL_VERSION="biobert-v1"):
+            self._upsert(payloads, seed=1)
+            self._upsert(payloads, seed=2)  # a retried job
+        v1_ids = {vector_pipeline._point_id(payload, "biobert-v1") for payload in payloads}
+        self.assertEqual(len(v1_ids), 2)  # same entity id, different types
+        self.assertEqual(self.store.point_ids("clinical-data"), v1_ids)
+
+        with override_settings(EMBEDDING_MODEL_VERSION="biobert-v2"):
+            self._upsert(payloads[:1], seed=3)
+        v2_id = vector_pipeline._point_id(payloads[0], "biobert-v2")
+        self.assertNotIn(v2_id, v1_ids)
+        self.assertEqual(self.store.count("clinical-data"), 3)
+        self.assertEqual(self.store.point_ids("clinical-data"), v1_ids | {v2_id})
+
+    def test_duplicate_entity_within_one_batch_keeps_the_last_payload(self):
+        self._upsert([{"type": "vitals", "vitals_id": 7, "text": "FC 120"},
+                      {"type": "vitals", "vitals_id": 7, "text": "FC 90"}], seed=1)
+
+        [point] = self.store.search("clinical-data", np.ones(768), limit=5)
+        self.assertEqual(self.store.count("clinical-data"), 1)
+        self.assertEqual(point.payload["text"], "FC 90")
+
+    def test_payload_without_entity_id_is_rejected(self):
+        with self.assertRaises(ValueError):
+            vector_pipeline._point_id({"type": "vitals", "text": "FC 120"}, "biobert-v1")
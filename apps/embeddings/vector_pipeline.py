@@ -1,58 +1,111 @@
 import uuid
-from functools import lru_cache
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
 from qdrant_client.http import models
-
-# Qdrant client
-client = QdrantClient("qdrant", port=6333)
-
-# Lazy-loaded BioBERT model
-@lru_cache()
-def get_model():
-    print("📦 Loading BioBERT embedding model (pritamdeka/BioBERT...)")
-    return SentenceTransformer("pritamdeka/BioBERT-mnli-snli-scinli-scitail-mednli-stsb")
+from django.conf import settings
+from django.utils import timezone
+
+from apps.embeddings.embedding_cache import encode_cached, get_embedding_cache
+from apps.embeddings.model_registry import BIOBERT_MODEL
+from apps.qdrant.vector_store import get_vector_store
+
+# Point ids are UUIDv5 over (payload type, entity id, model version), so replayed or
+# retried jobs overwrite their point instead of adding a duplicate.
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "sept-agent/clinical-data")
+
+# payload type → payload field holding the entity id
+POINT_ID_FIELDS = {
+    "patient": "patient_id",
+    "sepsis_episode": "episode_id",
+    "culture_result": "culture_id",
+    "organism": "organism_id",
+    "antibiogram": "antibiogram_id",
+    "antibiotic": "administration_id",
+    "vitals": "vitals_id",
+    "lab_result": "lab_id",
+    "clinical_note": "note_id",
+}
+
+# payload field → index created when the collection is bootstrapped. Timestamps are
+# epoch seconds so time-range filters are integer range lookups.
+PAYLOAD_INDEXES = {
+    "patient_id": models.KeywordIndexParams(type="keyword", is_tenant=True),
+    "episode_id": models.IntegerIndexParams(type="integer", lookup=True, range=False),
+    "type": models.KeywordIndexParams(type="keyword"),
+    "timestamp": models.IntegerIndexParams(type="integer", lookup=False, range=True),
+}
+
+_ready_collections = set()
 
 
 # Ensure collection exists
 def create_collection_if_not_exists(collection_name="clinical-data"):
-    if not client.collection_exists(collection_name=collection_name):
-        client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=768,
-                distance=models.Distance.COSINE
-            )
-        )
-        print(f"✅ Collection '{collection_name}' created.")
+    if collection_name in _ready_collections:
+        return
+
+    store = get_vector_store()
+    if not store.collection_exists(collection_name):
+        store.create_collection(collection_name, size=768)
     else:
         print(f"✔️ Collection '{collection_name}' already exists.")
 
+    # Runs for existing collections too, so collections created before the indexes
+    # were introduced get them on the next start.
+    store.create_payload_indexes(collection_name, PAYLOAD_INDEXES)
+    _ready_collections.add(collection_name)
+
 
 # Process embedding
 def process_embedding(payload: dict):
-    create_collection_if_not_exists()
-    model = get_model()
     print(f"🧠 Embedding: {payload.get('type')} ({payload.get('text')[:60]}...)")
-    embedding = model.encode(payload["text"]).tolist()
-
-    point_id = f"{payload['type']}_" + (
-        payload.get('patient_id') or payload.get('episode_id') or
-        payload.get('culture_id') or payload.get('organism_id') or
-        payload.get('vitals_id') or payload.get('lab_id') or
-        payload.get('antibiogram_id') or payload.get('administration_id') or
-        payload.get('note_id') or str(uuid.uuid4())
-    )
+    process_embeddings([payload])
+
 
-    point = models.PointStruct(
-        id=point_id,
-        vector=embedding,
-        payload=payload
+def process_embeddings(payloads: list[dict]):
+    """
+    Encode every payload text in a single model call and upsert all points in one request.
+    Texts already embedded before (same normalized content) are served from the embedding cache.
+    """
+    if not payloads:
+        return
+
+    embeddings = encode_cached(
+        BIOBERT_MODEL,
+        [payload["text"] for payload in payloads],
+        batch_size=settings.EMBEDDING_BATCH_SIZE
     )
+    upsert_embeddings(payloads, embeddings)
+    print(f"✅ Embedded {len(payloads)} events ({', '.join(sorted({p['type'] for p in payloads}))}), "
+          f"cache hit ratio {get_embedding_cache().stats()['hit_ratio']:.0%}")
+
+
+def upsert_embeddings(payloads: list[dict], embeddings):
+    """
+    Store already-encoded payloads in "clinical-data" in upserts of at most
+    QDRANT_UPSERT_BATCH_SIZE points. Upserting the same entity again, e.g. from
+    a retried task or a backfill, replaces its point.
+    """
+    create_collection_if_not_exists()
+    model_version = settings.EMBEDDING_MODEL_VERSION
+
+    # Keyed by point id: if an entity shows up twice in one batch, the last payload wins.
+    points = {}
+    for payload, embedding in zip(payloads, embeddings):
+        point_id = _point_id(payload, model_version)
+        points[point_id] = models.PointStruct(
+            id=point_id,
+            vector=embedding.tolist(),
+            payload={**payload, "model_version": model_version}
+        )
+
+    points = list(points.values())
+    for start in range(0, len(points), settings.QDRANT_UPSERT_BATCH_SIZE):
+        get_vector_store().upsert("clinical-data", points[start:start + settings.QDRANT_UPSERT_BATCH_SIZE])
 
-    client.upsert(collection_name="clinical-data", points=[point])
-    print(f"✅ Embedded {payload['type']} → {payload.get('patient_id', '')}")
 
+def _point_id(payload: dict, model_version: str) -> str:
+    field = POINT_ID_FIELDS.get(payload["type"])
+    if field is None or payload.get(field) is None:
+        raise ValueError(f"Cannot derive a point id for payload type '{payload['type']}'.")
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{payload['type']}:{payload[field]}:{model_version}"))
 
 
 # ===============================================================
@@ -60,6 +113,15 @@ def process_embedding(payload: dict):
 # ===============================================================
 
 
+def _epoch(value):
+    if not value:
+        return None
+    # Naive datetimes are in TIME_ZONE, matching how the search view reads `since`/`until`.
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return int(value.timestamp())
+
+
 def generate_patient_payload(patient):
     text = (
         f"O paciente {patient.name}, gênero {patient.gender}, nascido em {patient.birth_date}, "
@@ -71,6 +133,7 @@ def generate_patient_payload(patient):
         "name": patient.name,
         "gender": patient.gender,
         "birth_date": str(patient.birth_date),
+        "timestamp": _epoch(patient.created_at),
         "text": text
     }
 
@@ -86,6 +149,7 @@ def generate_episode_payload(episode):
         "patient_id": episode.patient.patient_id,
         "started_at": str(episode.started_at),
         "ended_at": str(episode.ended_at) if episode.ended_at else None,
+        "timestamp": _epoch(episode.started_at),
         "text": text
     }
 
@@ -105,6 +169,7 @@ def generate_culture_payload(culture):
         "result": culture.result,
         "material": culture.sample.material,
         "reported_at": str(culture.reported_at),
+        "timestamp": _epoch(culture.reported_at),
         "text": text
     }
 
@@ -121,6 +186,7 @@ def generate_organism_payload(organism):
         "episode_id": organism.culture_result.sample.episode.id,
         "patient_id": organism.culture_result.sample.episode.patient.patient_id,
         "name": organism.name,
+        "timestamp": _epoch(organism.culture_result.reported_at),
         "text": text
     }
 
@@ -142,6 +208,7 @@ def generate_antibiogram_payload(antibiogram):
         "organism": organism,
         "episode_id": antibiogram.organism.culture_result.sample.episode.id,
         "patient_id": antibiogram.organism.culture_result.sample.episode.patient.patient_id,
+        "timestamp": _epoch(antibiogram.created_at),
         "text": text
     }
 
@@ -158,6 +225,7 @@ def generate_antibiotic_payload(administration):
         "administration_id": administration.id,
         "episode_id": administration.episode.id,
         "patient_id": administration.episode.patient.patient_id,
+        "timestamp": _epoch(administration.started_at),
         "text": text
     }
 
@@ -213,6 +281,7 @@ def generate_vitals_payload(vitals):
         "episode_id": vitals.episode.id,
         "patient_id": vitals.episode.patient.patient_id,
         "observed_at": str(vitals.observed_at),
+        "timestamp": _epoch(vitals.observed_at),
         "text": text
     }
 
@@ -232,6 +301,7 @@ def generate_lab_payload(lab):
         "value": lab.value,
         "unit": lab.unit,
         "observed_at": str(lab.observed_at),
+        "timestamp": _epoch(lab.observed_at),
         "text": text
     }
 
@@ -244,5 +314,6 @@ def generate_clinical_note_payload(note):
         "patient_id": note.episode.patient.patient_id,
         "author": note.author,
         "created_at": str(note.created_at),
+        "timestamp": _epoch(note.created_at),
         "text": note.content
     }
@@ -0,0 +1,382 @@
+from django.db import transaction
+from django.db.models import Max
+
+from apps.patients.models import Patient
+from apps.sepsis.models import (
+    SepsisEpisode,
+    Sample,
+    CultureResult,
+    Organism,
+    Antibiogram,
+    AntibioticSusceptibility,
+    VitalsObservation,
+    LabResult,
+    AntibioticAdministration,
+    ClinicalNote
+)
+from apps.embeddings.outbox import add_to_outbox
+from .resolver import invalidate_episode
+from .fhir import (
+    patient_reference,
+    parse_patient,
+    parse_episode,
+    parse_culture,
+    parse_antibiogram,
+    parse_vitals,
+    parse_lab_result,
+    parse_antibiotic_administration,
+    parse_clinical_note,
+    classify_observation,
+)
+
+SUPPORTED_BUNDLE_TYPES = ('batch', 'transaction')
+
+OBSERVATION_PARSERS = {
+    'vitals': parse_vitals,
+    'lab': parse_lab_result,
+    'culture': parse_culture,
+    'antibiogram': parse_antibiogram,
+}
+
+
+class BundleError(Exception):
+    """
+    Raised when a `transaction` Bundle cannot be applied as a whole.
+    """
+
+    def __init__(self, issues: list[str]):
+        super().__init__("; ".join(issues))
+        self.issues = issues
+
+
+def operation_outcome(messages: list[str]) -> dict:
+    return {
+        "resourceType": "OperationOutcome",
+        "issue": [
+            {"severity": "error", "code": "processing", "diagnostics": message}
+            for message in messages
+        ]
+    }
+
+
+class BundleIngestion:
+    """
+    Ingests a FHIR Bundle (`batch` or `transaction`) in a fixed number of queries:
+    patients and episodes are resolved once for the whole bundle and every model
+    is written with a single `bulk_create`.
+
+    Clinical events are attached to the episode that was open when they happened,
+    falling back to the patient's latest episode.
+    """
+
+    def __init__(self, bundle: dict, enqueue_embeddings: bool = True):
+        if bundle.get('resourceType') != 'Bundle':
+            raise ValueError("resourceType must be 'Bundle'.")
+        if bundle.get('type') not in SUPPORTED_BUNDLE_TYPES:
+            raise ValueError(f"Bundle type must be one of {', '.join(SUPPORTED_BUNDLE_TYPES)}.")
+
+        self.bundle_type = bundle['type']
+        self.enqueue_embeddings = enqueue_embeddings
+        self.entries = bundle.get('entry', [])
+        self.responses = [None] * len(self.entries)
+        self.patients = {}
+        self.episodes = {}
+
+    # ==========================================================
+    # 🚀 Entry point
+    # ==========================================================
+
+    def run(self) -> dict:
+        parsed = self._parse_entries()
+        self._raise_for_errors()
+
+        with transaction.atomic():
+            self._resolve_patients(parsed)
+            self._write_patients(parsed)
+            self._write_episodes(parsed)
+            self._resolve_episodes()
+
+            grouped = {}
+            for index, kind, reference, fields in parsed:
+                if kind in ('patient', 'episode'):
+                    continue
+                episode = self._episode_for(index, reference, _event_time(fields))
+                if episode:
+                    grouped.setdefault(kind, []).append((index, episode, fields))
+
+            self._raise_for_errors()
+
+            self._write_vitals(grouped.get('vitals', []))
+            self._write_labs(grouped.get('lab', []))
+            self._write_antibiotics(grouped.get('antibiotic', []))
+            self._write_notes(grouped.get('note', []))
+            self._write_cultures(grouped.get('culture', []))
+            self._write_antibiograms(grouped.get('antibiogram', []))
+
+            self._raise_for_errors()
+
+        return {
+            "resourceType": "Bundle",
+            "type": f"{self.bundle_type}-response",
+            "entry": [{"response": response} for response in self.responses],
+        }
+
+    # ==========================================================
+    # 🧾 Parsing and bookkeeping
+    # ==========================================================
+
+    def _parse_entries(self) -> list[tuple]:
+        parsed = []
+        for index, entry in enumerate(self.entries):
+            resource = entry.get('resource', {})
+            resource_type = resource.get('resourceType')
+            try:
+                if resource_type == 'Patient':
+                    patient_id, defaults = parse_patient(resource)
+                    parsed.append((index, 'patient', patient_id, defaults))
+                elif resource_type == 'Encounter':
+                    parsed.append((index, 'episode', patient_reference(resource), parse_episode(resource)))
+                elif resource_type == 'Observation':
+                    kind = classify_observation(resource)
+                    fields = OBSERVATION_PARSERS[kind](resource)
+                    parsed.append((index, kind, patient_reference(resource), fields))
+                elif resource_type == 'MedicationAdministration':
+                    fields = parse_antibiotic_administration(resource)
+                    parsed.append((index, 'antibiotic', patient_reference(resource), fields))
+                elif resource_type == 'DocumentReference':
+                    fields = parse_clinical_note(resource)
+                    parsed.append((index, 'note', patient_reference(resource), fields))
+                else:
+                    raise ValueError(f"Unsupported resourceType '{resource_type}'.")
+            except Exception as e:
+                self._fail(index, str(e))
+        return parsed
+
+    def _ok(self, index: int, location: str, created: bool = True):
+        self.responses[index] = {
+            "status": "201 Created" if created else "200 OK",
+            "location": location,
+        }
+
+    def _fail(self, index: int, message: str):
+        self.responses[index] = {
+            "status": "400 Bad Request",
+            "outcome": operation_outcome([message]),
+        }
+
+    def _raise_for_errors(self):
+        if self.bundle_type != 'transaction':
+            return
+        issues = [
+            f"entry[{index}]: {issue['diagnostics']}"
+            for index, response in enumerate(self.responses)
+            if response and 'outcome' in response
+            for issue in response['outcome']['issue']
+        ]
+        if issues:
+            raise BundleError(issues)
+
+    # ==========================================================
+    # 🧍 Patients and episodes
+    # ==========================================================
+
+    def _resolve_patients(self, parsed: list[tuple]):
+        references = {reference for _, _, reference, _ in parsed if reference}
+        self.patients = {
+            patient.patient_id: patient
+            for patient in Patient.objects.filter(patient_id__in=references)
+        }
+
+    def _write_patients(self, parsed: list[tuple]):
+        requested = {}
+        for index, kind, patient_id, defaults in parsed:
+            if kind == 'patient':
+                _, indexes = requested.get(patient_id, (None, []))
+                requested[patient_id] = (defaults, indexes + [index])
+
+        to_create, to_update = [], []
+        for patient_id, (defaults, indexes) in requested.items():
+            patient = self.patients.get(patient_id)
+            created = patient is None
+            if created:
+                to_create.append(Patient(patient_id=patient_id, **defaults))
+            else:
+                for field, value in defaults.items():
+                    setattr(patient, field, value)
+                to_update.append(patient)
+
+            for index in indexes:
+                self._ok(index, f"Patient/{patient_id}", created=created)
+
+        if to_create:
+            Patient.objects.bulk_create(to_create)
+            created_ids = [patient.patient_id for patient in to_create]
+            # bulk_create only sets pks on some backends, so refetch the new rows.
+            for patient in Patient.objects.filter(patient_id__in=created_ids):
+                self.patients[patient.patient_id] = patient
+            self._add_to_outbox("patient", created_ids)
+        if to_update:
+            Patient.objects.bulk_update(to_update, ['name', 'gender', 'birth_date'])
+
+    def _write_episodes(self, parsed: list[tuple]):
+        items = []
+        for index, kind, reference, fields in parsed:
+            if kind != 'episode':
+                continue
+            patient = self.patients.get(reference)
+            if not patient:
+                self._fail(index, "Patient matching query does not exist.")
+                continue
+            items.append((index, patient, fields))
+
+        if not items:
+            return
+
+        episodes = SepsisEpisode.objects.bulk_create([
+            SepsisEpisode(patient=patient, **fields) for _, patient, fields in items
+        ])
+        for (index, _, _), episode in zip(items, episodes):
+            self._ok(index, f"Encounter/{episode.pk}")
+        for patient_id in {patient.patient_id for _, patient, _ in items}:
+            transaction.on_commit(lambda patient_id=patient_id: invalidate_episode(patient_id))
+        self._add_to_outbox("episode", [episode.pk for episode in episodes])
+
+    def _resolve_episodes(self):
+        patient_pks = [patient.pk for patient in self.patients.values()]
+        for episode in SepsisEpisode.objects.filter(patient_id__in=patient_pks).order_by('started_at', 'id'):
+            self.episodes.setdefault(episode.patient_id, []).append(episode)
+
+    def _episode_for(self, index: int, reference: str, when=None):
+        patient = self.patients.get(reference)
+        if not patient:
+            self._fail(index, "Patient matching query does not exist.")
+            return None
+        episodes = self.episodes.get(patient.pk)
+        if not episodes:
+            self._fail(index, "No active episode.")
+            return None
+        if when:
+            for episode in reversed(episodes):
+                if episode.started_at <= when:
+                    return episode
+        return episodes[-1]
+
+    # ==========================================================
+    # 🚨 Clinical events
+    # ==========================================================
+
+    def _write_simple(self, items, model, resource_type, entity_type):
+        objects = model.objects.bulk_create([
+            model(episode=episode, **fields) for _, episode, fields in items
+        ])
+        for (index, _, _), obj in zip(items, objects):
+            self._ok(index, f"{resource_type}/{obj.pk}")
+        self._add_to_outbox(entity_type, [obj.pk for obj in objects])
+
+    def _write_vitals(self, items):
+        if items:
+            self._write_simple(items, VitalsObservation, "Observation", "vitals")
+
+    def _write_labs(self, items):
+        if items:
+            self._write_simple(items, LabResult, "Observation", "lab")
+
+    def _write_antibiotics(self, items):
+        if items:
+            self._write_simple(items, AntibioticAdministration, "MedicationAdministration", "antibiotic")
+
+    def _write_notes(self, items):
+        if items:
+            self._write_simple(items, ClinicalNote, "DocumentReference", "clinical_note")
+
+    def _write_cultures(self, items):
+        if not items:
+            return
+
+        keys = {(episode.pk, fields['material'], fields['observed_at']) for _, episode, fields in items}
+        samples = {
+            (s.episode_id, s.material, s.collected_at): s
+            for s in Sample.objects.filter(
+                episode_id__in={key[0] for key in keys},
+                collected_at__in={key[2] for key in keys},
+            )
+        }
+        missing = [key for key in keys if key not in samples]
+        for sample in Sample.objects.bulk_create([
+            Sample(episode_id=episode_id, material=material, collected_at=collected_at)
+            for episode_id, material, collected_at in missing
+        ]):
+            samples[(sample.episode_id, sample.material, sample.collected_at)] = sample
+
+        cultures = CultureResult.objects.bulk_create([
+            CultureResult(
+                sample=samples[(episode.pk, fields['material'], fields['observed_at'])],
+                result=fields['result'],
+                reported_at=fields['observed_at'],
+            ) for _, episode, fields in items
+        ])
+
+        organisms = Organism.objects.bulk_create([
+            Organism(culture_result=culture, name=name)
+            for (_, _, fields), culture in zip(items, cultures)
+            for name in fields['organisms']
+        ])
+
+        for (index, _, _), culture in zip(items, cultures):
+            self._ok(index, f"Observation/{culture.pk}")
+        self._add_to_outbox("culture", [c.pk for c in cultures])
+        self._add_to_outbox("organism", [o.pk for o in organisms])
+
+    def _write_antibiograms(self, items):
+        if not items:
+            return
+
+        # Only organisms cultured in the entry's own episode (including the ones this
+        # bundle just wrote): the newest one with that name wins.
+        latest_organisms = {
+            (episode_id, name): organism_id
+            for episode_id, name, organism_id in (
+                Organism.objects.filter(
+                    name__in={fields['organism_name'] for _, _, fields in items},
+                    culture_result__sample__episode_id__in={episode.pk for _, episode, _ in items},
+                )
+                .values('culture_result__sample__episode_id', 'name')
+                .annotate(latest=Max('id'))
+                .values_list('culture_result__sample__episode_id', 'name', 'latest')
+            )
+        }
+
+        resolved = []
+        for index, episode, fields in items:
+            organism_id = latest_organisms.get((episode.pk, fields['organism_name']))
+            if not organism_id:
+                self._fail(index, f"No organism '{fields['organism_name']}' in episode {episode.pk}.")
+                continue
+            resolved.append((index, organism_id, fields))
+
+        antibiograms = Antibiogram.objects.bulk_create([
+            Antibiogram(organism_id=organism_id, created_at=fields['observed_at'])
+            for _, organism_id, fields in resolved
+        ])
+
+        AntibioticSusceptibility.objects.bulk_create([
+            AntibioticSusceptibility(antibiogram=antibiogram, **susceptibility)
+            for (_, _, fields), antibiogram in zip(resolved, antibiograms)
+            for susceptibility in fields['susceptibilities']
+        ])
+
+        for (index, _, _), antibiogram in zip(resolved, antibiograms):
+            self._ok(index, f"Observation/{antibiogram.pk}")
+        self._add_to_outbox("antibiogram", [a.pk for a in antibiograms])
+
+    def _add_to_outbox(self, entity_type, ids):
+        """
+        `bulk_create` skips post_save, so the embedding triggers from
+        apps.sepsis.signals are written to the outbox here, in the same transaction.
+        """
+        if ids and self.enqueue_embeddings:
+            add_to_outbox(entity_type, ids)
+
+
+def _event_time(fields: dict):
+    return fields.get('observed_at') or fields.get('started_at') or fields.get('created_at')
@@ -0,0 +1,174 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# LOINC code → VitalsObservation field
+VITALS_LOINC = {
+    '8480-6': 'blood_pressure_sys',
+    '8462-4': 'blood_pressure_dia',
+    '8867-4': 'heart_rate',
+    '9279-1': 'respiratory_rate',
+    '8310-5': 'temperature',
+    '59408-5': 'oxygen_saturation',
+}
+
+
+def _parse_datetime(value, field: str):
+    """
+    FHIR instants without an offset are taken in the default time zone, so they
+    compare with (and are stored like) the aware datetimes from the database.
+    """
+    parsed = parse_datetime(value) if value else None
+    if parsed is None:
+        raise ValueError(f"Missing or invalid '{field}' field.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _parse_optional_datetime(value, field: str):
+    return _parse_datetime(value, field) if value else None
+
+
+def patient_reference(data: dict) -> str:
+    """
+    Extract the FHIR patient id from a resource's `subject.reference` ("Patient/<id>").
+    """
+    return data.get('subject', {}).get('reference', '').split('/')[-1]
+
+
+def parse_patient(data: dict) -> tuple[str, dict]:
+    patient_id = data.get('id')
+    if not patient_id:
+        raise ValueError("Missing 'id' field.")
+
+    name_data = data.get('name', [])
+    given = " ".join(name_data[0].get('given', [])) if name_data else ""
+    family = name_data[0].get('family', '') if name_data else ""
+    full_name = f"{given} {family}".strip() or "Unknown"
+
+    return patient_id, {
+        'name': full_name,
+        'gender': data.get('gender', 'unknown'),
+        'birth_date': data.get('birthDate', None),
+    }
+
+
+def parse_episode(data: dict) -> dict:
+    """
+    A FHIR Encounter is stored as a SepsisEpisode (period.start / period.end).
+    """
+    period = data.get('period', {})
+    if not period.get('start'):
+        raise ValueError("Missing 'period.start' field.")
+
+    return {
+        'started_at': _parse_datetime(period['start'], 'period.start'),
+        'ended_at': _parse_optional_datetime(period.get('end'), 'period.end'),
+    }
+
+
+def parse_culture(data: dict) -> dict:
+    result = data.get('valueCodeableConcept', {}).get('text', '').lower()
+    if result not in ['positive', 'negative']:
+        raise ValueError("Result must be 'positive' or 'negative'.")
+
+    organisms = []
+    if result == 'positive':
+        for comp in data.get('component', []):
+            organism_name = comp.get('valueCodeableConcept', {}).get('text')
+            if organism_name:
+                organisms.append(organism_name)
+
+    return {
+        'observed_at': _parse_datetime(data.get('effectiveDateTime'), 'effectiveDateTime'),
+        'material': data.get('bodySite', {}).get('text', 'Unknown'),
+        'result': result,
+        'organisms': organisms,
+    }
+
+
+def parse_antibiogram(data: dict) -> dict:
+    susceptibilities = []
+    for comp in data.get('component', []):
+        antibiotic = comp['code']['coding'][0]['display']
+        result = comp.get('valueCodeableConcept', {}).get('text')
+        if antibiotic and result:
+            susceptibilities.append({'antibiotic': antibiotic, 'result': result})
+
+    if not susceptibilities:
+        raise ValueError("No valid components.")
+
+    return {
+        'observed_at': _parse_datetime(data.get('effectiveDateTime'), 'effectiveDateTime'),
+        'organism_name': data.get('valueCodeableConcept', {}).get('text', 'Unknown'),
+        'susceptibilities': susceptibilities,
+    }
+
+
+def parse_vitals(data: dict) -> dict:
+    vitals = {}
+    for comp in data.get('component', []):
+        code = comp['code']['coding'][0]['code']
+        value = comp.get('valueQuantity', {}).get('value')
+
+        if value is None:
+            continue
+        if code in VITALS_LOINC:
+            vitals[VITALS_LOINC[code]] = value
+
+    if not vitals:
+        raise ValueError("No valid vitals.")
+
+    return {'observed_at': _parse_datetime(data.get('effectiveDateTime'), 'effectiveDateTime'), **vitals}
+
+
+def parse_lab_result(data: dict) -> dict:
+    return {
+        'exam_code': data['code']['coding'][0]['code'],
+        'exam_name': data['code']['coding'][0]['display'],
+        'value': data['valueQuantity']['value'],
+        'unit': data['valueQuantity'].get('unit'),
+        'observed_at': _parse_datetime(data.get('effectiveDateTime'), 'effectiveDateTime'),
+    }
+
+
+def parse_antibiotic_administration(data: dict) -> dict:
+    return {
+        'name': data.get('medicationCodeableConcept', {}).get('text'),
+        'started_at': _parse_datetime(data.get('effectivePeriod', {}).get('start'), 'effectivePeriod.start'),
+        'stopped_at': _parse_optional_datetime(data.get('effectivePeriod', {}).get('end'), 'effectivePeriod.end'),
+        'dose': data.get('dosage', [{}])[0].get('text'),
+        'route': data.get('route', {}).get('text'),
+    }
+
+
+def parse_clinical_note(data: dict) -> dict:
+    return {
+        'author': data.get('author', {}).get('display'),
+        'content': data.get('content', [{}])[0].get('text', {}).get('div'),
+        'created_at': _parse_datetime(data.get('date'), 'date'),
+    }
+
+
+def classify_observation(data: dict) -> str:
+    """
+    Decide which of our Observation flavours a generic FHIR Observation carries:
+    'vitals', 'lab', 'culture' or 'antibiogram'.
+    """
+    components = data.get('component', [])
+    codes = {
+        (comp.get('code', {}).get('coding') or [{}])[0].get('code')
+        for comp in components
+    }
+
+    if codes & VITALS_LOINC.keys():
+        return 'vitals'
+    if 'valueQuantity' in data:
+        return 'lab'
+
+    value = data.get('valueCodeableConcept', {}).get('text', '').lower()
+    if value in ['positive', 'negative']:
+        return 'culture'
+    if components:
+        return 'antibiogram'
+
+    raise ValueError("Unsupported Observation: expected vitals, lab, culture or antibiogram.")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apps.ingestion.ndjson_import import NDJSONImport, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import ($import) of FHIR NDJSON files from a local path or a minio://bucket/object URI. "
+        "Files are processed in the given order, e.g. Patient, Encounter, then Observation files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='Local paths or minio://bucket/object URIs')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Resources per bulk_create batch / checkpoint')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore previous checkpoints and start from the beginning of each file')
+        parser.add_argument('--embed', action='store_true',
+                            help='Enqueue embedding tasks for the imported rows')
+
+    def handle(self, *args, **options):
+        for source in options['sources']:
+            self.stdout.write(f"🚀 Importing {source}")
+
+            result = NDJSONImport(
+                source,
+                chunk_size=options['chunk_size'],
+                enqueue_embeddings=options['embed'],
+                restart=options['restart'],
+                log=self.stdout.write,
+            ).run()
+
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {source}: {result.records_ingested} records ingested, {result.records_failed} rejected "
+                f"(offset {result.checkpoint_offset})"
+            ))
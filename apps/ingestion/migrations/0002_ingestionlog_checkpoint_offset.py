@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionlog',
+            name='checkpoint_offset',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
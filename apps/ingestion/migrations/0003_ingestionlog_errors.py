@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0002_ingestionlog_checkpoint_offset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionlog',
+            name='errors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='ingestionlog',
+            name='records_failed',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -9,6 +9,9 @@ class IngestionLog(models.Model):
 
     success = models.BooleanField(default=True)
     records_ingested = models.IntegerField(default=0)
+    checkpoint_offset = models.BigIntegerField(default=0)  # Bytes já processados (importação NDJSON)
+    records_failed = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # Linhas rejeitadas: [{"offset": byte, "error": msg}]
 
     error_message = models.TextField(null=True, blank=True)
 
@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+from apps.patients.models import Patient
+from apps.sepsis.models import SepsisEpisode
+
+# Far longer than any cached entry lives, so a counter never expires and
+# restarts at a value an entry is still tagged with.
+GENERATION_TTL = 7 * 24 * 3600
+# Redis errors are printed at most once per interval: a bundle import hits them on every entry.
+WARN_INTERVAL = 60
+
+
+class EpisodeResolver:
+    """
+    Maps a FHIR patient reference to `(patient pk, latest episode pk)`.
+
+    Every patient has a generation counter in Redis, bumped whenever one of
+    its episodes is opened or closed, in any process. Cached entries (a
+    per-process LRU, then a Redis copy shared by all workers) are tagged with
+    the generation they were read under and only served while it is still
+    current, so a new episode is seen by every process on its next lookup.
+    One MGET reads the generation and the Redis copy together.
+
+    Without Redis (not configured, or unreachable) only the local LRU is used:
+    episodes opened in this process invalidate it at once, those opened by
+    other processes are seen once the entry's `ttl` runs out.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: int = 60, redis_url: str = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._warned_at = None
+        self._suppressed_warnings = 0
+
+    def resolve(self, patient_id: str) -> tuple[int, int | None]:
+        """
+        Raises Patient.DoesNotExist for unknown patients. The episode pk is None
+        when the patient has no episode yet.
+        """
+        generation, shared = self._get_redis(patient_id)
+        entry = self._get_local(patient_id, generation)
+        if entry:
+            return entry
+
+        if shared and shared[0] == generation:
+            with self._lock:
+                self.redis_hits += 1
+            self._set_local(patient_id, generation, shared[1])
+            return shared[1]
+
+        with self._lock:
+            self.misses += 1
+
+        patient_pk = Patient.objects.values_list('id', flat=True).get(patient_id=patient_id)
+        episode_pk = (
+            SepsisEpisode.objects
+            .filter(patient_id=patient_pk)
+            .order_by('-started_at')
+            .values_list('id', flat=True)
+            .first()
+        )
+        entry = (patient_pk, episode_pk)
+
+        # Tagged with the generation read *before* the query: an episode opened
+        # meanwhile bumps it, and this entry is never served.
+        self._set_local(patient_id, generation, entry)
+        if generation is not None:
+            self._set_redis(patient_id, generation, entry)
+        return entry
+
+    def invalidate(self, patient_id: str):
+        with self._lock:
+            self._local.pop(patient_id, None)
+
+        if self._redis:
+            try:
+                pipeline = self._redis.pipeline()
+                pipeline.incr(self._generation_key(patient_id))
+                pipeline.expire(self._generation_key(patient_id), GENERATION_TTL)
+                pipeline.delete(self._key(patient_id))
+                pipeline.execute()
+            except redis.RedisError as e:
+                self._warn(f"failed to invalidate {patient_id} in Redis: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.local_hits + self.redis_hits + self.misses
+            return {
+                "size": len(self._local),
+                "max_size": self.max_size,
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+                "redis_enabled": self._redis is not None,
+            }
+
+    # ==========================================================
+    # 🗂️ Tiers
+    # ==========================================================
+
+    def _get_local(self, patient_id: str, generation: int | None):
+        """An entry is served only under the generation it was cached with; None means Redis was off."""
+        with self._lock:
+            cached = self._local.get(patient_id)
+            if not cached:
+                return None
+
+            expires_at, cached_generation, entry = cached
+            if expires_at < time.monotonic() or cached_generation != generation:
+                del self._local[patient_id]
+                return None
+
+            self._local.move_to_end(patient_id)
+            self.local_hits += 1
+            return entry
+
+    def _set_local(self, patient_id: str, generation: int | None, entry: tuple):
+        with self._lock:
+            self._local[patient_id] = (time.monotonic() + self.ttl, generation, entry)
+            self._local.move_to_end(patient_id)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def _get_redis(self, patient_id: str):
+        """
+        `(current generation, (generation, entry) of the shared copy or None)`;
+        the generation is None when Redis is off or unreachable.
+        """
+        if not self._redis:
+            return None, None
+
+        try:
+            raw_generation, raw = self._redis.mget(self._generation_key(patient_id), self._key(patient_id))
+        except redis.RedisError as e:
+            self._warn(f"Redis unavailable, using the local cache only: {e}")
+            return None, None
+
+        generation = int(raw_generation or 0)
+        if not raw:
+            return generation, None
+
+        cached_generation, patient_pk, episode_pk = raw.decode().split(':')
+        return generation, (int(cached_generation), (int(patient_pk), int(episode_pk) if episode_pk else None))
+
+    def _set_redis(self, patient_id: str, generation: int, entry: tuple):
+        patient_pk, episode_pk = entry
+        try:
+            self._redis.setex(self._key(patient_id), self.ttl, f"{generation}:{patient_pk}:{episode_pk or ''}")
+        except redis.RedisError as e:
+            self._warn(f"failed to cache {patient_id} in Redis: {e}")
+
+    def _warn(self, message: str):
+        with self._lock:
+            now = time.monotonic()
+            if self._warned_at is not None and now - self._warned_at < WARN_INTERVAL:
+                self._suppressed_warnings += 1
+                return
+            suppressed, self._suppressed_warnings, self._warned_at = self._suppressed_warnings, 0, now
+
+        more = f" ({suppressed} similar warnings in the last {WARN_INTERVAL}s)" if suppressed else ""
+        print(f"⚠️ Episode resolver: {message}{more}")
+
+    @staticmethod
+    def _key(patient_id: str) -> str:
+        return f"episode-resolver:{patient_id}"
+
+    @staticmethod
+    def _generation_key(patient_id: str) -> str:
+        return f"episode-resolver:generation:{patient_id}"
+
+
+@lru_cache()
+def get_episode_resolver() -> EpisodeResolver:
+    return EpisodeResolver(
+        max_size=settings.INGESTION_RESOLVER_CACHE_SIZE,
+        ttl=settings.INGESTION_RESOLVER_TTL,
+        redis_url=settings.INGESTION_RESOLVER_REDIS_URL,
+    )
+
+
+def resolve_episode(patient_id: str) -> tuple[int, int | None]:
+    return get_episode_resolver().resolve(patient_id)
+
+
+def invalidate_episode(patient_id: str):
+    get_episode_resolver().invalidate(patient_id)
@@ -1,3 +1,253 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+import fakeredis
+from django.db import OperationalError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from apps.patients.models import Patient
+from apps.sepsis.models import Antibiogram, SepsisEpisode, VitalsObservation
+from .bundle import BundleIngestion
+from .ndjson_import import NDJSONImport
+from .resolver import EpisodeResolver
+from .views import FHIRBundleIngestionView
+
+
+def _vitals(patient_id: str, when: str, heart_rate: int = 90) -> dict:
+    return {"resource": {
+        "resourceType": "Observation",
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": when,
+        "component": [{"code": {"coding": [{"code": "8867-4"}]}, "valueQuantity": {"value": heart_rate}}],
+    }}
+
+
+def _culture(patient_id: str, when: str, organism: str) -> dict:
+    return {"resource": {
+        "resourceType": "Observation",
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": when,
+        "valueCodeableConcept": {"text": "positive"},
+        "bodySite": {"text": "sangue"},
+        "component": [{"code": {"coding": [{"code": "organism"}]}, "valueCodeableConcept": {"text": organism}}],
+    }}
+
+
+def _antibiogram(patient_id: str, when: str, organism: str) -> dict:
+    return {"resource": {
+        "resourceType": "Observation",
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": when,
+        "valueCodeableConcept": {"text": organism},
+        "component": [{"code": {"coding": [{"display": "Meropenem"}]}, "valueCodeableConcept": {"text": "S"}}],
+    }}
+
+
+def _bundle(bundle_type: str, entries: list) -> dict:
+    return {"resourceType": "Bundle", "type": bundle_type, "entry": entries}
+
+
+class FHIRBundleIngestionTests(TestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(patient_id="p1", name="Ana")
+        self.first = SepsisEpisode.objects.create(patient=self.patient, started_at=_aware(2024, 1, 1))
+        self.second = SepsisEpisode.objects.create(patient=self.patient, started_at=_aware(2024, 1, 10))
+
+    def _post(self, bundle: dict):
+        request = APIRequestFactory().post("/ingestion/fhir/", bundle, format="json")
+        return FHIRBundleIngestionView.as_view()(request)
+
+    def test_batch_answers_per_entry_and_keeps_valid_entries(self):
+        response = self._post(_bundle("batch", [
+            _vitals("p1", "2024-01-02T00:00:00"),  # no offset: taken in the default time zone
+            _vitals("unknown", "2024-01-02T00:00:00"),
+            _vitals("p1", ""),
+        ]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["type"], "batch-response")
+        statuses = [entry["response"]["status"] for entry in response.data["entry"]]
+        self.assertEqual(statuses, ["201 Created", "400 Bad Request", "400 Bad Request"])
+        self.assertEqual(VitalsObservation.objects.count(), 1)
+
+    def test_transaction_is_all_or_nothing(self):
+        response = self._post(_bundle("transaction", [
+            _vitals("p1", "2024-01-02T00:00:00-03:00"),
+            _vitals("unknown", "2024-01-02T00:00:00-03:00"),
+        ]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["resourceType"], "OperationOutcome")
+        self.assertIn("entry[1]", response.data["issue"][0]["diagnostics"])
+        self.assertFalse(VitalsObservation.objects.exists())
+
+    def test_events_go_to_the_episode_open_at_event_time(self):
+        self._post(_bundle("batch", [
+            _vitals("p1", "2024-01-05T08:00:00", heart_rate=100),
+            _vitals("p1", "2024-01-12T08:00:00+00:00", heart_rate=110),
+        ]))
+
+        episodes = dict(VitalsObservation.objects.values_list("heart_rate", "episode_id"))
+        self.assertEqual(episodes, {100: self.first.pk, 110: self.second.pk})
+
+    def test_antibiogram_attaches_to_the_organism_of_its_own_episode(self):
+        other = Patient.objects.create(patient_id="p2", name="Bia")
+        other_episode = SepsisEpisode.objects.create(patient=other, started_at=_aware(2024, 1, 1))
+        self._post(_bundle("batch", [_culture("p1", "2024-01-11T08:00:00", "E. coli")]))
+        self._post(_bundle("batch", [_culture("p2", "2024-01-11T09:00:00", "E. coli")]))  # newer row, other patient
+
+        response = self._post(_bundle("batch", [
+            _antibiogram("p1", "2024-01-12T08:00:00", "E. coli"),
+            _antibiogram("p1", "2024-01-12T08:00:00", "K. pneumoniae"),
+            _culture("p2", "2024-01-12T08:00:00", "K. pneumoniae"),  # same bundle, other patient
+        ]))
+
+        statuses = [entry["response"]["status"] for entry in response.data["entry"]]
+        self.assertEqual(statuses, ["201 Created", "400 Bad Request", "201 Created"])
+        antibiogram = Antibiogram.objects.get()
+        self.assertEqual(antibiogram.organism.culture_result.sample.episode_id, self.second.pk)
+        self.assertFalse(Antibiogram.objects.filter(organism__culture_result__sample__episode=other_episode).exists())
+
+    def test_query_count_does_not_grow_with_bundle_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self._post(_bundle("batch", [_vitals("p1", "2024-01-05T08:00:00")] * 2))
+
+        with self.assertNumQueries(len(small.captured_queries)):
+            self._post(_bundle("batch", [_vitals("p1", "2024-01-05T08:00:00")] * 50))
+        self.assertEqual(VitalsObservation.objects.count(), 52)
+
+
+class NDJSONImportTests(TestCase):
+    def setUp(self):
+        patient = Patient.objects.create(patient_id="p1", name="Ana")
+        SepsisEpisode.objects.create(patient=patient, started_at=_aware(2024, 1, 1))
+        handle, self.path = tempfile.mkstemp(suffix=".ndjson")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def _write(self, lines: list[str]) -> list[int]:
+        offsets, position = [], 0
+        with open(self.path, "w") as f:
+            for line in lines:
+                offsets.append(position)
+                f.write(line + "\n")
+                position += len(line.encode()) + 1
+        return offsets
+
+    def _import(self, **options):
+        return NDJSONImport(self.path, log=lambda message: None, **options).run()
+
+    def test_rejected_lines_are_recorded_and_the_import_moves_on(self):
+        offsets = self._write([
+            json.dumps(_vitals("p1", "2024-01-02T08:00:00")["resource"]),
+            "{not json",
+            json.dumps(_vitals("p1", "2024-01-02T09:00:00", heart_rate="abc")["resource"]),  # fails the chunk
+            json.dumps(_vitals("unknown", "2024-01-02T10:00:00")["resource"]),
+            json.dumps(_vitals("p1", "2024-01-02T11:00:00")["resource"]),
+        ])
+
+        result = self._import(chunk_size=10)
+
+        self.assertTrue(result.success)
+        self.assertEqual((result.records_ingested, result.records_failed), (2, 3))
+        self.assertEqual([error["offset"] for error in result.errors], [offsets[1], offsets[2], offsets[3]])
+        self.assertEqual(result.checkpoint_offset, os.path.getsize(self.path))
+        self.assertEqual(VitalsObservation.objects.count(), 2)
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        self._write([json.dumps(_vitals("p1", f"2024-01-02T0{hour}:00:00")["resource"]) for hour in range(5)])
+        run = BundleIngestion.run
+        calls = []
+
+        def failing_second_chunk(ingestion):
+            calls.append(ingestion)
+            if len(calls) == 2:
+                raise OperationalError("connection lost")
+            return run(ingestion)
+
+        with mock.patch.object(BundleIngestion, "run", failing_second_chunk), self.assertRaises(OperationalError):
+            self._import(chunk_size=2)
+        self.assertEqual(VitalsObservation.objects.count(), 2)
+
+        result = self._import(chunk_size=2)
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.records_ingested, 5)
+        self.assertEqual(VitalsObservation.objects.count(), 5)
+
+
+class EpisodeResolverTests(TestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(patient_id="p1", name="Ana")
+        self.first = SepsisEpisode.objects.create(patient=self.patient, started_at=_aware(2024, 1, 1))
+        self.server = fakeredis.FakeServer()
+
+    def _resolver(self, redis_url="redis://resolver"):
+        # Each resolver stands for one worker process; they share the Redis server.
+        with mock.patch("apps.ingestion.resolver.redis.Redis.from_url",
+                        return_value=fakeredis.FakeRedis(server=self.server)):
+            return EpisodeResolver(ttl=60, redis_url=redis_url)
+
+    def test_local_then_shared_hits(self):
+        first, second = self._resolver(), self._resolver()
+        expected = (self.patient.pk, self.first.pk)
+
+        self.assertEqual(first.resolve("p1"), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(first.resolve("p1"), expected)
+            self.assertEqual(second.resolve("p1"), expected)
+        self.assertEqual((first.stats()["misses"], first.stats()["local_hits"]), (1, 1))
+        self.assertEqual(second.stats()["redis_hits"], 1)
+
+    def test_expired_local_entry_is_refreshed_from_redis(self):
+        resolver = self._resolver()
+        resolver.resolve("p1")
+
+        with mock.patch("apps.ingestion.resolver.time.monotonic", return_value=time.monotonic() + 61), \
+                self.assertNumQueries(0):
+            resolver.resolve("p1")
+        self.assertEqual(resolver.stats()["redis_hits"], 1)
+
+    def test_new_episode_is_seen_by_every_process_at_once(self):
+        opener, other = self._resolver(), self._resolver()
+        opener.resolve("p1")
+        other.resolve("p1")
+
+        second = SepsisEpisode.objects.create(patient=self.patient, started_at=_aware(2024, 1, 10))
+        opener.invalidate("p1")
+
+        self.assertEqual(other.resolve("p1"), (self.patient.pk, second.pk))
+
+    def test_without_redis_the_local_cache_still_serves(self):
+        resolver = self._resolver(redis_url=None)
+        resolver.resolve("p1")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve("p1"), (self.patient.pk, self.first.pk))
+
+        second = SepsisEpisode.objects.create(patient=self.patient, started_at=_aware(2024, 1, 10))
+        resolver.invalidate("p1")
+        self.assertEqual(resolver.resolve("p1"), (self.patient.pk, second.pk))
+
+    def test_unreachable_redis_falls_back_to_the_local_cache_and_warns_once(self):
+        resolver = self._resolver()
+        self.server.connected = False
+
+        with mock.patch("builtins.print") as printed:
+            for _ in range(3):
+                self.assertEqual(resolver.resolve("p1"), (self.patient.pk, self.first.pk))
+            resolver.invalidate("p1")
+
+        self.assertEqual((resolver.stats()["misses"], resolver.stats()["local_hits"]), (1, 2))
+        self.assertEqual(printed.call_count, 1)
+
 
-# Create your tests here.
+def _aware(year: int, month: int, day: int):
+    return timezone.make_aware(datetime(year, month, day))
@@ -9,15 +9,21 @@ from apps.ingestion.views import (
     FHIRLabResultIngestionView,
     FHIRAntibioticAdministrationIngestionView,
     FHIRClinicalNoteIngestionView,
+    FHIRBundleIngestionView,
+    EpisodeResolverStatsView,
 )
 
 urlpatterns = [
+    # ✅ Bundle (batch / transaction)
+    path('fhir/', FHIRBundleIngestionView.as_view(), name='fhir-bundle-ingest'),
+
     # ✅ Patient
     path('fhir/Patient/', FHIRPatientIngestionView.as_view(), name='fhir-patient-ingest'),
 
     # ✅ Sepsis Episode Lifecycle
     path('fhir/SepsisEpisode/start/', FHIROpenSepsisEpisodeView.as_view(), name='fhir-sepsis-episode-start'),
     path('fhir/SepsisEpisode/close/', FHIRCloseSepsisEpisodeView.as_view(), name='fhir-sepsis-episode-close'),
+    path('fhir/SepsisEpisode/resolver-stats/', EpisodeResolverStatsView.as_view(), name='fhir-episode-resolver-stats'),
 
     # ✅ Microbiology
     path('fhir/Culture/', FHIRCultureIngestionView.as_view(), name='fhir-culture-ingest'),
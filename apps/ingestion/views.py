@@ -1,6 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import transaction
 from django.utils.dateparse import parse_datetime
 
 from apps.patients.models import Patient
@@ -16,6 +17,18 @@ from apps.sepsis.models import (
     AntibioticAdministration,
     ClinicalNote
 )
+from .resolver import resolve_episode, invalidate_episode, get_episode_resolver
+from .bundle import BundleIngestion, BundleError, operation_outcome
+from .fhir import (
+    patient_reference,
+    parse_patient,
+    parse_culture,
+    parse_antibiogram,
+    parse_vitals,
+    parse_lab_result,
+    parse_antibiotic_administration,
+    parse_clinical_note,
+)
 
 
 class FHIRPatientIngestionView(APIView):
@@ -23,21 +36,11 @@ class FHIRPatientIngestionView(APIView):
         data = request.data
 
         try:
-            patient_id = data.get('id')
-            if not patient_id:
-                return Response({"error": "Missing 'id' field."}, status=400)
-
-            name_data = data.get('name', [])
-            given = " ".join(name_data[0].get('given', [])) if name_data else ""
-            family = name_data[0].get('family', '') if name_data else ""
-            full_name = f"{given} {family}".strip() or "Unknown"
-
-            gender = data.get('gender', 'unknown')
-            birth_date = data.get('birthDate', None)
+            patient_id, defaults = parse_patient(data)
 
             patient, created = Patient.objects.update_or_create(
                 patient_id=patient_id,
-                defaults={'name': full_name, 'gender': gender, 'birth_date': birth_date}
+                defaults=defaults
             )
 
             return Response({
@@ -57,10 +60,12 @@ class FHIROpenSepsisEpisodeView(APIView):
 
             patient = Patient.objects.get(patient_id=patient_id)
 
-            episode = SepsisEpisode.objects.create(
-                patient=patient,
-                started_at=started_at
-            )
+            with transaction.atomic():
+                episode = SepsisEpisode.objects.create(
+                    patient=patient,
+                    started_at=started_at
+                )
+            invalidate_episode(patient.patient_id)
 
             return Response({"status": "episode opened", "episode_id": episode.id}, status=201)
 
@@ -74,9 +79,10 @@ class FHIRCloseSepsisEpisodeView(APIView):
             episode_id = request.data.get('episode_id')
             ended_at = parse_datetime(request.data.get('endedAt'))
 
-            episode = SepsisEpisode.objects.get(id=episode_id)
+            episode = SepsisEpisode.objects.select_related('patient').get(id=episode_id)
             episode.ended_at = ended_at
             episode.save()
+            invalidate_episode(episode.patient.patient_id)
 
             return Response({"status": "episode closed"}, status=200)
 
@@ -88,37 +94,27 @@ class FHIRCultureIngestionView(APIView):
     def post(self, request):
         try:
             data = request.data
-            patient_id = data.get('subject', {}).get('reference', '').split('/')[-1]
-            patient = Patient.objects.get(patient_id=patient_id)
-
-            episode = SepsisEpisode.objects.filter(patient=patient).order_by('-started_at').first()
-            if not episode:
+            _, episode_id = resolve_episode(patient_reference(data))
+            if not episode_id:
                 return Response({"error": "No active episode."}, status=400)
 
-            observed_at = parse_datetime(data.get('effectiveDateTime'))
-            material = data.get('bodySite', {}).get('text', 'Unknown')
+            culture_data = parse_culture(data)
 
-            sample, _ = Sample.objects.get_or_create(
-                episode=episode,
-                material=material,
-                collected_at=observed_at
-            )
+            with transaction.atomic():
+                sample, _ = Sample.objects.get_or_create(
+                    episode_id=episode_id,
+                    material=culture_data['material'],
+                    collected_at=culture_data['observed_at']
+                )
 
-            result = data.get('valueCodeableConcept', {}).get('text', '').lower()
-            if result not in ['positive', 'negative']:
-                return Response({"error": "Result must be 'positive' or 'negative'."}, status=400)
+                culture = CultureResult.objects.create(
+                    sample=sample,
+                    result=culture_data['result'],
+                    reported_at=culture_data['observed_at']
+                )
 
-            culture = CultureResult.objects.create(
-                sample=sample,
-                result=result,
-                reported_at=observed_at
-            )
-
-            if result == 'positive':
-                for comp in data.get('component', []):
-                    organism_name = comp.get('valueCodeableConcept', {}).get('text')
-                    if organism_name:
-                        Organism.objects.create(culture_result=culture, name=organism_name)
+                for organism_name in culture_data['organisms']:
+                    Organism.objects.create(culture_result=culture, name=organism_name)
 
             return Response({"status": "culture recorded"}, status=201)
 
@@ -130,41 +126,26 @@ class FHIRAntibiogramIngestionView(APIView):
     def post(self, request):
         try:
             data = request.data
-            patient_id = data.get('subject', {}).get('reference', '').split('/')[-1]
-            patient = Patient.objects.get(patient_id=patient_id)
-
-            episode = SepsisEpisode.objects.filter(patient=patient).order_by('-started_at').first()
-            if not episode:
+            _, episode_id = resolve_episode(patient_reference(data))
+            if not episode_id:
                 return Response({"error": "No active episode."}, status=400)
 
-            observed_at = parse_datetime(data.get('effectiveDateTime'))
-            organism_name = data.get('valueCodeableConcept', {}).get('text', 'Unknown')
-            organism = Organism.objects.filter(name=organism_name).order_by('-id').first()
+            antibiogram_data = parse_antibiogram(data)
+            organism = Organism.objects.filter(name=antibiogram_data['organism_name']).order_by('-id').first()
 
             if not organism:
                 return Response({"error": "Organism not found."}, status=400)
 
-            antibiogram = Antibiogram.objects.create(
-                organism=organism,
-                created_at=observed_at
-            )
-
-            count = 0
-            for comp in data.get('component', []):
-                antibiotic = comp['code']['coding'][0]['display']
-                result = comp.get('valueCodeableConcept', {}).get('text')
+            with transaction.atomic():
+                antibiogram = Antibiogram.objects.create(
+                    organism=organism,
+                    created_at=antibiogram_data['observed_at']
+                )
 
-                if antibiotic and result:
-                    AntibioticSusceptibility.objects.create(
-                        antibiogram=antibiogram,
-                        antibiotic=antibiotic,
-                        result=result
-                    )
-                    count += 1
-
-            if count == 0:
-                return Response({"error": "No valid components."}, status=400)
+                for susceptibility in antibiogram_data['susceptibilities']:
+                    AntibioticSusceptibility.objects.create(antibiogram=antibiogram, **susceptibility)
 
+            count = len(antibiogram_data['susceptibilities'])
             return Response({"status": f"{count} antibiogram entries recorded"}, status=201)
 
         except Exception as e:
@@ -175,46 +156,15 @@ class FHIRVitalsIngestionView(APIView):
     def post(self, request):
         try:
             data = request.data
-            patient_id = data.get('subject', {}).get('reference', '').split('/')[-1]
-            patient = Patient.objects.get(patient_id=patient_id)
-
-            episode = SepsisEpisode.objects.filter(patient=patient).order_by('-started_at').first()
-            if not episode:
+            _, episode_id = resolve_episode(patient_reference(data))
+            if not episode_id:
                 return Response({"error": "No active episode."}, status=400)
 
-            observed_at = parse_datetime(data.get('effectiveDateTime'))
-
-            components = data.get('component', [])
-            vitals = {}
-
-            for comp in components:
-                code = comp['code']['coding'][0]['code']
-                value = comp.get('valueQuantity', {}).get('value')
-
-                if value is None:
-                    continue
-
-                if code == '8480-6':
-                    vitals['blood_pressure_sys'] = value
-                elif code == '8462-4':
-                    vitals['blood_pressure_dia'] = value
-                elif code == '8867-4':
-                    vitals['heart_rate'] = value
-                elif code == '9279-1':
-                    vitals['respiratory_rate'] = value
-                elif code == '8310-5':
-                    vitals['temperature'] = value
-                elif code == '59408-5':
-                    vitals['oxygen_saturation'] = value
-
-            if not vitals:
-                return Response({"error": "No valid vitals."}, status=400)
-
-            VitalsObservation.objects.create(
-                episode=episode,
-                observed_at=observed_at,
-                **vitals
-            )
+            with transaction.atomic():
+                VitalsObservation.objects.create(
+                    episode_id=episode_id,
+                    **parse_vitals(data)
+                )
 
             return Response({"status": "vitals recorded"}, status=201)
 
@@ -226,23 +176,15 @@ class FHIRLabResultIngestionView(APIView):
     def post(self, request):
         try:
             data = request.data
-            patient_id = data.get('subject', {}).get('reference', '').split('/')[-1]
-            patient = Patient.objects.get(patient_id=patient_id)
-
-            episode = SepsisEpisode.objects.filter(patient=patient).order_by('-started_at').first()
-            if not episode:
+            _, episode_id = resolve_episode(patient_reference(data))
+            if not episode_id:
                 return Response({"error": "No active episode."}, status=400)
 
-            observed_at = parse_datetime(data.get('effectiveDateTime'))
-
-            LabResult.objects.create(
-                episode=episode,
-                exam_code=data['code']['coding'][0]['code'],
-                exam_name=data['code']['coding'][0]['display'],
-                value=data['valueQuantity']['value'],
-                unit=data['valueQuantity'].get('unit'),
-                observed_at=observed_at
-            )
+            with transaction.atomic():
+                LabResult.objects.create(
+                    episode_id=episode_id,
+                    **parse_lab_result(data)
+                )
 
             return Response({"status": "lab result recorded"}, status=201)
 
@@ -254,21 +196,15 @@ class FHIRAntibioticAdministrationIngestionView(APIView):
     def post(self, request):
         try:
             data = request.data
-            patient_id = data.get('subject', {}).get('reference', '').split('/')[-1]
-            patient = Patient.objects.get(patient_id=patient_id)
-
-            episode = SepsisEpisode.objects.filter(patient=patient).order_by('-started_at').first()
-            if not episode:
+            _, episode_id = resolve_episode(patient_reference(data))
+            if not episode_id:
                 return Response({"error": "No active episode."}, status=400)
 
-            AntibioticAdministration.objects.create(
-                episode=episode,
-                name=data.get('medicationCodeableConcept', {}).get('text'),
-                started_at=parse_datetime(data.get('effectivePeriod', {}).get('start')),
-                stopped_at=parse_datetime(data.get('effectivePeriod', {}).get('end')),
-                dose=data.get('dosage', [{}])[0].get('text'),
-                route=data.get('route', {}).get('text')
-            )
+            with transaction.atomic():
+                AntibioticAdministration.objects.create(
+                    episode_id=episode_id,
+                    **parse_antibiotic_administration(data)
+                )
 
             return Response({"status": "antibiotic administration recorded"}, status=201)
 
@@ -280,21 +216,41 @@ class FHIRClinicalNoteIngestionView(APIView):
     def post(self, request):
         try:
             data = request.data
-            patient_id = data.get('subject', {}).get('reference', '').split('/')[-1]
-            patient = Patient.objects.get(patient_id=patient_id)
-
-            episode = SepsisEpisode.objects.filter(patient=patient).order_by('-started_at').first()
-            if not episode:
+            _, episode_id = resolve_episode(patient_reference(data))
+            if not episode_id:
                 return Response({"error": "No active episode."}, status=400)
 
-            ClinicalNote.objects.create(
-                episode=episode,
-                author=data.get('author', {}).get('display'),
-                content=data.get('content', [{}])[0].get('text', {}).get('div'),
-                created_at=parse_datetime(data.get('date'))
-            )
+            with transaction.atomic():
+                ClinicalNote.objects.create(
+                    episode_id=episode_id,
+                    **parse_clinical_note(data)
+                )
 
             return Response({"status": "note recorded"}, status=201)
 
         except Exception as e:
             return Response({"error": str(e)}, status=400)
+
+
+class FHIRBundleIngestionView(APIView):
+    """
+    Accepts a FHIR Bundle of type `batch` or `transaction` mixing Patient, Encounter, Observation,
+    MedicationAdministration and DocumentReference entries, and answers with the
+    matching `batch-response` / `transaction-response` Bundle.
+    """
+
+    def post(self, request):
+        try:
+            response_bundle = BundleIngestion(request.data).run()
+            return Response(response_bundle, status=200)
+
+        except BundleError as e:
+            return Response(operation_outcome(e.issues), status=400)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class EpisodeResolverStatsView(APIView):
+    def get(self, request):
+        return Response(get_episode_resolver().stats(), status=200)
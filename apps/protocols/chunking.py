@@ -1,7 +1,176 @@
+import bisect
+import re
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+
+from apps.embeddings.model_registry import get_tokenizer
+
+
+def iter_chunks(pages, size: int = 300, overlap: int = 50):
+    """
+    Chunks of `size` words overlapping by `overlap`, yielded while the pages
+    are still coming in. Same chunks as split_into_chunks over the joined text.
+    """
+    step = size - overlap
+    window = []  # words from the start of the next chunk on
+    for page in pages:
+        window.extend(page.split())
+        while len(window) >= size:
+            yield " ".join(window[:size])
+            del window[:step]
+    for i in range(0, len(window), step):
+        yield " ".join(window[i:i + size])
+
+
 def split_into_chunks(text: str, size: int = 300, overlap: int = 50):
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), size - overlap):
-        chunk = " ".join(words[i:i + size])
-        chunks.append(chunk)
-    return chunks
+    return list(iter_chunks([text], size=size, overlap=overlap))
+
+
+# Token-aware chunking for the embedding model. Lengths are measured in model
+# tokens: BioBERT truncates anything past its window, so word counts either waste
+# encode time on text that is dropped or cut chunks mid-thought.
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?;])\s+(?=\S)|\s*•\s*")
+LINE = re.compile(r"[^\n]+")
+HEADING = re.compile(r"^(?:\d+(?:\.\d+)*\.?\s+[A-ZÀ-Ý]|ANEXO\b|[^a-zà-ÿ]{4,}$)")
+HEADING_MAX_WORDS = 12
+
+
+def _spans(text: str, pattern, start: int, end: int) -> list[tuple[int, int]]:
+    """Non-blank pieces of text[start:end] between matches of `pattern`."""
+    spans, position = [], start
+    for match in pattern.finditer(text, start, end):
+        spans.append((position, match.start()))
+        position = match.end()
+    spans.append((position, end))
+    return [(a, b) for a, b in spans if text[a:b].strip()]
+
+
+def _is_heading(line: str) -> bool:
+    line = " ".join(line.split())
+    return bool(line) and len(line.split()) <= HEADING_MAX_WORDS and bool(HEADING.match(line))
+
+
+def _units(text: str) -> list[tuple[int, int, bool]]:
+    """(start, end, is_heading): heading lines, and the sentences of the text between them."""
+    units = []
+    for start, end in _spans(text, PARAGRAPH_BREAK, 0, len(text)):
+        run_start = start
+        for line in LINE.finditer(text, start, end):
+            if _is_heading(line.group()):
+                units.extend((a, b, False) for a, b in _spans(text, SENTENCE_BREAK, run_start, line.start()))
+                units.append((line.start(), line.end(), True))
+                run_start = line.end()
+        units.extend((a, b, False) for a, b in _spans(text, SENTENCE_BREAK, run_start, end))
+    return units
+
+
+def _chunk_span(text: str, base: int, page_offsets: list[int], tokenizer, max_tokens: int,
+                overlap_tokens: int, min_section_tokens: int):
+    if not text.strip():
+        return
+    # One tokenizer call for the whole span; unit lengths come from the token offsets.
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    token_starts = np.fromiter((start for start, _ in offsets), dtype=np.int64, count=len(offsets))
+    units = _units(text)
+    # Units run up to the next one, so separators (bullets, punctuation) are counted too.
+    starts = np.array([start for start, _, _ in units], dtype=np.int64)
+    ends = np.append(starts[1:], units[-1][1])
+    firsts = np.searchsorted(token_starts, starts)
+    counts = np.searchsorted(token_starts, ends) - firsts
+
+    pieces = []  # (start, end, tokens, is_heading)
+    for (start, _, heading), end, first, count in zip(units, ends.tolist(), firsts.tolist(), counts.tolist()):
+        if count <= max_tokens:
+            pieces.append((start, end, count, heading))
+            continue
+        # Over-long sentence (tables, lists without punctuation): split at word starts.
+        i, last = first, first + count
+        while i < last:
+            j = min(i + max_tokens, last)
+            if j < last:
+                word_start = next((k for k in range(j, i, -1) if offsets[k][0] > offsets[k - 1][1]), j)
+                j = word_start
+            pieces.append((start if i == first else offsets[i][0], end if j == last else offsets[j][0],
+                           j - i, heading and i == first))
+            i = j
+
+    def emit(group):
+        start, end = group[0][0], group[-1][1]
+        return {
+            "text": " ".join(text[start:end].split()),
+            "start": base + start,
+            "end": base + end,
+            "page": max(bisect.bisect_right(page_offsets, base + start), 1),
+            "page_end": max(bisect.bisect_right(page_offsets, base + end - 1), 1),
+            "tokens": sum(piece[2] for piece in group),
+        }
+
+    current, current_tokens = [], 0
+    for piece in pieces:
+        if piece[3] and current_tokens >= min_section_tokens:
+            # A new section starts a new chunk, without overlap from the previous section.
+            yield emit(current)
+            current, current_tokens = [], 0
+        elif current and current_tokens + piece[2] > max_tokens:
+            yield emit(current)
+            carried, carried_tokens = [], 0
+            for previous in reversed(current[1:]):
+                if carried_tokens + previous[2] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            if carried_tokens + piece[2] > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append(piece)
+        current_tokens += piece[2]
+    if current:
+        yield emit(current)
+
+
+def iter_token_chunks(pages, tokenizer=None, max_tokens: int = None, overlap_tokens: int = None,
+                      min_section_tokens: int = 64, pages_per_pass: int = 8):
+    """
+    Chunks of at most `max_tokens` model tokens (PROTOCOL_CHUNK_MAX_TOKENS, capped
+    by the model window) as dicts with `text`, character offsets `start`/`end` in
+    the joined text, 1-based `page`/`page_end` and `tokens`. Chunks break at
+    headings, then paragraphs and sentences; consecutive chunks of a section
+    overlap by up to `overlap_tokens` whole sentences.
+
+    Pages are consumed as they come: every `pages_per_pass` pages, the text up to
+    the last paragraph break is chunked, so embedding starts before extraction ends.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    window = tokenizer.model_max_length - tokenizer.num_special_tokens_to_add()
+    max_tokens = min(max_tokens or settings.PROTOCOL_CHUNK_MAX_TOKENS, window)
+    overlap_tokens = settings.PROTOCOL_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    chunk = partial(_chunk_span, tokenizer=tokenizer, max_tokens=max_tokens, overlap_tokens=overlap_tokens,
+                    min_section_tokens=min_section_tokens)
+
+    buffer, base, page_offsets, pending_pages = "", 0, [], 0
+    for page in pages:
+        if page_offsets:
+            buffer += "\n"
+        page_offsets.append(base + len(buffer))
+        buffer += page
+        pending_pages += 1
+        if pending_pages < pages_per_pass:
+            continue
+
+        breaks = list(PARAGRAPH_BREAK.finditer(buffer))
+        if breaks:
+            cut = breaks[-1].end()
+            yield from chunk(buffer[:cut], base, page_offsets)
+            buffer, base, pending_pages = buffer[cut:], base + cut, 0
+    yield from chunk(buffer, base, page_offsets)
+
+
+def chunk_document(text: str, page_offsets: list[int] = None, **options) -> list[dict]:
+    """iter_token_chunks over an already extracted text (ExtractedText.text / page_offsets)."""
+    page_offsets = page_offsets or [0]
+    ends = [offset - 1 for offset in page_offsets[1:]] + [len(text)]
+    return list(iter_token_chunks((text[a:b] for a, b in zip(page_offsets, ends)), **options))
@@ -0,0 +1,57 @@
+import hashlib
+
+from apps.agent.models import DocumentChunk
+from apps.embeddings.embedding_cache import normalize_text
+
+from .chunking import chunk_document
+from .document_text import get_extracted_text
+from .models import KnowledgeDocument
+
+POSITION_FIELDS = ("start", "end", "page", "page_end", "tokens")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def iter_document_chunks(document: KnowledgeDocument, chunks):
+    """
+    Store `chunks` (chunk dicts from .chunking) as the DocumentChunk rows of
+    `document` and yield the rows in order, as they are stored. A row whose
+    text is unchanged is kept along with its tags, tag-extraction state and
+    embedding; rows whose text is gone are deleted once the last chunk is out.
+    Repeated chunk texts are stored once.
+    """
+    existing = {row.content_hash: row for row in document.chunks.filter(content_hash__isnull=False)}
+    seen = set()
+
+    for chunk in chunks:
+        content_hash = chunk_hash(chunk["text"])
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+
+        fields = {"chunk_index": len(seen) - 1, "text": chunk["text"], **{key: chunk[key] for key in POSITION_FIELDS}}
+        row = existing.get(content_hash)
+        if row is None:
+            row = DocumentChunk.objects.create(document=document, content_hash=content_hash, **fields)
+        elif any(getattr(row, key) != value for key, value in fields.items()):
+            for key, value in fields.items():
+                setattr(row, key, value)
+            row.save(update_fields=[*fields, "updated_at"])
+        yield row
+
+    # Also drops rows stored before chunks had a content hash.
+    document.chunks.exclude(content_hash__in=seen).delete()
+
+
+def get_document_chunks(document: KnowledgeDocument):
+    """
+    The DocumentChunk rows of `document`, chunking its extracted text only
+    when no stage has done it yet.
+    """
+    if not document.chunks.filter(content_hash__isnull=False).exists():
+        artifact = get_extracted_text(document)
+        for _ in iter_document_chunks(document, chunk_document(artifact.text, artifact.page_offsets)):
+            pass
+    return document.chunks.all()
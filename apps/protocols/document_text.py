@@ -0,0 +1,52 @@
+from .minio_utils import downloaded_from_minio
+from .models import ExtractedText, KnowledgeDocument
+from .pdf_extraction import iter_pages
+
+
+def iter_document_pages(document: KnowledgeDocument):
+    """
+    Pages of `document` as they become available: from its stored text when
+    some stage already extracted it, otherwise extracted while they are
+    yielded and stored as its ExtractedText once the last page is out.
+    """
+    if document.extracted_text_id:
+        yield from document.extracted_text.pages()
+        return
+
+    with downloaded_from_minio(bucket="protocols", filename=document.minio_path) as (pdf_path, content_hash):
+        artifact = ExtractedText.objects.filter(content_hash=content_hash).first()
+        if artifact is not None:
+            yield from artifact.pages()
+        else:
+            pages = []
+            for page in iter_pages(pdf_path):
+                pages.append(page)
+                yield page
+            artifact = _store(content_hash, pages)
+            print(f"📄 Extracted {len(pages)} pages from {document.minio_path}")
+
+    document.extracted_text = artifact
+    document.save(update_fields=["extracted_text"])
+
+
+def _store(content_hash: str, pages: list[str]) -> ExtractedText:
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 1  # pages are joined with "\n"
+    artifact, _ = ExtractedText.objects.get_or_create(
+        content_hash=content_hash,
+        defaults={"text": "\n".join(pages), "page_offsets": offsets},
+    )
+    return artifact
+
+
+def get_extracted_text(document: KnowledgeDocument) -> ExtractedText:
+    """
+    The extracted text of `document`, downloading and extracting its PDF only
+    when no stage has done it yet for this content.
+    """
+    if not document.extracted_text_id:
+        for _ in iter_document_pages(document):
+            pass
+    return document.extracted_text
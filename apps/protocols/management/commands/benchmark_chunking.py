@@ -0,0 +1,53 @@
+import glob
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.embeddings.model_registry import BIOBERT_MODEL, get_tokenizer
+from apps.protocols.chunking import iter_token_chunks, split_into_chunks
+from apps.protocols.pdf_extraction import extract_pages
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the word-count chunker with the token-aware chunker on sample_protocols/: "
+        "chunks/sec, chunk sizes in model tokens and the fraction of tokens the model truncates"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=os.path.join(settings.BASE_DIR, 'sample_protocols'),
+                            help='Directory with protocol PDFs')
+        parser.add_argument('--model', default=BIOBERT_MODEL, help='Model whose tokenizer and window to measure')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per chunker')
+
+    def handle(self, *args, **options):
+        pdfs = sorted(glob.glob(os.path.join(options['path'], '*.pdf')))
+        if not pdfs:
+            raise CommandError(f"No PDFs found in {options['path']}")
+
+        documents = [extract_pages(pdf) for pdf in pdfs]
+        tokenizer = get_tokenizer(options['model'])
+        window = tokenizer.model_max_length - tokenizer.num_special_tokens_to_add()
+        self.stdout.write(f"📊 {len(pdfs)} PDFs, {sum(map(len, documents))} pages, model window {window} tokens")
+
+        chunkers = {
+            "words": lambda pages: split_into_chunks("\n".join(pages)),
+            "tokens": lambda pages: [chunk["text"] for chunk in iter_token_chunks(pages, tokenizer=tokenizer)],
+        }
+        for name, chunker in chunkers.items():
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                chunks = [chunk for pages in documents for chunk in chunker(pages)]
+            elapsed = (time.perf_counter() - started) / options['repeat']
+
+            encoded = tokenizer(chunks, add_special_tokens=False, verbose=False)["input_ids"]
+            lengths = np.array([len(ids) for ids in encoded])
+            truncated = np.maximum(lengths - window, 0).sum() / lengths.sum()
+            self.stdout.write(
+                f"⚡ {name:<6} {len(chunks):>5} chunks  {len(chunks) / elapsed:>8.0f} chunks/s  "
+                f"tokens mean {lengths.mean():.0f} max {lengths.max()}  "
+                f"over window {(lengths > window).mean():.1%}  truncated tokens {truncated:.1%}"
+            )
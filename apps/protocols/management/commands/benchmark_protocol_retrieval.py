@@ -0,0 +1,103 @@
+import glob
+import os
+import unicodedata
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from apps.embeddings.embedding_client import encode
+from apps.protocols.chunking import iter_token_chunks
+from apps.protocols.pdf_extraction import iter_pages
+from apps.qdrant.qdrant_utils import VECTOR_SIZE
+from apps.qdrant.sparse import SPARSE_VECTOR_NAME, document_vector, query_vector
+from apps.qdrant.vector_store import NumpyStore, QdrantStore
+
+COLLECTION_NAME = "bench-protocol-retrieval"
+
+# Query → phrases a chunk must contain (accent- and case-insensitive) to count as relevant.
+# Written against sample_protocols/protocolo-sepse_hujbb-1.pdf.
+QUERIES = [
+    ("dose de hidrocortisona no choque séptico", ["hidrocortisona", "200 mg"]),
+    ("volume de cristaloide na reposição volêmica inicial", ["30 ml/kg"]),
+    ("lactato ≥ 2 mmol/L como disfunção orgânica", ["lactato", "2mmol/l"]),
+    ("antimicrobiano para neutropenia grave", ["neutropenia grave", "cefepime"]),
+    ("tratamento empírico da meningite", ["meningite", "ceftriaxona"]),
+    ("exames laboratoriais do kit sepse", ["kit sepse", "gasometria"]),
+    ("vasopressina quando noradrenalina acima de 0,5 mcg/kg/min", ["vasopressina", "0.5 mcg/kg/min"]),
+    ("prazo para administrar o antimicrobiano após o diagnóstico", ["1 hora"]),
+    ("antibiótico para pé diabético", ["pe diabetico"]),
+    ("PAM alvo acima de 65 mmHg com vasopressor", ["65 mmhg", "vasopress"]),
+    ("coleta do segundo lactato", ["2º lactato"]),
+    ("uso de albumina após grandes volumes de cristaloides", ["albumina", "cristaloides"]),
+    ("hemoculturas antes do antibiótico", ["hemocultura"]),
+    ("critérios SIRS temperatura frequência cardíaca leucócitos", ["leucocit", "frequencia cardiaca"]),
+]
+
+
+def _normalize(text: str) -> str:
+    stripped = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
+class Command(BaseCommand):
+    help = (
+        "Index the PDFs in sample_protocols/ into a throwaway collection and report precision@k "
+        "and hit rate@k of dense, BM25 and hybrid (RRF) retrieval on a fixed set of clinical queries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=os.path.join(settings.BASE_DIR, 'sample_protocols'),
+                            help='Directory with protocol PDFs')
+        parser.add_argument('--k', type=int, nargs='+', default=[3, 5, 10])
+        parser.add_argument('--store', choices=['qdrant-local', 'numpy'], default='qdrant-local')
+
+    def handle(self, *args, **options):
+        pdfs = sorted(glob.glob(os.path.join(options['path'], '*.pdf')))
+        if not pdfs:
+            raise CommandError(f"No PDFs found in {options['path']}")
+
+        chunks = [chunk["text"] for pdf in pdfs for chunk in iter_token_chunks(iter_pages(pdf))]
+        store = QdrantStore(QdrantClient(":memory:")) if options['store'] == 'qdrant-local' else NumpyStore()
+        self._index(store, chunks)
+        self.stdout.write(f"📊 {len(chunks)} chunks from {len(pdfs)} PDFs, {len(QUERIES)} queries")
+
+        normalized = [_normalize(chunk) for chunk in chunks]
+        relevant = [
+            {i for i, text in enumerate(normalized) if all(_normalize(p) in text for p in phrases)}
+            for _, phrases in QUERIES
+        ]
+        vectors = encode([query for query, _ in QUERIES], normalize_embeddings=True)
+        max_k = max(options['k'])
+
+        retrievers = {
+            "dense": lambda query, vector: store.search(COLLECTION_NAME, vector, limit=max_k),
+            "bm25": lambda query, vector: store.search_sparse(
+                COLLECTION_NAME, SPARSE_VECTOR_NAME, query_vector(query), limit=max_k),
+            "hybrid": lambda query, vector: store.hybrid_search(
+                COLLECTION_NAME, vector, SPARSE_VECTOR_NAME, query_vector(query), limit=max_k),
+        }
+        for name, retrieve in retrievers.items():
+            ranked = [
+                [point.id for point in retrieve(query, vector)]
+                for (query, _), vector in zip(QUERIES, vectors)
+            ]
+            scores = []
+            for k in options['k']:
+                precision = sum(len(set(ids[:k]) & rel) / k for ids, rel in zip(ranked, relevant)) / len(QUERIES)
+                hit_rate = sum(bool(set(ids[:k]) & rel) for ids, rel in zip(ranked, relevant)) / len(QUERIES)
+                scores.append(f"P@{k} {precision:.3f} hit@{k} {hit_rate:.2f}")
+            self.stdout.write(f"⚡ {name:<6} " + "  ".join(scores))
+
+    def _index(self, store, chunks: list[str]):
+        store.create_collection(COLLECTION_NAME, size=VECTOR_SIZE, sparse_vectors=(SPARSE_VECTOR_NAME,))
+        embeddings = encode(chunks, normalize_embeddings=True)
+        store.upsert(COLLECTION_NAME, [
+            models.PointStruct(
+                id=i,
+                vector={"": embedding.tolist(), SPARSE_VECTOR_NAME: document_vector(chunk)},
+                payload={"text": chunk},
+            )
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+        ])
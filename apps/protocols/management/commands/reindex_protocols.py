@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from apps.protocols.chunking import chunk_document
+from apps.protocols.document_chunks import iter_document_chunks
+from apps.protocols.document_text import get_extracted_text
+from apps.protocols.models import KnowledgeDocument
+from apps.qdrant.qdrant_utils import COLLECTION_NAME, embed_and_store_chunks
+from apps.qdrant.sparse import SPARSE_VECTOR_NAME
+from apps.qdrant.vector_store import get_vector_store
+
+
+class Command(BaseCommand):
+    help = (
+        f"Re-index every uploaded protocol into '{COLLECTION_NAME}' from its extracted text; PDFs are only "
+        "downloaded when never extracted. Only changed chunks are embedded; the collection is rebuilt from "
+        "scratch with --drop or when it predates hybrid search. Chunk rows are re-chunked in place: tags of "
+        "unchanged chunks are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drop', action='store_true', help='Drop the collection before re-indexing')
+
+    def handle(self, *args, **options):
+        store = get_vector_store()
+        if store.collection_exists(COLLECTION_NAME) and (
+            options['drop'] or SPARSE_VECTOR_NAME not in store.sparse_vector_names(COLLECTION_NAME)
+        ):
+            store.delete_collection(COLLECTION_NAME)
+            self.stdout.write(f"🗑️ Dropped '{COLLECTION_NAME}'")
+
+        # Oldest upload first, so each protocol ends up indexed at its latest version.
+        documents = KnowledgeDocument.objects.select_related("extracted_text").order_by("pk")
+        for document in documents:
+            artifact = get_extracted_text(document)
+            chunks = iter_document_chunks(document, chunk_document(artifact.text, artifact.page_offsets))
+            counts = embed_and_store_chunks(
+                chunks,
+                document=document,
+                metadata_base={"source": document.minio_path, "source_version": document.version}
+            )
+            self.stdout.write(
+                f"📄 {document.minio_path}: {counts['new']} embedded, {counts['unchanged']} unchanged, "
+                f"{counts['removed']} removed"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Re-indexed {documents.count()} protocols"))
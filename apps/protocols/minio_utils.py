@@ -1,7 +1,14 @@
+import hashlib
+import os
+from contextlib import contextmanager
 from minio import Minio
 from tempfile import NamedTemporaryFile
 from datetime import timedelta
 
+from .timings import stage
+
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+
 client = Minio(
     "minio:9000",
     access_key="minioadmin",
@@ -20,12 +27,41 @@ def upload_to_minio(bucket: str, filename: str, file_obj):
     )
 
 
-def download_from_minio(bucket: str, filename: str) -> str:
-    response = client.get_object(bucket, filename)
+@contextmanager
+def downloaded_from_minio(bucket: str, filename: str):
+    """
+    Stream an object to a temporary file and yield `(path, sha256 of the
+    content)`. The file is removed when the block exits.
+    """
+    digest = hashlib.sha256()
     tmp = NamedTemporaryFile(delete=False, suffix=".pdf")
-    tmp.write(response.read())
-    tmp.close()
-    return tmp.name
+    try:
+        with stage("download"):
+            response = client.get_object(bucket, filename)
+            try:
+                for block in response.stream(DOWNLOAD_BLOCK_SIZE):
+                    digest.update(block)
+                    tmp.write(block)
+            finally:
+                response.close()
+                response.release_conn()
+            tmp.close()
+        yield tmp.name, digest.hexdigest()
+    finally:
+        tmp.close()
+        os.remove(tmp.name)
+
+
+def protocol_document_key(filename: str) -> str:
+    """
+    Version-independent name of an uploaded protocol. Objects are named
+    "<category>__<version>__<file name>"; the key drops the version.
+    """
+    parts = filename.rsplit("/", 1)[-1].split("__", 2)
+    if len(parts) < 3:
+        return filename
+    category, _version, name = parts
+    return f"{category}__{name}"
 
 
 def list_documents_in_minio(bucket="protocols"):
@@ -1,6 +1,32 @@
+import bisect
+
 from django.db import models
 
 
+class ExtractedText(models.Model):
+    """
+    Text of a protocol PDF, extracted once and read by every later stage (vector
+    chunking, tag extraction, re-indexing). Keyed by the SHA-256 of the PDF bytes,
+    so re-uploading an identical file reuses it.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+    page_offsets = models.JSONField(default=list)  # offset in `text` where each page starts
+    extracted_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_offsets)
+
+    def pages(self) -> list[str]:
+        ends = [offset - 1 for offset in self.page_offsets[1:]] + [len(self.text)]
+        return [self.text[start:end] for start, end in zip(self.page_offsets, ends)]
+
+    def page_at(self, offset: int) -> int:
+        """1-based page number of the character at `offset`."""
+        return max(bisect.bisect_right(self.page_offsets, offset), 1)
+
+
 class KnowledgeDocument(models.Model):
     CATEGORY_CHOICES = [
         ("infection_protocol", "Infection Protocol"),
@@ -15,3 +41,6 @@ class KnowledgeDocument(models.Model):
     version = models.CharField(max_length=50)
     minio_path = models.CharField(max_length=255, unique=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    extracted_text = models.ForeignKey(
+        ExtractedText, null=True, blank=True, on_delete=models.SET_NULL, related_name="documents"
+    )
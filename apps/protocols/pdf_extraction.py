@@ -1,6 +1,58 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import fitz  # PyMuPDF
+from django.conf import settings
+
+from .timings import stage
+
+# Kept free of model imports: spawned extraction workers import this module
+# before Django's app registry exists.
+
+
+def _extract_range(filepath: str, start: int, stop: int) -> list[str]:
+    # Each worker opens its own document; PyMuPDF handles are not shared across processes.
+    with fitz.open(filepath) as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+
+def iter_pages(filepath: str, workers: int = None, pages_per_task: int = None):
+    """
+    Yield the text of each page, in order. Large PDFs are split into page
+    ranges extracted by a process pool; pages are yielded as soon as their
+    range is done, so callers can start chunking before extraction finishes.
+    """
+    workers = workers or settings.PDF_EXTRACTION_WORKERS
+    pages_per_task = pages_per_task or settings.PDF_EXTRACTION_PAGES_PER_TASK
+
+    with fitz.open(filepath) as doc:
+        page_count = doc.page_count
+        # Small files, single worker, or inside a daemonic process (which cannot have children).
+        if workers <= 1 or page_count < 2 * pages_per_task or multiprocessing.current_process().daemon:
+            for page in doc:
+                with stage("extract"):
+                    text = page.get_text()
+                yield text
+            return
+
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    executor = ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)), mp_context=multiprocessing.get_context("spawn")
+    )
+    try:
+        futures = [executor.submit(_extract_range, filepath, start, stop) for start, stop in ranges]
+        for future in futures:
+            with stage("extract"):
+                pages = future.result()
+            yield from pages
+    finally:
+        # Also reached when the caller stops early: drop the ranges nobody will read.
+        executor.shutdown(cancel_futures=True)
+
+
+def extract_pages(filepath: str) -> list[str]:
+    return list(iter_pages(filepath))
 
 
 def extract_text_from_pdf(filepath: str) -> str:
-    doc = fitz.open(filepath)
-    return "\n".join(page.get_text() for page in doc)
+    return "\n".join(iter_pages(filepath))
@@ -1,42 +1,33 @@
 from celery import shared_task
 
 from apps.agent.agents.tag_generator import TagGenerationAgent
-from apps.protocols.tag_generation import create_tags_from_document
-from .minio_utils import download_from_minio
-from .pdf_extraction import extract_text_from_pdf
-from .chunking import split_into_chunks
-from apps.qdrant.qdrant_utils import (
-    embed_and_store_chunks,
-    COLLECTION_NAME,
-    client as qdrant_client,
-)
-from qdrant_client.models import VectorParams, Distance
+from .document_chunks import iter_document_chunks
+from .document_text import iter_document_pages
+from .models import KnowledgeDocument
+from .chunking import iter_token_chunks
+from .timings import format_timings, record_timings
+from apps.qdrant.qdrant_utils import embed_and_store_chunks
 
 
 @shared_task
 def process_uploaded_protocol(filename: str, version: str = "v1"):
-    # ✅ Criação segura da coleção se ela não existir
-    if not qdrant_client.collection_exists(COLLECTION_NAME):
-        qdrant_client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(
-                size=768,
-                distance=Distance.COSINE
-            )
+    # 🧾 Extrai o texto do PDF uma única vez; as etapas seguintes leem o texto salvo.
+    # As páginas são processadas à medida que saem da extração: os trechos já são
+    # vetorizados enquanto o restante do PDF ainda está sendo lido.
+    # (embed_and_store_chunks cria a coleção com o perfil configurado)
+    document = KnowledgeDocument.objects.get(minio_path=filename)
+    with record_timings() as timings:
+        # 🧩 Os trechos viram linhas de DocumentChunk, usadas tanto pelo Qdrant quanto pelas tags
+        # 📤 Envia ao Qdrant só os trechos novos; os inalterados da versão anterior são reaproveitados
+        embed_and_store_chunks(
+            iter_document_chunks(document, iter_token_chunks(iter_document_pages(document))),
+            document=document,
+            metadata_base={"source": filename, "source_version": version}
         )
-
-    # 🧾 Baixa o PDF e processa
-    pdf_path = download_from_minio(bucket="protocols", filename=filename)
-    full_text = extract_text_from_pdf(pdf_path)
-    chunks = split_into_chunks(full_text)
-
-    # 📤 Envia embeddings ao Qdrant
-    embed_and_store_chunks(
-        chunks,
-        metadata_base={"source": filename, "source_version": version}
-    )
+    print(f"⏱️ {filename}: {format_timings(timings)}")
 
     create_tags_from_document_task.delay(filename=filename, version=version)
+    return dict(timings)
 
 
 @shared_task
@@ -45,12 +36,8 @@ def create_tags_from_document_task(filename: str, version: str = "v1"):
     Celery task to process a protocol document and extract clinical tags via LLM.
     """
     try:
-        pdf_path = download_from_minio(bucket="protocols", filename=filename)
-        full_text = extract_text_from_pdf(pdf_path)
-
         agent = TagGenerationAgent()
         agent.run({
-            "document_text": full_text,
             "filename": filename,
             "version": version,
         })
@@ -1,3 +1,123 @@
+import os
+import re
+from unittest import mock
+
+from django.conf import settings
 from django.test import TestCase
 
-# Create your tests here.
+from apps.agent.models import DocumentChunk
+from apps.protocols.chunking import chunk_document
+from apps.protocols.document_chunks import get_document_chunks, iter_document_chunks
+from apps.protocols.document_text import get_extracted_text
+from apps.protocols.models import ExtractedText, KnowledgeDocument
+from apps.protocols.pdf_extraction import iter_pages
+from apps.protocols.timings import record_timings
+
+SAMPLE_PDF = os.path.join(settings.BASE_DIR, "sample_protocols", "protocolo-sepse_hujbb-1.pdf")
+
+
+class ExtractedTextTests(TestCase):
+    def setUp(self):
+        with open(SAMPLE_PDF, "rb") as f:
+            self.pdf = f.read()
+        self.downloads = []
+
+    def _get_object(self, bucket, filename):
+        self.downloads.append(filename)
+        return mock.Mock(stream=mock.Mock(return_value=iter([self.pdf[:4096], self.pdf[4096:]])))
+
+    def _document(self, version):
+        return KnowledgeDocument.objects.create(
+            name="sepse.pdf", category="infection_protocol", version=version,
+            minio_path=f"infection_protocol__{version}__sepse.pdf",
+        )
+
+    def test_pdf_is_extracted_once_per_content(self):
+        v1, v2 = self._document("v1"), self._document("v2")
+
+        with mock.patch("apps.protocols.minio_utils.client.get_object", side_effect=self._get_object), \
+                mock.patch("apps.protocols.document_text.iter_pages", wraps=iter_pages) as extract, \
+                mock.patch("apps.protocols.minio_utils.os.remove", wraps=os.remove) as remove:
+            artifact = get_extracted_text(v1)
+            self.assertEqual(get_extracted_text(KnowledgeDocument.objects.get(pk=v1.pk)), artifact)
+            self.assertEqual(get_extracted_text(v2), artifact)  # same bytes, new upload
+
+        self.assertEqual(self.downloads, [v1.minio_path, v2.minio_path])
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(remove.call_count, 2)
+        self.assertFalse(any(os.path.exists(call.args[0]) for call in remove.call_args_list))
+        self.assertEqual(ExtractedText.objects.count(), 1)
+
+        self.assertEqual(artifact.page_count, 25)
+        second_page = artifact.page_offsets[1]
+        self.assertEqual((artifact.page_at(0), artifact.page_at(second_page)), (1, 2))
+        self.assertIn("Página 2/26", artifact.text[second_page:artifact.page_offsets[2]])
+
+
+class PdfExtractionTests(TestCase):
+    def test_parallel_page_ranges_match_serial_extraction(self):
+        serial = list(iter_pages(SAMPLE_PDF, workers=1))
+        with record_timings() as timings:
+            parallel = list(iter_pages(SAMPLE_PDF, workers=2, pages_per_task=4))
+
+        self.assertEqual(len(serial), 25)
+        self.assertEqual(parallel, serial)
+        self.assertGreater(timings["extract"], 0)
+
+
+class _WhitespaceTokenizer:
+    """One token per whitespace-separated word, with the fast tokenizers' call signature."""
+    model_max_length = 512
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, verbose=True):
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+
+class TokenChunkerTests(TestCase):
+    TEXT = (
+        "1. INTRODUÇÃO\n \nSepse é disfunção orgânica causada por infecção. O tratamento precoce reduz a mortalidade.\n"
+        "2. TRATAMENTO\n \nIniciar antimicrobiano em até 1 hora. Coletar hemoculturas antes da primeira dose. "
+        "Reposição volêmica com 30 ml/kg de cristaloides."
+    )
+
+    def test_chunks_respect_token_bound_sections_and_offsets(self):
+        page_offsets = [0, self.TEXT.index("2. TRATAMENTO")]
+        chunks = chunk_document(self.TEXT, page_offsets, tokenizer=_WhitespaceTokenizer(), max_tokens=12,
+                                overlap_tokens=6, min_section_tokens=4)
+
+        self.assertTrue(all(chunk["tokens"] <= 12 for chunk in chunks))
+        self.assertEqual(chunks[0]["text"], "1. INTRODUÇÃO Sepse é disfunção orgânica causada por infecção.")
+        self.assertEqual(chunks[1]["text"], "O tratamento precoce reduz a mortalidade.")
+        self.assertEqual((chunks[2]["text"], chunks[2]["page"]),
+                         ("2. TRATAMENTO Iniciar antimicrobiano em até 1 hora.", 2))  # new section, no overlap
+        self.assertEqual(chunks[3]["text"],  # last sentence carried over within the section
+                         "Iniciar antimicrobiano em até 1 hora. Coletar hemoculturas antes da primeira dose.")
+        for chunk in chunks:
+            self.assertEqual(" ".join(self.TEXT[chunk["start"]:chunk["end"]].split()), chunk["text"])
+
+
+class DocumentChunkStoreTests(TestCase):
+    def test_rechunking_keeps_unchanged_rows_and_their_tag_state(self):
+        document = KnowledgeDocument.objects.create(
+            name="sepse.pdf", category="infection_protocol", version="v1",
+            minio_path="infection_protocol__v1__sepse.pdf",
+        )
+        legacy = DocumentChunk.objects.create(document=document, chunk_index=0, text="trecho antigo", processed=True)
+
+        def chunks(*texts):
+            return [{"text": text, "page": 1, "page_end": 1, "start": 0, "end": len(text), "tokens": 4}
+                    for text in texts]
+
+        first = list(iter_document_chunks(document, chunks("bundle de 1 hora", "lactato ≥ 2 mmol/L")))
+        DocumentChunk.objects.filter(pk=first[1].pk).update(processed=True, processing_attempts=1)
+
+        rows = list(iter_document_chunks(document, chunks("nova seção", "lactato ≥ 2 mmol/L", "nova seção")))
+
+        self.assertEqual([row.chunk_index for row in rows], [0, 1])  # repeated text stored once
+        self.assertEqual(rows[1].pk, first[1].pk)
+        self.assertTrue(rows[1].processed)
+        self.assertEqual(list(get_document_chunks(document)), rows)
+        self.assertFalse(DocumentChunk.objects.filter(pk__in=[legacy.pk, first[0].pk]).exists())
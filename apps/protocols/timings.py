@@ -0,0 +1,36 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds spent per pipeline stage. Stages overlap (embedding starts while pages
+# are still being extracted), so each one records only its own time.
+_timings = ContextVar("protocol_stage_timings", default=None)
+
+
+@contextmanager
+def record_timings():
+    timings = defaultdict(float)
+    token = _timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total"] = time.perf_counter() - started
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Add the block's duration to `name` when timings are being recorded."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] += time.perf_counter() - started
+
+
+def format_timings(timings: dict) -> str:
+    return " · ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
@@ -5,9 +5,9 @@ from rest_framework import status
 from rest_framework.generics import ListAPIView
 from django.shortcuts import get_object_or_404
 
-from apps.qdrant.qdrant_utils import delete_vectors_for_document
+from apps.qdrant.qdrant_utils import delete_vectors_for_document, search_chunks
 
-from .models import KnowledgeDocument
+from .models import ExtractedText, KnowledgeDocument
 from .serializers import KnowledgeDocumentSerializer
 from .minio_utils import (
     upload_to_minio,
@@ -16,8 +16,6 @@ from .minio_utils import (
 )
 from rest_framework.permissions import AllowAny
 from .tasks import process_uploaded_protocol
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 
 
@@ -64,17 +62,7 @@ class ProtocolSemanticSearchView(APIView):
         if not query:
             return Response({"error": "Campo 'query' é obrigatório."}, status=status.HTTP_400_BAD_REQUEST)
 
-        model = SentenceTransformer("pritamdeka/BioBERT-mnli-snli-scinli-scitail-mednli-stsb")
-        client = QdrantClient(host="qdrant", port=6333)
-
-        vector = model.encode(query, normalize_embeddings=True)
-
-        results = client.search(
-            collection_name="clinical_knowledge",
-            query_vector=vector,
-            limit=5,
-            with_payload=True
-        )
+        results = search_chunks(query, limit=5)
 
         return Response({
             "results": [
@@ -83,6 +71,8 @@ class ProtocolSemanticSearchView(APIView):
                     "text": r.payload.get("text"),
                     "source": r.payload.get("source"),
                     "version": r.payload.get("source_version"),
+                    "chunk_id": r.payload.get("chunk_id"),
+                    "page": r.payload.get("page"),
                 } for r in results
             ]
         })
@@ -107,8 +97,10 @@ class KnowledgeDocumentDeleteView(APIView):
         doc = get_object_or_404(KnowledgeDocument, pk=pk)
         try:
             delete_from_minio("protocols", doc.minio_path)
-            delete_vectors_for_document(doc.minio_path)  # ✅ Remove from Qdrant
+            delete_vectors_for_document(doc)  # ✅ Remove from Qdrant
+            extracted_text_id = doc.extracted_text_id
             doc.delete()
+            ExtractedText.objects.filter(pk=extracted_text_id, documents__isnull=True).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             print(e)
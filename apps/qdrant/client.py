@@ -1,7 +1,10 @@
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from functools import lru_cache
 
+from django.conf import settings
+from qdrant_client import QdrantClient
 
-qdrant = QdrantClient("qdrant", port=6333)
 
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+@lru_cache()
+def get_qdrant_client() -> QdrantClient:
+    # Created on first use: building the client contacts the server for its version.
+    return QdrantClient(settings.QDRANT_HOST, port=settings.QDRANT_PORT)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.qdrant.client import get_qdrant_client
+from apps.qdrant.profiles import COLLECTION_PROFILES, apply_profile, profile_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply a collection profile (HNSW, quantization, on-disk storage) to an existing Qdrant collection. "
+        "Without --profile, the one configured in QDRANT_COLLECTION_PROFILES is used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('collections', nargs='+')
+        parser.add_argument('--profile', choices=list(COLLECTION_PROFILES))
+
+    def handle(self, *args, **options):
+        qdrant = get_qdrant_client()
+        for collection_name in options['collections']:
+            if not qdrant.collection_exists(collection_name):
+                raise CommandError(f"Collection '{collection_name}' does not exist.")
+
+            profile_name = options['profile'] or profile_for(collection_name)
+            apply_profile(qdrant, collection_name, profile_name)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ '{collection_name}' moved to profile '{profile_name}' (indexes rebuild in the background)"
+            ))
@@ -0,0 +1,110 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client.http import models
+
+from apps.qdrant.client import get_qdrant_client
+from apps.qdrant.profiles import COLLECTION_PROFILES, create_collection, estimate_ram_bytes, search_params
+
+TOP_K = 10
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark collection profiles on vectors sampled from an existing collection: "
+        "recall@10 against exact search, p95 query latency and estimated RAM"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='clinical-data', help='Collection to sample vectors from')
+        parser.add_argument('--sample', type=int, default=20000, help='Vectors to index per profile')
+        parser.add_argument('--queries', type=int, default=200, help='Held-out vectors used as queries')
+        parser.add_argument('--profiles', nargs='+', default=list(COLLECTION_PROFILES),
+                            choices=list(COLLECTION_PROFILES))
+        parser.add_argument('--index-timeout', type=int, default=600, help='Seconds to wait for indexing')
+
+    def handle(self, *args, **options):
+        self.qdrant = get_qdrant_client()
+        vectors = self._sample(options['source'], options['sample'] + options['queries'])
+        if len(vectors) <= options['queries']:
+            raise CommandError(f"'{options['source']}' has too few points to benchmark.")
+
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries, corpus = vectors[:options['queries']], vectors[options['queries']:]
+        truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :TOP_K]
+        self.stdout.write(f"📊 {len(corpus)} vectors, {len(queries)} queries, dim {corpus.shape[1]}")
+
+        for profile_name in options['profiles']:
+            collection_name = f"bench-profile-{profile_name}"
+            try:
+                self._load(collection_name, profile_name, corpus, options['index_timeout'])
+                recall, p95 = self._measure(collection_name, profile_name, queries, truth)
+            finally:
+                self.qdrant.delete_collection(collection_name)
+
+            ram = estimate_ram_bytes(profile_name, len(corpus), corpus.shape[1])
+            self.stdout.write(
+                f"⚡ {profile_name:<9} recall@{TOP_K} {recall:.3f}  p95 {p95:6.2f} ms  "
+                f"est. RAM {ram / 1024 ** 2:.1f} MB (computed from the profile, not measured)"
+            )
+
+    def _sample(self, collection_name: str, limit: int) -> np.ndarray:
+        if not self.qdrant.collection_exists(collection_name):
+            raise CommandError(f"Collection '{collection_name}' does not exist.")
+
+        vectors, offset = [], None
+        while len(vectors) < limit:
+            points, offset = self.qdrant.scroll(
+                collection_name, limit=min(1000, limit - len(vectors)), offset=offset,
+                with_payload=False, with_vectors=True,
+            )
+            vectors.extend(_dense_vector(point.vector) for point in points)
+            if offset is None:
+                break
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _load(self, collection_name: str, profile_name: str, corpus: np.ndarray, timeout: int):
+        if self.qdrant.collection_exists(collection_name):
+            self.qdrant.delete_collection(collection_name)
+        create_collection(self.qdrant, collection_name, size=corpus.shape[1], profile_name=profile_name)
+        # Build the HNSW graph even when the sample is below Qdrant's default indexing threshold.
+        self.qdrant.update_collection(
+            collection_name, optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1)
+        )
+
+        for start in range(0, len(corpus), 1000):
+            self.qdrant.upsert(collection_name, points=models.Batch(
+                ids=list(range(start, min(start + 1000, len(corpus)))),
+                vectors=corpus[start:start + 1000].tolist(),
+            ))
+
+        # Measure the built index, not the brute-force scan used while it is being built.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            info = self.qdrant.get_collection(collection_name)
+            if info.status == models.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= len(corpus):
+                return
+            time.sleep(1)
+        self.stdout.write(f"⚠️ {collection_name} not fully indexed after {timeout}s, measuring anyway")
+
+    def _measure(self, collection_name: str, profile_name: str, queries: np.ndarray, truth: np.ndarray):
+        params = search_params(profile_name=profile_name)
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            points = self.qdrant.query_points(collection_name, query=query.tolist(), search_params=params,
+                                              limit=TOP_K).points
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len({point.id for point in points} & set(expected.tolist()))
+        return hits / truth.size, float(np.percentile(latencies, 95))
+
+
+def _dense_vector(vector):
+    # Collections with sparse vectors (clinical_knowledge: BioBERT under "" plus "bm25")
+    # return every vector by name; only the dense one is benchmarked.
+    if isinstance(vector, dict):
+        if "" in vector:
+            return vector[""]
+        return next(value for value in vector.values() if isinstance(value, list))
+    return vector
@@ -0,0 +1,114 @@
+from django.conf import settings
+from qdrant_client.http import models
+
+# Named collection tunings. Quantized profiles keep only the compressed vectors in
+# RAM (full vectors and payloads go to disk) and rescore the oversampled
+# candidates with the full vectors, trading a little latency for most of the RAM.
+COLLECTION_PROFILES = {
+    "default": {
+        "m": 16, "ef_construct": 100, "hnsw_ef": 128,
+        "quantization": None, "on_disk_vectors": False, "on_disk_payload": False,
+    },
+    "accurate": {
+        "m": 32, "ef_construct": 256, "hnsw_ef": 256,
+        "quantization": None, "on_disk_vectors": False, "on_disk_payload": False,
+    },
+    "int8": {
+        "m": 16, "ef_construct": 128, "hnsw_ef": 128,
+        "quantization": "int8", "oversampling": 2.0, "on_disk_vectors": True, "on_disk_payload": True,
+    },
+    "binary": {
+        "m": 16, "ef_construct": 128, "hnsw_ef": 128,
+        "quantization": "binary", "oversampling": 3.0, "on_disk_vectors": True, "on_disk_payload": True,
+    },
+}
+
+
+def get_profile(name: str) -> dict:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}'. Expected one of {', '.join(COLLECTION_PROFILES)}.")
+    return COLLECTION_PROFILES[name]
+
+
+def profile_for(collection_name: str) -> str:
+    return settings.QDRANT_COLLECTION_PROFILES.get(collection_name, "default")
+
+
+def _quantization_config(profile: dict):
+    if profile["quantization"] == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if profile["quantization"] == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def create_collection(client, collection_name: str, size: int, profile_name: str = None,
+                      sparse_vectors: tuple = ()):
+    """
+    Create `collection_name` with cosine vectors of `size` dimensions, tuned by
+    its configured profile (QDRANT_COLLECTION_PROFILES) unless one is given.
+    Each name in `sparse_vectors` adds a named sparse vector with IDF weighting.
+    """
+    profile_name = profile_name or profile_for(collection_name)
+    profile = get_profile(profile_name)
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(
+            size=size,
+            distance=models.Distance.COSINE,
+            on_disk=profile["on_disk_vectors"],
+        ),
+        hnsw_config=models.HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"]),
+        sparse_vectors_config={
+            name: models.SparseVectorParams(
+                index=models.SparseIndexParams(on_disk=profile["on_disk_vectors"]),
+                modifier=models.Modifier.IDF,
+            )
+            for name in sparse_vectors
+        } or None,
+        quantization_config=_quantization_config(profile),
+        on_disk_payload=profile["on_disk_payload"],
+    )
+    print(f"✅ Collection '{collection_name}' created with profile '{profile_name}'.")
+
+
+def apply_profile(client, collection_name: str, profile_name: str):
+    """
+    Move an existing collection to `profile_name`. Qdrant rebuilds the HNSW graph
+    and quantized vectors in the background; search keeps working meanwhile.
+    """
+    profile = get_profile(profile_name)
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=profile["on_disk_vectors"])},
+        hnsw_config=models.HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"]),
+        quantization_config=_quantization_config(profile) or models.Disabled.DISABLED,
+        collection_params=models.CollectionParamsDiff(on_disk_payload=profile["on_disk_payload"]),
+    )
+
+
+def search_params(collection_name: str = None, profile_name: str = None) -> models.SearchParams:
+    """
+    Query-time counterpart of the collection's profile: HNSW `ef` and, for
+    quantized profiles, oversampling with rescoring on the full vectors.
+    """
+    profile = get_profile(profile_name or profile_for(collection_name))
+    quantization = None
+    if profile["quantization"]:
+        quantization = models.QuantizationSearchParams(rescore=True, oversampling=profile["oversampling"])
+    return models.SearchParams(hnsw_ef=profile["hnsw_ef"], quantization=quantization)
+
+
+def estimate_ram_bytes(profile_name: str, count: int, size: int) -> int:
+    """
+    Rough resident size of a collection: vectors kept in RAM (full or quantized)
+    plus the HNSW links (~2·m neighbours per point on layer 0, 4 bytes each).
+    Payloads and on-disk data served from the page cache are not counted.
+    """
+    profile = get_profile(profile_name)
+    full = 0 if profile["on_disk_vectors"] else count * size * 4
+    quantized = {"int8": count * size, "binary": count * size // 8}.get(profile["quantization"], 0)
+    graph = count * profile["m"] * 2 * 4
+    return full + quantized + graph
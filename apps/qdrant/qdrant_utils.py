@@ -1,79 +1,173 @@
 import uuid
-from functools import lru_cache
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.models import (
-    PointStruct,
-    VectorParams,
-    Distance
-)
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+from django.conf import settings
+from django.utils import timezone
+from qdrant_client.models import PointStruct, PayloadSchemaType
+
+from apps.agent.models import DocumentChunk
+from apps.embeddings.embedding_cache import encode_queries
+from apps.embeddings.embedding_client import encode
+from apps.protocols.document_chunks import POSITION_FIELDS
+from apps.protocols.minio_utils import protocol_document_key
+from apps.protocols.models import KnowledgeDocument
+from apps.protocols.timings import stage
+from apps.qdrant.sparse import SPARSE_VECTOR_NAME, document_vector, query_vector
+from apps.qdrant.vector_store import get_vector_store
 
 # Qdrant config
 COLLECTION_NAME = "clinical_knowledge"
 VECTOR_SIZE = 768
+CHUNK_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "sept-agent/clinical-knowledge")
+PAYLOAD_INDEXES = {
+    "document": PayloadSchemaType.KEYWORD,
+    "source": PayloadSchemaType.KEYWORD,
+}
 
-# Qdrant client
-client = QdrantClient(host="qdrant", port=6333)
 
-# Lazy-loaded BioBERT model
-@lru_cache()
-def get_model():
-    print("📦 Loading BioBERT model (pritamdeka/BioBERT...)")
-    return SentenceTransformer("pritamdeka/BioBERT-mnli-snli-scinli-scitail-mednli-stsb")
+def chunk_point_id(document: str, content_hash: str) -> str:
+    """
+    Same document, same chunk text, same model → same point, whatever the
+    protocol version, so a new version only touches the chunks that changed.
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document}:{content_hash}:{settings.EMBEDDING_MODEL_VERSION}"))
+
 
-# Embedding and storage function
-def embed_and_store_chunks(chunks, metadata_base):
-    # Ensure the collection exists
-    if not client.collection_exists(COLLECTION_NAME):
-        client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(
-                size=VECTOR_SIZE,
-                distance=Distance.COSINE
-            )
+def ensure_collection(store):
+    if not store.collection_exists(COLLECTION_NAME):
+        store.create_collection(COLLECTION_NAME, size=VECTOR_SIZE, sparse_vectors=(SPARSE_VECTOR_NAME,))
+        store.create_payload_indexes(COLLECTION_NAME, PAYLOAD_INDEXES)
+        # A new collection holds no chunk, whatever the rows say.
+        DocumentChunk.objects.filter(point_id__isnull=False).update(
+            point_id=None, embedding_model_version="", embedded_at=None
+        )
+    elif SPARSE_VECTOR_NAME not in store.sparse_vector_names(COLLECTION_NAME):
+        raise ValueError(
+            f"Collection '{COLLECTION_NAME}' predates hybrid search (no '{SPARSE_VECTOR_NAME}' sparse vector). "
+            "Rebuild it with `python manage.py reindex_protocols`."
         )
-        print(f"✅ Qdrant collection '{COLLECTION_NAME}' created.")
     else:
         print(f"✔️ Qdrant collection '{COLLECTION_NAME}' already exists.")
 
-    # Get model
-    model = get_model()
 
-    # Generate points
-    points = []
-    for chunk in chunks:
-        embedding = model.encode(chunk, normalize_embeddings=True)
-        points.append(PointStruct(
-            id=str(uuid.uuid4()),
-            vector=embedding,
-            payload={**metadata_base, "text": chunk}
-        ))
+# Embedding and storage function
+def embed_and_store_chunks(chunks, document: KnowledgeDocument, metadata_base: dict) -> dict:
+    """
+    Make `chunks` (the DocumentChunk rows of `document`, e.g. from
+    iter_document_chunks) the indexed chunks of its protocol across all its
+    versions. Each row is one point and records its id: only new chunk texts
+    are embedded, points of unchanged texts move over from the previous
+    version's rows with `metadata_base` and their new position, and points of
+    texts no longer present are deleted.
+
+    `chunks` may be a generator: new chunks are embedded and upserted in
+    batches while it is still producing them.
+    """
+    # Ensure the collection exists
+    store = get_vector_store()
+    ensure_collection(store)
+
+    protocol = protocol_document_key(document.minio_path)
+    indexed = {
+        str(point_id) for point_id in DocumentChunk.objects.filter(
+            point_id__isnull=False, document__category=document.category, document__name=document.name,
+        ).values_list("point_id", flat=True)
+    }
+    seen, unchanged, assigned, pending = set(), {}, [], []
+    new_count = 0
+
+    for row in chunks:
+        point_id = chunk_point_id(protocol, row.content_hash)
+        seen.add(point_id)
+        if str(row.point_id) != point_id:
+            assigned.append(row)
+
+        if point_id in indexed:
+            row.point_id = point_id
+            unchanged[point_id] = {**metadata_base, **_position(row), "chunk_id": row.pk}
+            continue
+        row.point_id = point_id
+        pending.append(row)
+        if len(pending) >= settings.EMBEDDING_BATCH_SIZE:
+            _store_new_chunks(store, pending, protocol, metadata_base)
+            new_count += len(pending)
+            pending = []
+
+    if pending:
+        _store_new_chunks(store, pending, protocol, metadata_base)
+        new_count += len(pending)
+
+    removed_ids = [point_id for point_id in indexed if point_id not in seen]
+    with stage("upsert"):
+        if unchanged:
+            store.set_payloads(COLLECTION_NAME, unchanged)
+        if removed_ids:
+            store.delete_points(COLLECTION_NAME, removed_ids)
 
-    # Upsert to Qdrant
-    client.upsert(collection_name=COLLECTION_NAME, points=points)
-    print(f"📤 Inserted {len(points)} vectors into '{COLLECTION_NAME}'")
+    # Rows of earlier versions give their points up before these rows take them.
+    DocumentChunk.objects.filter(point_id__in=indexed).exclude(document=document).update(
+        point_id=None, embedding_model_version="", embedded_at=None
+    )
+    embedded_at = timezone.now()
+    for row in assigned:
+        row.embedding_model_version = settings.EMBEDDING_MODEL_VERSION
+        row.embedded_at = embedded_at
+    DocumentChunk.objects.bulk_update(assigned, ["point_id", "embedding_model_version", "embedded_at"])
 
+    print(
+        f"📤 {protocol}: {new_count} new, {len(unchanged)} unchanged, "
+        f"{len(removed_ids)} removed chunks in '{COLLECTION_NAME}'"
+    )
+    return {"new": new_count, "unchanged": len(unchanged), "removed": len(removed_ids)}
 
-def delete_vectors_for_document(minio_path: str, collection="clinical_knowledge"):
+
+def _position(row: DocumentChunk) -> dict:
+    return {key: getattr(row, key) for key in POSITION_FIELDS}
+
+
+def _store_new_chunks(store, rows: list[DocumentChunk], document: str, metadata_base: dict):
+    # Encode the batch in one call (through the embedding server when configured)
+    with stage("embed"):
+        embeddings = encode([row.text for row in rows], normalize_embeddings=True)
+    with stage("upsert"):
+        store.upsert(COLLECTION_NAME, [
+            PointStruct(
+                id=row.point_id,
+                vector={"": embedding.tolist(), SPARSE_VECTOR_NAME: document_vector(row.text)},
+                payload={
+                    **metadata_base,
+                    **_position(row),
+                    "document": document,
+                    "chunk_id": row.pk,
+                    "chunk_hash": row.content_hash,
+                    "model_version": settings.EMBEDDING_MODEL_VERSION,
+                    "text": row.text,
+                },
+            )
+            for row, embedding in zip(rows, embeddings)
+        ])
+
+
+def search_chunks(query: str, limit: int = 5):
     """
-    Remove all vectors related to a given document path (usually the MinIO filename).
-    Assumes 'source' field in payload holds the minio_path.
+    Hybrid search over protocol chunks: BioBERT similarity for meaning, BM25 for
+    exact terms (drug names, doses, thresholds), fused by reciprocal rank.
     """
+    vector = encode_queries([query], normalize_embeddings=True)[0]
+    return get_vector_store().hybrid_search(
+        COLLECTION_NAME, vector, SPARSE_VECTOR_NAME, query_vector(query), limit=limit
+    )
+
+
+def delete_vectors_for_document(document: KnowledgeDocument):
+    """
+    Remove the points of a document's chunk rows from the vector index.
+    """
+    point_ids = [str(point_id) for point_id in document.chunks.filter(
+        point_id__isnull=False).values_list("point_id", flat=True)]
     try:
-        client.delete(
-            collection_name=collection,
-            wait=True,
-            points_selector=Filter(
-                must=[
-                    FieldCondition(
-                        key="source",
-                        match=MatchValue(value=minio_path)
-                    )
-                ]
-            ),
-        )
-        print(f"✅ Deleted vectors for {minio_path} from Qdrant.")
+        if point_ids:
+            get_vector_store().delete_points(COLLECTION_NAME, point_ids)
+        print(f"✅ Deleted {len(point_ids)} vectors for {document.minio_path} from Qdrant.")
     except Exception as e:
-        print(f"❌ Failed to delete from Qdrant for {minio_path}: {e}")
+        print(f"❌ Failed to delete from Qdrant for {document.minio_path}: {e}")
         raise
@@ -1,26 +1,53 @@
-from .client import qdrant, embedding_model
 from qdrant_client.http import models
 
+from apps.embeddings.embedding_cache import encode_queries
+from .vector_store import get_vector_store
 
-def search(query_text: str, filter_type: str = None, limit: int = 5):
-    vector = embedding_model.encode(query_text).tolist()
-
-    filters = None
-    if filter_type:
-        filters = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="type",
-                    match=models.MatchValue(value=filter_type)
-                )
-            ]
-        )
-
-    results = qdrant.search(
-        collection_name="clinical-data",
-        query_vector=vector,
-        query_filter=filters,
+
+def build_filter(types: list[str] = None, patient_id: str = None, episode_id: int = None,
+                 since: int = None, until: int = None):
+    """
+    Payload filter over the indexed fields of "clinical-data". `since` and
+    `until` are epoch seconds, matched against the payload `timestamp`.
+    """
+    must = []
+    if types:
+        must.append(models.FieldCondition(key="type", match=models.MatchAny(any=list(types))))
+    if patient_id:
+        must.append(models.FieldCondition(key="patient_id", match=models.MatchValue(value=patient_id)))
+    if episode_id is not None:
+        must.append(models.FieldCondition(key="episode_id", match=models.MatchValue(value=episode_id)))
+    if since is not None or until is not None:
+        must.append(models.FieldCondition(key="timestamp", range=models.Range(gte=since, lte=until)))
+
+    return models.Filter(must=must) if must else None
+
+
+def search(query_text: str, types: list[str] = None, patient_id: str = None, episode_id: int = None,
+           since: int = None, until: int = None, limit: int = 5):
+    # "clinical-data" holds BioBERT vectors, so queries must be encoded with the same model.
+    vector = encode_queries([query_text])[0].tolist()
+
+    return get_vector_store().search(
+        "clinical-data",
+        vector,
+        query_filter=build_filter(types, patient_id, episode_id, since, until),
         limit=limit
     )
 
-    return results
+
+def search_batch(queries: list[dict]):
+    """
+    Run several searches at once. Each query is a dict with `query_text`,
+    optional `limit` and the filter arguments of `search`. All texts are
+    encoded in one call and searched in one batch request; results come
+    back in query order.
+    """
+    vectors = encode_queries([query["query_text"] for query in queries])
+
+    searches = []
+    for query, vector in zip(queries, vectors):
+        filters = {key: value for key, value in query.items() if key not in ("query_text", "limit")}
+        searches.append((vector, build_filter(**filters), query.get("limit", 5)))
+
+    return get_vector_store().search_batch("clinical-data", searches)
@@ -0,0 +1,87 @@
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from qdrant_client.http import models
+
+# BM25 over protocol text, stored as a named sparse vector next to the dense one.
+# Term ids are hashes of the normalized token, so there is no vocabulary to keep
+# in sync between workers; the IDF half of BM25 is computed by Qdrant from the
+# collection itself (Modifier.IDF), so newly indexed protocols update it for free.
+SPARSE_VECTOR_NAME = "bm25"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Chunks are packed up to PROTOCOL_CHUNK_MAX_TOKENS model tokens. BioBERT's word pieces
+# split Portuguese words into ~1.5 pieces, and ~0.7 of the words are content tokens
+# (measured on sample_protocols), so a chunk holds ~0.45 content tokens per model token.
+CONTENT_TOKENS_PER_MODEL_TOKEN = 0.45
+
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[a-z][a-z0-9]*")
+
+PORTUGUESE_STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles depois do dos
+e ela elas ele eles em entre era essa essas esse esses esta estas este estes eu foi for ha isso isto ja la
+lhe lhes mais mas me mesmo meu minha muito na nao nas nem no nos nossa nosso num numa o os ou para pela
+pelas pelo pelos por qual quando que quem se sem ser seu seus sua suas tambem te tem ter um uma umas uns
+via sao deve devem pode podem caso cada apos sobre
+""".split())
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _stem(token: str) -> str:
+    # Light plural folding only ("infecções" → "infeccao", "cristaloides" → "cristaloide").
+    if len(token) <= 4 or token[0].isdigit():
+        return token
+    if token.endswith("oes"):
+        return token[:-3] + "ao"
+    if token.endswith("ais"):
+        return token[:-3] + "al"
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased, accent-free Portuguese tokens without stopwords. Numbers keep
+    their decimal part ("0,5", "2.5") so doses and thresholds stay searchable.
+    """
+    tokens = TOKEN_PATTERN.findall(_strip_accents(text.lower()))
+    return [
+        _stem(token) for token in tokens
+        if token not in PORTUGUESE_STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def _term_id(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & 0x7FFFFFFF
+
+
+def avg_length() -> float:
+    """Expected content tokens per protocol chunk, the BM25 average document length."""
+    return settings.PROTOCOL_CHUNK_MAX_TOKENS * CONTENT_TOKENS_PER_MODEL_TOKEN
+
+
+def document_vector(text: str) -> models.SparseVector:
+    """BM25 term-frequency weights of a chunk (saturated and length-normalized)."""
+    tokens = tokenize(text)
+    length_norm = 1 - BM25_B + BM25_B * len(tokens) / avg_length()
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        term = _term_id(token)
+        weights[term] = weights.get(term, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return models.SparseVector(indices=list(weights), values=list(weights.values()))
+
+
+def query_vector(text: str) -> models.SparseVector:
+    """
+    Each distinct query term once; Qdrant multiplies it by the term's IDF.
+    A query made only of stopwords gives an empty vector (see hybrid_search).
+    """
+    terms = sorted({_term_id(token) for token in tokenize(text)})
+    return models.SparseVector(indices=terms, values=[1.0] * len(terms))
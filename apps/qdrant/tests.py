@@ -1,3 +1,320 @@
-from django.test import TestCase
+import os
+import pickle
+import tempfile
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from rest_framework.test import APIRequestFactory
+
+from apps.embeddings import vector_pipeline
+from apps.protocols.document_chunks import iter_document_chunks
+from apps.protocols.models import KnowledgeDocument
+from apps.qdrant.management.commands import benchmark_collection_profiles
+from apps.qdrant.qdrant_utils import COLLECTION_NAME, delete_vectors_for_document, embed_and_store_chunks
+from apps.qdrant.search import build_filter
+from apps.qdrant.sparse import SPARSE_VECTOR_NAME, document_vector, query_vector
+from apps.qdrant.vector_store import NumpyStore, QdrantStore
+from apps.qdrant.views import MAX_BATCH_QUERIES, QdrantBatchSearchView, QdrantSearchView, _epoch
+
+
+def _points(count: int, size: int = 16, seed: int = 0) -> list[models.PointStruct]:
+    vectors = np.random.default_rng(seed).normal(size=(count, size)).astype(np.float32)
+    return [
+        models.PointStruct(id=i, vector=vectors[i].tolist(), payload={
+            "type": "vitals" if i % 2 else "lab_result",
+            "patient_id": f"patient-{i % 3}",
+            "episode_id": i % 4,
+            "timestamp": 1_700_000_000 + i,
+        })
+        for i in range(count)
+    ]
+
+
+class VectorStoreParityTests(SimpleTestCase):
+    """
+    The NumPy store must return what Qdrant (local mode, exact search) returns
+    for the filters the app builds.
+    """
+
+    def setUp(self):
+        self.stores = {
+            "numpy": NumpyStore(),
+            "qdrant-local": QdrantStore(QdrantClient(":memory:")),
+        }
+        for store in self.stores.values():
+            store.create_collection("clinical-data", size=16)
+            store.upsert("clinical-data", _points(60))
+
+    def _ids(self, store, **filters):
+        query = np.ones(16, dtype=np.float32)
+        return [point.id for point in store.search("clinical-data", query, build_filter(**filters), limit=10)]
+
+    def test_filtered_search_matches_qdrant(self):
+        cases = [
+            {},
+            {"types": ["vitals"]},
+            {"patient_id": "patient-1", "types": ["vitals", "lab_result"]},
+            {"episode_id": 2, "since": 1_700_000_010, "until": 1_700_000_040},
+        ]
+        for filters in cases:
+            with self.subTest(filters=filters):
+                self.assertEqual(self._ids(self.stores["numpy"], **filters),
+                                 self._ids(self.stores["qdrant-local"], **filters))
+
+    def test_search_batch_matches_individual_searches(self):
+        rng = np.random.default_rng(2)
+        searches = [
+            (rng.normal(size=16), build_filter(types=["vitals"]), 3),
+            (rng.normal(size=16), None, 7),
+            (rng.normal(size=16), build_filter(patient_id="patient-2"), 5),
+        ]
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                batched = store.search_batch("clinical-data", searches)
+                self.assertEqual(
+                    [[point.id for point in points] for points in batched],
+                    [[point.id for point in store.search("clinical-data", *search)] for search in searches],
+                )
+
+    def test_upsert_overwrites_and_delete_removes(self):
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                store.upsert("clinical-data", _points(10, seed=1))
+                self.assertEqual(store.count("clinical-data"), 60)
+
+                store.delete("clinical-data", build_filter(patient_id="patient-0"))
+                self.assertEqual(store.count("clinical-data"), 40)
+                self.assertNotIn(0, self._ids(store))
+
+
+class ClinicalSearchViewTests(SimpleTestCase):
+    def setUp(self):
+        store = NumpyStore()
+        store.create_collection("clinical-data", size=16)
+        store.upsert("clinical-data", _points(60))
+        for target, value in (("get_vector_store", mock.Mock(return_value=store)),
+                              ("encode_queries", lambda texts: np.ones((len(texts), 16), dtype=np.float32))):
+            patcher = mock.patch(f"apps.qdrant.search.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _post(self, view, data):
+        return view.as_view()(APIRequestFactory().post("/", data, format="json"))
+
+    def _ids(self, results):
+        return sorted(result["payload"]["timestamp"] - 1_700_000_000 for result in results)
+
+    def test_build_filter(self):
+        self.assertIsNone(build_filter())
+        conditions = build_filter(types=["vitals"], patient_id="p1", episode_id=0, since=10).must
+        self.assertEqual([condition.key for condition in conditions], ["type", "patient_id", "episode_id", "timestamp"])
+        self.assertEqual((conditions[3].range.gte, conditions[3].range.lte), (10, None))
+
+    def test_naive_times_are_read_in_the_app_time_zone(self):
+        # 1_700_000_010 is 2023-11-14 19:13:30 in America/Sao_Paulo (UTC-3).
+        naive = {"since": "2023-11-14T19:13:30", "until": "2023-11-14T19:13:40"}
+        aware = {"since": "2023-11-14T22:13:30+00:00", "until": "2023-11-14T22:13:40Z"}
+
+        for times in (naive, aware):
+            with self.subTest(times=times):
+                response = self._post(QdrantSearchView, {"query": "febre", "limit": 20, **times})
+                self.assertEqual(self._ids(response.data), list(range(10, 21)))
+
+        self.assertEqual(vector_pipeline._epoch(datetime(2023, 11, 14, 19, 13, 30)), _epoch(naive["since"], "since"))
+        self.assertEqual(self._post(QdrantSearchView, {"query": "febre", "since": "ontem"}).status_code, 400)
+
+    def test_batch_returns_what_single_searches_return(self):
+        queries = [
+            {"query": "febre", "type": "vitals", "limit": 3},
+            {"query": "lactato", "patient_id": "patient-2", "since": "2023-11-14T19:13:30"},
+        ]
+
+        response = self._post(QdrantBatchSearchView, {"queries": queries})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [self._post(QdrantSearchView, query).data for query in queries])
+
+    def test_batch_size_is_limited(self):
+        with mock.patch("apps.qdrant.views.search_batch") as search_batch:
+            response = self._post(QdrantBatchSearchView, {"queries": [{"query": "febre"}] * (MAX_BATCH_QUERIES + 1)})
+            missing = self._post(QdrantBatchSearchView, {"queries": [{"query": "febre"}, {"limit": 2}]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((missing.status_code, missing.data["error"]), (400, "queries[1]: Query is required."))
+        search_batch.assert_not_called()
+
+
+class HybridSearchTests(SimpleTestCase):
+    CHUNKS = [
+        "Iniciar reposição volêmica com 30 ml/Kg de cristalóides balanceados.",
+        "O corticoide recomendado é a hidrocortisona na dose de 200 mg/dia.",
+        "Neutropenia grave: cefepime 2 g EV 8/8h, alternativa ciprofloxacino.",
+        "Coletar lactato e hemoculturas antes do antimicrobiano.",
+        "Lactato ≥ 4 mmol/L indica hipoperfusão e exige reavaliação volêmica.",
+        "Meningite: ceftriaxona associada a vancomicina.",
+    ]
+
+    def setUp(self):
+        vectors = np.random.default_rng(3).normal(size=(len(self.CHUNKS), 16)).astype(np.float32)
+        self.stores = {
+            "numpy": NumpyStore(),
+            "qdrant-local": QdrantStore(QdrantClient(":memory:")),
+        }
+        for store in self.stores.values():
+            store.create_collection("clinical_knowledge", size=16, sparse_vectors=(SPARSE_VECTOR_NAME,))
+            store.upsert("clinical_knowledge", [
+                models.PointStruct(id=i, vector={"": vectors[i].tolist(), SPARSE_VECTOR_NAME: document_vector(chunk)},
+                                   payload={"text": chunk})
+                for i, chunk in enumerate(self.CHUNKS)
+            ])
+
+    def test_bm25_finds_exact_terms(self):
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                points = store.search_sparse("clinical_knowledge", SPARSE_VECTOR_NAME,
+                                             query_vector("dose de hidrocortisona"), limit=3)
+                self.assertEqual([point.id for point in points], [1])
+
+    def test_hybrid_fusion_matches_qdrant(self):
+        query = np.random.default_rng(4).normal(size=16)
+        results = {
+            name: [point.id for point in store.hybrid_search(
+                "clinical_knowledge", query, SPARSE_VECTOR_NAME, query_vector("lactato ≥ 4 mmol/L"), limit=4)]
+            for name, store in self.stores.items()
+        }
+        self.assertEqual(results["numpy"], results["qdrant-local"])
+        self.assertEqual(results["numpy"][0], 4)
+
+    def test_profile_benchmark_samples_the_dense_vector(self):
+        command = benchmark_collection_profiles.Command()
+        command.qdrant = self.stores["qdrant-local"].client
+
+        self.assertEqual(command._sample("clinical_knowledge", 100).shape, (len(self.CHUNKS), 16))
+
+    def test_stopword_only_query_falls_back_to_dense(self):
+        query = np.random.default_rng(5).normal(size=16)
+        sparse = query_vector("o que é de")
+        self.assertEqual(sparse.indices, [])
+
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                self.assertEqual(
+                    [point.id for point in store.hybrid_search(
+                        "clinical_knowledge", query, SPARSE_VECTOR_NAME, sparse, limit=3)],
+                    [point.id for point in store.search("clinical_knowledge", query, limit=3)],
+                )
+
+    def test_average_length_follows_the_chunk_size(self):
+        text = " ".join(f"termo{i}" for i in range(58))  # 58 content tokens, about half a 256-token chunk
+        short_chunk = document_vector(text).values[0]
+        with override_settings(PROTOCOL_CHUNK_MAX_TOKENS=128):
+            self.assertLess(document_vector(text).values[0], short_chunk)  # now an average-length chunk
+            self.assertAlmostEqual(document_vector(text).values[0], 1.0, places=2)
+
+
+class IncrementalProtocolIndexTests(TestCase):
+    def setUp(self):
+        self.store = NumpyStore()
+        self.encoded = []
+        patches = [
+            mock.patch("apps.qdrant.qdrant_utils.get_vector_store", return_value=self.store),
+            mock.patch("apps.qdrant.qdrant_utils.encode", side_effect=self._encode),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.random.default_rng(len(self.encoded)).normal(size=(len(texts), 768)).astype(np.float32)
+
+    def _index(self, texts, version):
+        document = KnowledgeDocument.objects.create(
+            name="sepse.pdf", category="infection_protocol", version=version,
+            minio_path=f"infection_protocol__{version}__sepse.pdf",
+        )
+        chunks = [{"text": text, "page": i + 1, "page_end": i + 1, "start": 0, "end": len(text), "tokens": 8}
+                  for i, text in enumerate(texts)]
+        counts = embed_and_store_chunks(
+            iter_document_chunks(document, chunks), document=document,
+            metadata_base={"source": document.minio_path, "source_version": version},
+        )
+        return document, counts
+
+    def test_new_version_only_embeds_changed_chunks(self):
+        v1, _ = self._index(["bundle de 1 hora", "lactato ≥ 2 mmol/L", "meropenem 1 g 8/8h"], "v1")
+        self.encoded.clear()
+
+        v2, counts = self._index(["nova seção", "bundle de 1 hora", "lactato ≥ 4 mmol/L", "meropenem 1 g 8/8h"], "v2")
+
+        self.assertEqual(counts, {"new": 2, "unchanged": 2, "removed": 1})
+        self.assertEqual(self.encoded, ["nova seção", "lactato ≥ 4 mmol/L"])
+        self.assertEqual(self.store.count(COLLECTION_NAME), 4)
+        payloads = {point.payload["text"]: point.payload
+                    for point in self.store.search(COLLECTION_NAME, np.ones(768), limit=10)}
+        self.assertEqual({payload["source_version"] for payload in payloads.values()}, {"v2"})
+        self.assertEqual(payloads["meropenem 1 g 8/8h"]["page"], 4)  # unchanged chunk, moved one page down
+
+        # One point per chunk row: the new version's rows hold every point, the old version's none.
+        self.assertFalse(v1.chunks.filter(point_id__isnull=False).exists())
+        rows = {str(row.point_id): row for row in v2.chunks.all()}
+        self.assertEqual(set(rows), self.store.point_ids(COLLECTION_NAME))
+        self.assertEqual({payload["chunk_id"] for payload in payloads.values()}, {row.pk for row in rows.values()})
+
+        delete_vectors_for_document(v2)
+        self.assertEqual(self.store.count(COLLECTION_NAME), 0)
+
+
+class NumpyStorePersistenceTests(SimpleTestCase):
+    def test_memory_mapped_collection_reloads(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = NumpyStore(path)
+            store.create_collection("clinical_knowledge", size=16)
+            store.upsert("clinical_knowledge", _points(1500))  # grows past the initial capacity
+
+            reloaded = NumpyStore(path)
+            query = np.asarray(_points(1500)[42].vector, dtype=np.float32)
+            self.assertEqual(reloaded.count("clinical_knowledge"), 1500)
+            self.assertEqual(reloaded.search("clinical_knowledge", query, limit=1)[0].id, 42)
+
+    def test_writes_append_changed_rows_instead_of_rewriting_the_collection(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = NumpyStore(path)
+            store.create_collection("clinical_knowledge", size=16)
+            store.upsert("clinical_knowledge", _points(1500))
+            store = NumpyStore(path)
+            self.assertEqual(store.count("clinical_knowledge"), 1500)  # loading folds the journal into the snapshot
+            snapshot_file = os.path.join(path, "clinical_knowledge", "points.pkl")
+            with open(snapshot_file, "rb") as f:
+                snapshot = f.read()
+
+            store.upsert("clinical_knowledge", _points(2, seed=1))
+            store.set_payloads("clinical_knowledge", {5: {"reviewed": True}})
+            store.delete_points("clinical_knowledge", [7])
+
+            with open(snapshot_file, "rb") as f:
+                self.assertEqual(f.read(), snapshot)
+            reloaded = NumpyStore(path)
+            query = np.asarray(_points(2, seed=1)[1].vector, dtype=np.float32)
+            self.assertEqual(reloaded.count("clinical_knowledge"), 1499)
+            self.assertEqual(reloaded.search("clinical_knowledge", query, limit=1)[0].id, 1)
+            self.assertEqual(reloaded.point_ids("clinical_knowledge", models.Filter(must=[
+                models.FieldCondition(key="reviewed", match=models.MatchValue(value=True))])), {5})
+            self.assertNotIn(7, reloaded.point_ids("clinical_knowledge"))
+
+    def test_torn_journal_record_is_dropped_on_reload(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = NumpyStore(path)
+            store.create_collection("clinical_knowledge", size=16)
+            store.upsert("clinical_knowledge", _points(3))
+            with open(os.path.join(path, "clinical_knowledge", "points.log"), "ab") as f:
+                f.write(pickle.dumps((3, 3, {"type": "vitals"}, {}))[:-4])  # crash mid-append
+
+            reloaded = NumpyStore(path)
+            reloaded.upsert("clinical_knowledge", _points(5)[3:])
+
+            self.assertEqual(NumpyStore(path).point_ids("clinical_knowledge"), {0, 1, 2, 3, 4})
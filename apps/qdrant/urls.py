@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import QdrantSearchView
+from .views import QdrantBatchSearchView, QdrantSearchView, QueryCacheStatsView
 
 urlpatterns = [
     path('search/', QdrantSearchView.as_view(), name='qdrant-search'),
+    path('search/batch/', QdrantBatchSearchView.as_view(), name='qdrant-search-batch'),
+    path('search/cache-stats/', QueryCacheStatsView.as_view(), name='qdrant-query-cache-stats'),
 ]
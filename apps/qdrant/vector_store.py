@@ -0,0 +1,587 @@
+import os
+import pickle
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from qdrant_client.http import models
+
+from apps.qdrant.client import get_qdrant_client
+from apps.qdrant.profiles import create_collection, search_params
+
+# Every store speaks qdrant_client's data types (PointStruct in, ScoredPoint out,
+# models.Filter for payload filters), so callers do not depend on the backend.
+# A point's vector is either the dense vector or a dict holding it under "" next
+# to named sparse vectors.
+
+RRF_K = 60
+HYBRID_PREFETCH = 4  # candidates per retriever, as a multiple of the limit
+COMPACT_MIN_ROWS = 1024  # NumpyStore journal rows tolerated before a snapshot, even for small collections
+
+
+class VectorStore(ABC):
+    @abstractmethod
+    def collection_exists(self, collection_name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def create_collection(self, collection_name: str, size: int, sparse_vectors: tuple = ()):
+        pass
+
+    @abstractmethod
+    def delete_collection(self, collection_name: str):
+        pass
+
+    def sparse_vector_names(self, collection_name: str) -> set[str]:
+        return set()
+
+    def create_payload_indexes(self, collection_name: str, indexes: dict):
+        pass
+
+    @abstractmethod
+    def upsert(self, collection_name: str, points: list[models.PointStruct]):
+        pass
+
+    @abstractmethod
+    def search(self, collection_name: str, vector, query_filter: models.Filter = None,
+               limit: int = 5) -> list[models.ScoredPoint]:
+        pass
+
+    def search_batch(self, collection_name: str, searches: list[tuple]) -> list[list[models.ScoredPoint]]:
+        """
+        Run several `(vector, query_filter, limit)` searches, returning one
+        result list per search, in order.
+        """
+        return [self.search(collection_name, vector, query_filter, limit) for vector, query_filter, limit in searches]
+
+    @abstractmethod
+    def search_sparse(self, collection_name: str, using: str, sparse_vector: models.SparseVector,
+                      query_filter: models.Filter = None, limit: int = 5) -> list[models.ScoredPoint]:
+        pass
+
+    def hybrid_search(self, collection_name: str, vector, using: str, sparse_vector: models.SparseVector,
+                      query_filter: models.Filter = None, limit: int = 5) -> list[models.ScoredPoint]:
+        """
+        Dense and sparse (`using`) candidates fused with reciprocal rank fusion.
+        Scores are RRF scores, not similarities. A query without sparse terms
+        (only stopwords) is a plain dense search.
+        """
+        if not sparse_vector.indices:
+            return self.search(collection_name, vector, query_filter, limit)
+        candidates = max(limit * HYBRID_PREFETCH, 20)
+        return rrf_fuse([
+            self.search(collection_name, vector, query_filter, candidates),
+            self.search_sparse(collection_name, using, sparse_vector, query_filter, candidates),
+        ], limit)
+
+    @abstractmethod
+    def delete(self, collection_name: str, query_filter: models.Filter):
+        pass
+
+    @abstractmethod
+    def delete_points(self, collection_name: str, point_ids: list):
+        pass
+
+    @abstractmethod
+    def point_ids(self, collection_name: str, query_filter: models.Filter = None) -> set:
+        pass
+
+    @abstractmethod
+    def set_payloads(self, collection_name: str, payloads: dict):
+        """Merge each `{point id: payload}` entry into that point's payload."""
+        pass
+
+    @abstractmethod
+    def count(self, collection_name: str) -> int:
+        pass
+
+
+class QdrantStore(VectorStore):
+    """
+    A Qdrant server, or Qdrant's local mode (in memory or on a path) for runs
+    without the container. Collections get their tuning profile on creation.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def collection_exists(self, collection_name):
+        return self.client.collection_exists(collection_name)
+
+    def create_collection(self, collection_name, size, sparse_vectors=()):
+        create_collection(self.client, collection_name, size=size, sparse_vectors=sparse_vectors)
+
+    def delete_collection(self, collection_name):
+        self.client.delete_collection(collection_name)
+
+    def sparse_vector_names(self, collection_name):
+        return set(self.client.get_collection(collection_name).config.params.sparse_vectors or {})
+
+    def create_payload_indexes(self, collection_name, indexes):
+        # Creating an index that already exists is a no-op.
+        for field_name, field_schema in indexes.items():
+            self.client.create_payload_index(collection_name, field_name=field_name, field_schema=field_schema)
+
+    def upsert(self, collection_name, points):
+        self.client.upsert(collection_name=collection_name, points=points)
+
+    def search(self, collection_name, vector, query_filter=None, limit=5):
+        return self.client.query_points(
+            collection_name=collection_name,
+            query=np.asarray(vector, dtype=np.float32).tolist(),
+            query_filter=query_filter,
+            search_params=search_params(collection_name),
+            limit=limit,
+            with_payload=True,
+        ).points
+
+    def search_batch(self, collection_name, searches):
+        # One request to Qdrant instead of one round trip per search.
+        params = search_params(collection_name)
+        responses = self.client.query_batch_points(
+            collection_name=collection_name,
+            requests=[
+                models.QueryRequest(
+                    query=np.asarray(vector, dtype=np.float32).tolist(),
+                    filter=query_filter,
+                    params=params,
+                    limit=limit,
+                    with_payload=True,
+                )
+                for vector, query_filter, limit in searches
+            ],
+        )
+        return [response.points for response in responses]
+
+    def search_sparse(self, collection_name, using, sparse_vector, query_filter=None, limit=5):
+        return self.client.query_points(
+            collection_name=collection_name,
+            query=sparse_vector,
+            using=using,
+            query_filter=query_filter,
+            limit=limit,
+            with_payload=True,
+        ).points
+
+    def hybrid_search(self, collection_name, vector, using, sparse_vector, query_filter=None, limit=5):
+        if not sparse_vector.indices:
+            return self.search(collection_name, vector, query_filter, limit)
+        # Both retrievers and the fusion run inside Qdrant, in one request.
+        candidates = max(limit * HYBRID_PREFETCH, 20)
+        return self.client.query_points(
+            collection_name=collection_name,
+            prefetch=[
+                models.Prefetch(
+                    query=np.asarray(vector, dtype=np.float32).tolist(),
+                    filter=query_filter,
+                    params=search_params(collection_name),
+                    limit=candidates,
+                ),
+                models.Prefetch(query=sparse_vector, using=using, filter=query_filter, limit=candidates),
+            ],
+            query=models.RrfQuery(rrf=models.Rrf(k=RRF_K)),
+            limit=limit,
+            with_payload=True,
+        ).points
+
+    def delete(self, collection_name, query_filter):
+        self.client.delete(
+            collection_name=collection_name,
+            wait=True,
+            points_selector=models.FilterSelector(filter=query_filter),
+        )
+
+    def delete_points(self, collection_name, point_ids):
+        self.client.delete(
+            collection_name=collection_name,
+            wait=True,
+            points_selector=models.PointIdsList(points=list(point_ids)),
+        )
+
+    def point_ids(self, collection_name, query_filter=None):
+        ids, offset = set(), None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name, scroll_filter=query_filter, limit=1000, offset=offset,
+                with_payload=False, with_vectors=False,
+            )
+            ids.update(point.id for point in points)
+            if offset is None:
+                return ids
+
+    def set_payloads(self, collection_name, payloads):
+        # One request for all points, even though each gets its own payload.
+        self.client.batch_update_points(collection_name=collection_name, wait=True, update_operations=[
+            models.SetPayloadOperation(set_payload=models.SetPayload(payload=payload, points=[point_id]))
+            for point_id, payload in payloads.items()
+        ])
+
+    def count(self, collection_name):
+        return self.client.count(collection_name).count
+
+
+class _NumpyCollection:
+    """
+    Vectors live in a memory-mapped matrix written in place. Ids, payloads and
+    sparse vectors are persisted as a snapshot (points.pkl) plus an append-only
+    journal (points.log) of the rows changed since, so a save only writes the
+    rows it touched. The journal is folded into a new snapshot once it holds
+    more rows than the collection, and whenever the matrix is reallocated.
+    """
+
+    def __init__(self, size: int, path: str = None, capacity: int = 1024, sparse_vectors: tuple = ()):
+        self.size = size
+        self.path = path
+        self.count = 0
+        self.ids = []            # row → point id (None once deleted)
+        self.payloads = []       # row → payload
+        self.rows = {}           # point id → row
+        self.sparse = {name: [] for name in sparse_vectors}  # name → row → {term: weight}
+        self.dirty = set()       # rows changed since the last save
+        self.journaled = 0       # rows appended to the journal since the last snapshot
+        self.vectors = self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        if not self.path:
+            return np.zeros((capacity, self.size), dtype=np.float32)
+        os.makedirs(self.path, exist_ok=True)
+        return np.lib.format.open_memmap(
+            os.path.join(self.path, f"vectors-{capacity}.npy"), mode="w+", dtype=np.float32, shape=(capacity, self.size)
+        )
+
+    def grow(self, needed: int):
+        capacity = len(self.vectors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        old, self.vectors = self.vectors, self._allocate(capacity)
+        self.vectors[:self.count] = old[:self.count]
+        if self.path:
+            self.snapshot()  # points at the new matrix before the old one goes away
+            old_file = old.filename
+            del old
+            os.remove(old_file)
+
+    def save(self):
+        """Persist the rows changed since the last save."""
+        if not self.path:
+            self.dirty.clear()
+            return
+        if self.journaled + len(self.dirty) > max(self.count, COMPACT_MIN_ROWS):
+            self.snapshot()
+            return
+        self.vectors.flush()
+        with open(os.path.join(self.path, "points.log"), "ab") as f:
+            for row in sorted(self.dirty):
+                pickle.dump((row, self.ids[row], self.payloads[row],
+                             {name: rows[row] for name, rows in self.sparse.items()}), f)
+        self.journaled += len(self.dirty)
+        self.dirty.clear()
+
+    def snapshot(self):
+        """Write every row to a new snapshot and start an empty journal."""
+        self.dirty.clear()
+        if not self.path:
+            return
+        self.vectors.flush()
+        snapshot_file = os.path.join(self.path, "points.pkl")
+        with open(snapshot_file + ".tmp", "wb") as f:
+            pickle.dump({
+                "size": self.size, "count": self.count, "ids": self.ids, "payloads": self.payloads,
+                "sparse": self.sparse,
+                "vectors_file": os.path.basename(self.vectors.filename),
+            }, f)
+        os.replace(snapshot_file + ".tmp", snapshot_file)
+        open(os.path.join(self.path, "points.log"), "wb").close()
+        self.journaled = 0
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, "points.pkl"), "rb") as f:
+            state = pickle.load(f)
+        collection = cls.__new__(cls)
+        collection.size = state["size"]
+        collection.path = path
+        collection.count = state["count"]
+        collection.ids = state["ids"]
+        collection.payloads = state["payloads"]
+        collection.sparse = state.get("sparse", {})
+        collection.dirty = set()
+        collection.journaled = 0
+        collection.vectors = np.load(os.path.join(path, state["vectors_file"]), mmap_mode="r+")
+
+        # Journal records hold a row's whole state, so replaying them in order yields
+        # the latest state even if they predate the snapshot (a crash before the
+        # journal was emptied). A record cut short by a crash ends the replay.
+        replayed = 0
+        try:
+            with open(os.path.join(path, "points.log"), "rb") as f:
+                while True:
+                    collection._restore_row(*pickle.load(f))
+                    replayed += 1
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+
+        collection.rows = {point_id: row for row, point_id in enumerate(collection.ids) if point_id is not None}
+        if replayed:
+            collection.snapshot()  # also drops a torn tail, so later appends are not lost behind it
+        return collection
+
+    def _restore_row(self, row: int, point_id, payload: dict, sparse: dict):
+        while self.count <= row:
+            self.ids.append(None)
+            self.payloads.append(None)
+            for rows in self.sparse.values():
+                rows.append(None)
+            self.count += 1
+        self.ids[row] = point_id
+        self.payloads[row] = payload
+        for name, rows in self.sparse.items():
+            rows[row] = sparse.get(name)
+
+
+class NumpyStore(VectorStore):
+    """
+    Exact brute-force search over a float32 matrix, memory-mapped under `path`
+    (or kept in RAM without one). Vectors are L2-normalized on write, so cosine
+    scores are a single matrix-vector product. Meant for tests, offline runs and
+    micro-benchmarks, not for production-sized collections.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, collection_name):
+        return os.path.join(self.path, collection_name) if self.path else None
+
+    def _get(self, collection_name) -> _NumpyCollection:
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            path = self._collection_path(collection_name)
+            if not path or not os.path.exists(os.path.join(path, "points.pkl")):
+                raise ValueError(f"Collection '{collection_name}' does not exist.")
+            collection = self._collections[collection_name] = _NumpyCollection.load(path)
+        return collection
+
+    def collection_exists(self, collection_name):
+        try:
+            self._get(collection_name)
+            return True
+        except ValueError:
+            return False
+
+    def create_collection(self, collection_name, size, sparse_vectors=()):
+        with self._lock:
+            collection = _NumpyCollection(size, self._collection_path(collection_name), sparse_vectors=sparse_vectors)
+            collection.snapshot()
+            self._collections[collection_name] = collection
+        print(f"✅ Collection '{collection_name}' created (numpy).")
+
+    def delete_collection(self, collection_name):
+        with self._lock:
+            self._collections.pop(collection_name, None)
+            path = self._collection_path(collection_name)
+            if path and os.path.exists(path):
+                shutil.rmtree(path)
+
+    def sparse_vector_names(self, collection_name):
+        return set(self._get(collection_name).sparse)
+
+    def upsert(self, collection_name, points):
+        with self._lock:
+            collection = self._get(collection_name)
+            new_ids = {point.id for point in points if point.id not in collection.rows}
+            collection.grow(collection.count + len(new_ids))
+
+            for point in points:
+                named = point.vector if isinstance(point.vector, dict) else {"": point.vector}
+                vector = np.asarray(named[""], dtype=np.float32)
+                row = collection.rows.get(point.id)
+                if row is None:
+                    row = collection.rows[point.id] = collection.count
+                    collection.ids.append(point.id)
+                    collection.payloads.append(None)
+                    for rows in collection.sparse.values():
+                        rows.append(None)
+                    collection.count += 1
+                collection.dirty.add(row)
+                collection.vectors[row] = vector / (np.linalg.norm(vector) or 1.0)
+                collection.payloads[row] = point.payload or {}
+                for name, rows in collection.sparse.items():
+                    sparse = named.get(name)
+                    rows[row] = dict(zip(sparse.indices, sparse.values)) if sparse is not None else None
+            collection.save()
+
+    def search(self, collection_name, vector, query_filter=None, limit=5):
+        collection = self._get(collection_name)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        scores = collection.vectors[:collection.count] @ query
+        if query_filter is None and len(collection.rows) == collection.count:
+            candidates = np.arange(collection.count)
+        else:
+            candidates = np.array([
+                row for row in range(collection.count)
+                if collection.ids[row] is not None and _matches(collection.payloads[row], query_filter)
+            ], dtype=np.int64)
+        if not len(candidates):
+            return []
+
+        candidate_scores = scores[candidates]
+        k = min(limit, len(candidates))
+        best = np.argpartition(-candidate_scores, k - 1)[:k]
+        top = candidates[best[np.argsort(-candidate_scores[best], kind="stable")]]
+        return [
+            models.ScoredPoint(id=collection.ids[row], version=0, score=float(scores[row]),
+                               payload=collection.payloads[row])
+            for row in top
+        ]
+
+    def search_sparse(self, collection_name, using, sparse_vector, query_filter=None, limit=5):
+        collection = self._get(collection_name)
+        rows = collection.sparse[using]
+        live = [row for row in range(collection.count) if collection.ids[row] is not None]
+
+        # Same IDF as Qdrant's Modifier.IDF, over the points currently stored.
+        idf = {}
+        for term in sparse_vector.indices:
+            with_term = sum(1 for row in live if rows[row] and term in rows[row])
+            idf[term] = np.log(1 + (len(live) - with_term + 0.5) / (with_term + 0.5))
+
+        scored = []
+        for row in live:
+            if not rows[row] or not _matches(collection.payloads[row], query_filter):
+                continue
+            score = sum(
+                weight * idf[term] * rows[row][term]
+                for term, weight in zip(sparse_vector.indices, sparse_vector.values) if term in rows[row]
+            )
+            if score > 0:
+                scored.append((score, row))
+
+        scored.sort(key=lambda item: -item[0])
+        return [
+            models.ScoredPoint(id=collection.ids[row], version=0, score=float(score), payload=collection.payloads[row])
+            for score, row in scored[:limit]
+        ]
+
+    def delete(self, collection_name, query_filter):
+        with self._lock:
+            collection = self._get(collection_name)
+            for row in range(collection.count):
+                if collection.ids[row] is not None and _matches(collection.payloads[row], query_filter):
+                    del collection.rows[collection.ids[row]]
+                    collection.dirty.add(row)
+                    collection.ids[row] = None
+                    collection.payloads[row] = None
+                    for rows in collection.sparse.values():
+                        rows[row] = None
+            collection.save()
+
+    def delete_points(self, collection_name, point_ids):
+        with self._lock:
+            collection = self._get(collection_name)
+            for point_id in point_ids:
+                row = collection.rows.pop(point_id, None)
+                if row is not None:
+                    collection.dirty.add(row)
+                    collection.ids[row] = None
+                    collection.payloads[row] = None
+                    for rows in collection.sparse.values():
+                        rows[row] = None
+            collection.save()
+
+    def point_ids(self, collection_name, query_filter=None):
+        collection = self._get(collection_name)
+        return {
+            point_id for point_id, row in collection.rows.items()
+            if _matches(collection.payloads[row], query_filter)
+        }
+
+    def set_payloads(self, collection_name, payloads):
+        with self._lock:
+            collection = self._get(collection_name)
+            for point_id, payload in payloads.items():
+                row = collection.rows.get(point_id)
+                if row is not None:
+                    collection.dirty.add(row)
+                    collection.payloads[row] = {**collection.payloads[row], **payload}
+            collection.save()
+
+    def count(self, collection_name):
+        return len(self._get(collection_name).rows)
+
+
+def rrf_fuse(result_lists: list[list[models.ScoredPoint]], limit: int, k: int = RRF_K) -> list[models.ScoredPoint]:
+    """
+    Reciprocal rank fusion: each point scores the sum of 1 / (k + rank) over the
+    lists it appears in (rank 0-based, as Qdrant computes it).
+    """
+    fused, points = {}, {}
+    for results in result_lists:
+        for rank, point in enumerate(results):
+            fused[point.id] = fused.get(point.id, 0.0) + 1.0 / (k + rank)
+            points.setdefault(point.id, point)
+
+    ranked = sorted(fused, key=lambda point_id: -fused[point_id])[:limit]
+    return [
+        models.ScoredPoint(id=point_id, version=points[point_id].version, score=fused[point_id],
+                           payload=points[point_id].payload)
+        for point_id in ranked
+    ]
+
+
+def _matches(payload: dict, query_filter: models.Filter) -> bool:
+    """
+    Evaluate the subset of Qdrant filters the app builds: `must` and `must_not`
+    lists of field conditions with MatchValue, MatchAny or Range.
+    """
+    if query_filter is None:
+        return True
+    return (
+        all(_condition(payload, condition) for condition in query_filter.must or [])
+        and not any(_condition(payload, condition) for condition in query_filter.must_not or [])
+    )
+
+
+def _condition(payload: dict, condition: models.FieldCondition) -> bool:
+    value = payload.get(condition.key)
+    if isinstance(condition.match, models.MatchValue):
+        return value == condition.match.value
+    if isinstance(condition.match, models.MatchAny):
+        return value in condition.match.any
+    if condition.range is not None:
+        bounds = condition.range
+        return value is not None and all((
+            bounds.gte is None or value >= bounds.gte,
+            bounds.gt is None or value > bounds.gt,
+            bounds.lte is None or value <= bounds.lte,
+            bounds.lt is None or value < bounds.lt,
+        ))
+    raise ValueError(f"Unsupported filter condition on '{condition.key}' for the numpy vector store.")
+
+
+@lru_cache()
+def get_vector_store() -> VectorStore:
+    """
+    The process-wide store selected by VECTOR_STORE_BACKEND: "qdrant" (server),
+    "qdrant-local" (embedded Qdrant, in memory unless VECTOR_STORE_PATH is set)
+    or "numpy" (brute force, memory-mapped under VECTOR_STORE_PATH).
+    """
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "qdrant":
+        return QdrantStore(get_qdrant_client())
+    if backend == "qdrant-local":
+        from qdrant_client import QdrantClient
+        path = settings.VECTOR_STORE_PATH
+        return QdrantStore(QdrantClient(path=path) if path else QdrantClient(":memory:"))
+    if backend == "numpy":
+        return NumpyStore(settings.VECTOR_STORE_PATH)
+    raise ValueError(f"Unknown vector store backend '{backend}'. Expected qdrant, qdrant-local or numpy.")
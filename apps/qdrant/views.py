@@ -1,25 +1,105 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .search import search
+from apps.embeddings.embedding_cache import get_query_cache
+from .search import search, search_batch
+
+MAX_BATCH_QUERIES = 32
+
+
+def _epoch(value, field):
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError(f"'{field}' must be an ISO 8601 datetime.")
+    # Without an offset the time is taken in TIME_ZONE, like the rest of the app, not the server's zone.
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return int(parsed.timestamp())
+
+
+def _parse_filters(data) -> dict:
+    types = data.get('type')
+    if isinstance(types, str):
+        types = [types]
+    episode_id = data.get('episode_id')
+    since = data.get('since')
+    until = data.get('until')
+
+    return {
+        "types": types,
+        "patient_id": data.get('patient_id'),
+        "episode_id": int(episode_id) if episode_id is not None else None,
+        "since": _epoch(since, 'since') if since else None,
+        "until": _epoch(until, 'until') if until else None,
+    }
+
+
+def _serialize(results) -> list[dict]:
+    return [
+        {
+            "payload": r.payload,
+            "score": r.score
+        } for r in results
+    ]
 
 
 class QdrantSearchView(APIView):
+    """
+    Semantic search over clinical events, optionally scoped with `patient_id`,
+    `episode_id`, `type` (one type or a list) and a `since`/`until` time range.
+    """
+
     def post(self, request):
         query = request.data.get('query')
-        filter_type = request.data.get('type')
-        limit = int(request.data.get('limit', 5))
-
         if not query:
             return Response({"error": "Query is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        results = search(query, filter_type=filter_type, limit=limit)
+        try:
+            filters = _parse_filters(request.data)
+            limit = int(request.data.get('limit', 5))
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search(query, limit=limit, **filters)
+
+        return Response(_serialize(results), status=status.HTTP_200_OK)
+
+
+class QdrantBatchSearchView(APIView):
+    """
+    Several searches in one request: `queries` is a list of objects taking the
+    same fields as the single search (`query`, `limit` and filters). Returns
+    one result list per query, in order.
+    """
+
+    def post(self, request):
+        queries = request.data.get('queries')
+        if not isinstance(queries, list) or not queries:
+            return Response({"error": "'queries' must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(queries) > MAX_BATCH_QUERIES:
+            return Response({"error": f"At most {MAX_BATCH_QUERIES} queries per batch."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        parsed = []
+        for i, query in enumerate(queries):
+            try:
+                if not isinstance(query, dict) or not query.get('query'):
+                    raise ValueError("Query is required.")
+                parsed.append({
+                    "query_text": query['query'],
+                    "limit": int(query.get('limit', 5)),
+                    **_parse_filters(query),
+                })
+            except (TypeError, ValueError) as e:
+                return Response({"error": f"queries[{i}]: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search_batch(parsed)
+
+        return Response([_serialize(points) for points in results], status=status.HTTP_200_OK)
 
-        payloads = [
-            {
-                "payload": r.payload,
-                "score": r.score
-            } for r in results
-        ]
 
-        return Response(payloads, status=status.HTTP_200_OK)
+class QueryCacheStatsView(APIView):
+    def get(self, request):
+        return Response(get_query_cache().stats(), status=200)
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery  # ✅ Importa da lib celery, não do próprio core.celery
+from celery.signals import worker_init
 
 # Configura as settings do Django para o celery
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -17,3 +18,14 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_init.connect
+def warm_embedding_models(**kwargs):
+    # Runs in the parent process before the prefork pool is spawned, so every
+    # child shares the model weights copy-on-write. Without EMBEDDING_WARM_MODELS
+    # nothing is loaded (or frozen) here and each child loads on first use.
+    from apps.embeddings.model_registry import warm_models, registry_stats
+
+    if warm_models(freeze=True):
+        print(f"🧠 Embedding models ready: {registry_stats()}")
@@ -156,3 +156,78 @@ STATIC_URL = "/static/"
 
 # ✅ Always define STATIC_ROOT (Nginx + collectstatic requires this)
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# 🔁 Patient → active episode resolution cache (apps.ingestion.resolver)
+INGESTION_RESOLVER_CACHE_SIZE = int(os.getenv("INGESTION_RESOLVER_CACHE_SIZE", "10000"))
+INGESTION_RESOLVER_TTL = int(os.getenv("INGESTION_RESOLVER_TTL", "60"))  # seconds
+# e.g. redis://redis:6379/1; without it each process caches on its own, and episodes opened by
+# other processes are seen once INGESTION_RESOLVER_TTL runs out
+INGESTION_RESOLVER_REDIS_URL = os.getenv("INGESTION_RESOLVER_REDIS_URL")
+
+# 📤 Embedding outbox (apps.embeddings.outbox)
+# Rows stay in the outbox until their embedding is upserted; a row still there this long after being
+# published is published again, up to EMBEDDING_OUTBOX_MAX_ATTEMPTS times.
+EMBEDDING_OUTBOX_REDISPATCH_AFTER = int(os.getenv("EMBEDDING_OUTBOX_REDISPATCH_AFTER", "600"))  # seconds
+EMBEDDING_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_OUTBOX_MAX_ATTEMPTS", "5"))
+
+# 🧠 Embedding micro-batching (apps.embeddings.batching)
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "False") == "True"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WINDOW_MS = int(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "200"))
+EMBEDDING_QUEUE_REDIS_URL = os.getenv("EMBEDDING_QUEUE_REDIS_URL", CELERY_BROKER_URL)
+
+# 🗃️ Embedding cache keyed by (model, normalized text hash) (apps.embeddings.embedding_cache)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))  # in-memory LRU entries per process
+EMBEDDING_CACHE_REDIS_URL = os.getenv("EMBEDDING_CACHE_REDIS_URL")  # e.g. redis://redis:6379/2
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600)))  # sliding, seconds
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))  # search query vectors per process
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))  # seconds, both tiers
+
+# 📦 Embedding models preloaded by the Celery worker_init hook (core.celery) and by run_embedding_server, which
+# defaults to BioBERT when empty. The WSGI app loads models lazily on first use (apps.embeddings.model_registry)
+EMBEDDING_WARM_MODELS = [name for name in os.getenv("EMBEDDING_WARM_MODELS", "").split(",") if name]
+
+# 🛰️ Optional out-of-process embedding server (apps.embeddings.embedding_server / embedding_client)
+# e.g. http://embedding_server:8765 or unix:///tmp/embeddings.sock
+EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "30"))  # seconds
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "128"))
+EMBEDDING_SERVER_WINDOW_MS = int(os.getenv("EMBEDDING_SERVER_WINDOW_MS", "10"))
+
+# ⚡ Embedding inference backend: "torch" (fp32), "onnx" or "onnx-int8" (apps.embeddings.model_registry)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(BASE_DIR, "onnx_models"))  # quantized exports
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")  # arm64 | avx2 | avx512 | avx512_vnni
+
+# 🆔 clinical-data point ids are UUIDv5(type, entity id, model version); bump the version when vectors change meaning
+EMBEDDING_MODEL_VERSION = os.getenv(
+    "EMBEDDING_MODEL_VERSION", "pritamdeka/BioBERT-mnli-snli-scinli-scitail-mednli-stsb"
+)
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+
+# 🗜️ Qdrant collection tuning profile per collection (apps.qdrant.profiles): default | accurate | int8 | binary
+QDRANT_COLLECTION_PROFILES = {
+    "clinical-data": os.getenv("QDRANT_CLINICAL_DATA_PROFILE", "int8"),
+    "clinical_knowledge": os.getenv("QDRANT_CLINICAL_KNOWLEDGE_PROFILE", "default"),
+}
+
+# 🗄️ Vector store backend (apps.qdrant.vector_store): qdrant | qdrant-local | numpy
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH")  # qdrant-local / numpy storage dir; in memory when unset
+QDRANT_HOST = os.getenv("QDRANT_HOST", "qdrant")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+
+# 📄 Protocol PDF extraction (apps.protocols.pdf_extraction)
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_EXTRACTION_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACTION_PAGES_PER_TASK", "16"))
+
+# ✂️ Token-aware protocol chunking for the embedding model (apps.protocols.chunking)
+PROTOCOL_CHUNK_MAX_TOKENS = int(os.getenv("PROTOCOL_CHUNK_MAX_TOKENS", "256"))  # capped by the model window
+PROTOCOL_CHUNK_OVERLAP_TOKENS = int(os.getenv("PROTOCOL_CHUNK_OVERLAP_TOKENS", "32"))
+
+# 🏷️ LLM tag extraction (apps.agent.agents.tag_generator): chunks sent to the LLM at once
+TAG_EXTRACTION_CONCURRENCY = int(os.getenv("TAG_EXTRACTION_CONCURRENCY", "4"))
+
+# 🔌 Pooled keep-alive HTTP clients shared by the LLM backends (apps.agent.llms)
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))